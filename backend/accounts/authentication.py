@@ -0,0 +1,89 @@
+"""Authentication backends for the accounts app."""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User, UserProfile
+
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+# Never cache the password hash; anything that needs it loads it on demand.
+USER_CACHE_FIELDS = tuple(
+    f.attname for f in User._meta.concrete_fields if f.attname != 'password'
+)
+PROFILE_CACHE_FIELDS = tuple(f.attname for f in UserProfile._meta.concrete_fields)
+
+
+def user_cache_key(user_id, token_version):
+    return f'auth:user:{user_id}:v{token_version}'
+
+
+def invalidate_user_cache(user_id, token_version):
+    """Drop cached user entries for the current and previous token version."""
+    cache.delete_many([
+        user_cache_key(user_id, version)
+        for version in range(max(0, token_version - 1), token_version + 1)
+    ])
+
+
+def hydrate_user(data):
+    """Build a User instance (with its profile) from cached values without a query."""
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_CACHE_FIELDS, [data['user'][f] for f in USER_CACHE_FIELDS])
+    if data['profile'] is not None:
+        profile = UserProfile.from_db(
+            DEFAULT_DB_ALIAS, PROFILE_CACHE_FIELDS, [data['profile'][f] for f in PROFILE_CACHE_FIELDS]
+        )
+        profile._state.fields_cache['user'] = user
+        user._state.fields_cache['profile'] = profile
+    return user
+
+
+def dehydrate_user(user):
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        profile = None
+    return {
+        'user': {f: getattr(user, f) for f in USER_CACHE_FIELDS},
+        'profile': {f: getattr(profile, f) for f in PROFILE_CACHE_FIELDS} if profile else None,
+    }
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication that hydrates the user from a short-lived cache.
+    
+    The cache is keyed by user id and the token's ``token_version`` claim and
+    cleared by the accounts signals whenever the user or profile changes, so
+    a cache hit costs no database query at all.
+    """
+    
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        token_version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        
+        key = user_cache_key(user_id, token_version)
+        data = cache.get(key)
+        if data is not None:
+            return hydrate_user(data)
+        
+        try:
+            user = User.objects.select_related('profile').defer('password').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        
+        if not user.is_active or user.is_deleted:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if user.token_version != token_version:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+        
+        cache.set(key, dehydrate_user(user), getattr(settings, 'AUTH_USER_CACHE_TTL', 300))
+        return user
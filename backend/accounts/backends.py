@@ -0,0 +1,99 @@
+"""Authentication backends for the accounts app."""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, identify_hasher, get_hasher, make_password
+from .hashers import get_hashing_settings
+from .models import User
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class HashingPoolBusy(Exception):
+    """The hashing pool did not finish a password check within ``VERIFY_TIMEOUT``."""
+
+
+def _init_process_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+
+
+def _verify(password, encoded):
+    """Check a password and report whether the stored hash should be upgraded."""
+    if not check_password(password, encoded):
+        return False, None
+    hasher = identify_hasher(encoded)
+    preferred = get_hasher('default')
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, make_password(password)
+    return True, None
+
+
+def get_verify_pool():
+    """Return the executor password checks run on, or None to run inline."""
+    global _pool
+    config = get_hashing_settings()
+    if not config['VERIFY_POOL']:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = config['VERIFY_POOL_SIZE'] or os.cpu_count() or 1
+                if config['VERIFY_POOL'] == 'process':
+                    _pool = ProcessPoolExecutor(max_workers=size, initializer=_init_process_worker)
+                else:
+                    _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='password-verify')
+    return _pool
+
+
+def run_hashing(func, *args):
+    pool = get_verify_pool()
+    if pool is None:
+        return func(*args)
+    future = pool.submit(func, *args)
+    try:
+        return future.result(timeout=get_hashing_settings()['VERIFY_TIMEOUT'])
+    except FutureTimeoutError:
+        # Drop the job if it is still queued so the backlog doesn't keep growing
+        future.cancel()
+        raise HashingPoolBusy('Password hashing pool is saturated')
+
+
+def verify_password(password, encoded):
+    """Verify a password on the bounded hashing pool.
+    
+    The pool caps how many expensive hash computations run at once, so a
+    burst of logins queues up instead of taking every CPU from other requests.
+    Returns ``(is_valid, new_encoded_or_None)``; raises ``HashingPoolBusy``
+    when the queue is too long to finish within ``VERIFY_TIMEOUT``.
+    """
+    return run_hashing(_verify, password, encoded)
+
+
+class OffloadedModelBackend(ModelBackend):
+    """ModelBackend that verifies passwords on a bounded pool and upgrades old hashes."""
+    
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so response time doesn't reveal whether the user exists
+            run_hashing(make_password, password)
+            return None
+        
+        is_valid, new_encoded = verify_password(password, user.password)
+        if not is_valid or not self.user_can_authenticate(user):
+            return None
+        if new_encoded:
+            user.password = new_encoded
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,46 @@
+"""Password hashers with cost parameters taken from settings.
+
+Costs live in ``settings.PASSWORD_HASHING`` so they can be tuned per
+deployment. Django's ``check_password`` rehashes a stored password on the
+next successful login whenever its algorithm or parameters differ from the
+preferred hasher, so changing a cost here migrates users transparently.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+def get_hashing_settings():
+    config = {
+        'ARGON2_TIME_COST': 2,
+        'ARGON2_MEMORY_COST': 19456,  # KiB (19 MiB, OWASP minimum for argon2id)
+        'ARGON2_PARALLELISM': 1,
+        'SCRYPT_WORK_FACTOR': 2 ** 14,
+        'SCRYPT_BLOCK_SIZE': 8,
+        'SCRYPT_PARALLELISM': 1,
+        'VERIFY_POOL': 'thread',  # 'thread', 'process' or None to verify inline
+        'VERIFY_POOL_SIZE': None,  # defaults to the number of CPUs
+        'VERIFY_TIMEOUT': 10.0,
+        'BUSY_RETRY_AFTER': 5,  # seconds a login rejected by a saturated pool is told to wait
+    }
+    config.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return config
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with time/memory/parallelism costs from settings."""
+
+    def __init__(self):
+        config = get_hashing_settings()
+        self.time_cost = config['ARGON2_TIME_COST']
+        self.memory_cost = config['ARGON2_MEMORY_COST']
+        self.parallelism = config['ARGON2_PARALLELISM']
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """Scrypt with work factor, block size and parallelism from settings."""
+
+    def __init__(self):
+        config = get_hashing_settings()
+        self.work_factor = config['SCRYPT_WORK_FACTOR']
+        self.block_size = config['SCRYPT_BLOCK_SIZE']
+        self.parallelism = config['SCRYPT_PARALLELISM']
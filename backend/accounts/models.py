@@ -54,6 +54,7 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_login_at = models.DateTimeField(blank=True, null=True)
+    token_version = models.PositiveIntegerField(default=0)  # Bump to revoke issued tokens
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -74,6 +75,11 @@ class User(AbstractUser):
         self.is_active = False
         self.save(update_fields=['is_deleted', 'is_active'])
 
+    def revoke_tokens(self):
+        """Invalidate every access and refresh token issued so far."""
+        self.token_version += 1
+        self.save(update_fields=['token_version'])
+
 
 class UserProfile(models.Model):
     """Extended user profile model."""
@@ -1,7 +1,8 @@
 """Signals for the accounts app."""
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from .authentication import invalidate_user_cache
 from .models import UserProfile
 
 
@@ -9,11 +10,23 @@ User = get_user_model()
 
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    """Create or update user profile when user is created or updated."""
+def create_user_profile(sender, instance, created, **kwargs):
+    """Create the user profile when a user is created."""
     if created:
-        UserProfile.objects.create(user=instance)
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+        UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached authentication user when the user changes."""
+    invalidate_user_cache(instance.pk, instance.token_version)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Drop the cached authentication user when the profile changes."""
+    invalidate_user_cache(instance.user_id, User.objects.filter(pk=instance.user_id).values_list(
+        'token_version', flat=True
+    ).first() or 0)
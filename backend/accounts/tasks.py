@@ -0,0 +1,85 @@
+"""Background tasks for the accounts app."""
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mail
+from django.db import DatabaseError
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from .authentication import invalidate_user_cache
+from .models import User, UserActivity
+
+
+RETRY_OPTIONS = {
+    'retry_backoff': True,
+    'retry_backoff_max': 300,
+    'retry_jitter': True,
+    'max_retries': 5,
+}
+
+
+@shared_task(autoretry_for=(DatabaseError,), **RETRY_OPTIONS)
+def record_user_activity(activity_id, user_id, activity_type, ip_address=None, user_agent='', timestamp=None,
+                         activity_data=None):
+    """Insert a UserActivity row; the id comes from the request so retries stay idempotent."""
+    UserActivity.objects.get_or_create(
+        id=activity_id,
+        defaults={
+            'user_id': user_id,
+            'activity_type': activity_type,
+            'activity_data': activity_data or {},
+            'ip_address': ip_address or None,
+            'user_agent': user_agent or '',
+            'timestamp': parse_datetime(timestamp),
+        },
+    )
+
+
+@shared_task(autoretry_for=(DatabaseError,), **RETRY_OPTIONS)
+def stamp_last_login(user_id, timestamp):
+    """Set last_login/last_login_at unless a newer login already did."""
+    logged_in_at = parse_datetime(timestamp)
+    updated = User.objects.filter(
+        Q(last_login__isnull=True) | Q(last_login__lt=logged_in_at),
+        pk=user_id,
+    ).update(last_login=logged_in_at, last_login_at=logged_in_at)
+    if updated:
+        # update() skips post_save, so clear the cached auth user ourselves
+        token_version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        invalidate_user_cache(user_id, token_version or 0)
+
+
+@shared_task(autoretry_for=(DatabaseError,), **RETRY_OPTIONS)
+def record_login(user_id, activity_id, timestamp, ip_address=None, user_agent=''):
+    """Apply the side effects of a successful login; both steps are safe to retry."""
+    stamp_last_login(user_id, timestamp)
+    record_user_activity(activity_id, user_id, 'login', ip_address, user_agent, timestamp)
+
+
+@shared_task(autoretry_for=(SMTPException, OSError), **RETRY_OPTIONS)
+def send_verification_email(user_id):
+    """Render and send the email verification message."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or user.is_verified:
+        return
+    
+    token = default_token_generator.make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    verification_link = f"{settings.FRONTEND_URL}/verify/{uid}/{token}/"
+    
+    message = render_to_string('accounts/verification_email.html', {
+        'user': user,
+        'verification_link': verification_link,
+    })
+    send_mail(
+        'Verify your email address',
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        fail_silently=False,
+    )
@@ -0,0 +1,10 @@
+"""Token helpers for the accounts app."""
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import TOKEN_VERSION_CLAIM
+
+
+def tokens_for_user(user):
+    """Mint a refresh token (and its access token) carrying the user's token version."""
+    refresh = RefreshToken.for_user(user)
+    refresh[TOKEN_VERSION_CLAIM] = user.token_version
+    return refresh
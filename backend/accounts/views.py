@@ -3,13 +3,13 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import login, logout
-from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
+from django.contrib.auth import logout
+from django.db import transaction
+from django.utils import timezone
+import uuid
+from core.ratelimit import retry_after_header
+from .backends import HashingPoolBusy
+from .hashers import get_hashing_settings
 from .models import User, UserProfile, Address, UserActivity
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, 
@@ -17,6 +17,8 @@ from .serializers import (
     UserActivitySerializer
 )
 from .permissions import IsOwnerOrAdmin
+from .tasks import record_login, record_user_activity, send_verification_email
+from .tokens import tokens_for_user
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -28,32 +30,8 @@ class UserRegistrationView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         user = serializer.save()
-        # Create user profile
-        UserProfile.objects.get_or_create(user=user)
-        
-        # Send verification email
-        self.send_verification_email(user)
-    
-    def send_verification_email(self, user):
-        """Send email verification to the user."""
-        token = default_token_generator.make_token(user)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        
-        verification_link = f"{settings.FRONTEND_URL}/verify/{uid}/{token}/"
-        
-        subject = 'Verify your email address'
-        message = render_to_string('accounts/verification_email.html', {
-            'user': user,
-            'verification_link': verification_link,
-        })
-        
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        # The profile is created by the post_save signal; the email goes out from a worker
+        transaction.on_commit(lambda: send_verification_email.delay(str(user.pk)))
 
 
 class UserLoginView(generics.GenericAPIView):
@@ -64,24 +42,27 @@ class UserLoginView(generics.GenericAPIView):
     
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except HashingPoolBusy:
+            response = Response(
+                {'error': 'Too many logins in progress, try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = retry_after_header(get_hashing_settings()['BUSY_RETRY_AFTER'])
+            return response
         user = serializer.validated_data['user']
         
-        login(request, user)
-        
-        refresh = RefreshToken.for_user(user)
-        
-        # Update last login time
-        user.last_login_at = user.last_login
-        user.save(update_fields=['last_login_at'])
+        refresh = tokens_for_user(user)
         
-        # Log user activity
-        UserActivity.objects.create(
-            user=user,
-            activity_type='login',
-            ip_address=self.get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', ''),
-        )
+        # Last-login stamping and activity logging happen in a worker
+        activity_id = str(uuid.uuid4())
+        logged_in_at = timezone.now().isoformat()
+        ip_address = self.get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        transaction.on_commit(lambda: record_login.delay(
+            str(user.pk), activity_id, logged_in_at, ip_address, user_agent
+        ))
         
         return Response({
             'refresh': str(refresh),
@@ -103,6 +84,7 @@ class UserLoginView(generics.GenericAPIView):
 def logout_view(request):
     """View for user logout."""
     try:
+        user_id = str(request.user.pk)
         refresh_token = request.data.get('refresh_token')
         if refresh_token:
             token = RefreshToken(refresh_token)
@@ -111,11 +93,10 @@ def logout_view(request):
         logout(request)
         
         # Log user activity
-        UserActivity.objects.create(
-            user=request.user,
-            activity_type='logout',
-            ip_address=request.META.get('REMOTE_ADDR', ''),
-            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        record_user_activity.delay(
+            str(uuid.uuid4()), user_id, 'logout',
+            request.META.get('REMOTE_ADDR', ''), request.META.get('HTTP_USER_AGENT', ''),
+            timezone.now().isoformat()
         )
         
         return Response({'message': 'Successfully logged out'}, status=status.HTTP_200_OK)
@@ -0,0 +1 @@
+"""Performance benchmarks for the Smart E-Commerce platform backend."""
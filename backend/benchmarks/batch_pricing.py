@@ -0,0 +1,139 @@
+"""Benchmark for batch line pricing and tax on large quotes.
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.batch_pricing --lines 10000 --iterations 20
+
+Builds synthetic quote lines in memory (no database) and times the
+Decimal path against the integer-cents NumPy path in ``orders.pricing``,
+for a B2B quote with a coupon discount and for repricing a catalog of
+single units after a tax change. The run fails unless both paths give
+identical line totals, discount shares, tax and shipping.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+import django
+from django.conf import settings
+
+
+def configure():
+    settings.configure(DEBUG=False, SECRET_KEY='benchmark', USE_TZ=True)
+    django.setup()
+
+
+def cents(value):
+    return Decimal(value).scaleb(-2)
+
+
+def build_lines(rng, count, quantities):
+    from orders.pricing import QuoteLine
+
+    tax_rates = [cents(0), cents(500), cents(750), cents(1600), cents(2000), cents(1925)]
+    return [
+        QuoteLine(
+            i, rng.randint(*quantities), cents(rng.randint(50, 500000)), rng.choice(tax_rates),
+            cents(rng.choice([0, 0, 199, 499, 1500])), rng.random() < 0.8,
+        )
+        for i in range(count)
+    ]
+
+
+def time_calls(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def same(a, b):
+    fields = ('line_totals', 'line_discounts', 'line_taxes', 'line_shipping')
+    return all(
+        [str(value) for value in getattr(a, field)] == [str(value) for value in getattr(b, field)]
+        for field in fields
+    ) and str(a.total) == str(b.total)
+
+
+def compare(name, lines, discount, iterations):
+    from orders.pricing import LineArrays, price_arrays, price_lines_decimal, price_lines_vectorized
+
+    arrays = LineArrays.from_lines(lines)
+    reference = price_lines_decimal(lines, discount)
+    if not same(reference, price_lines_vectorized(lines, discount)) or not same(reference, price_arrays(arrays, discount)):
+        raise SystemExit(f'{name}: Decimal and vectorized totals differ')
+    report = {
+        'lines': len(lines),
+        'decimal': time_calls(lambda: price_lines_decimal(lines, discount), iterations),
+        # Includes converting the Decimal lines to arrays of cents
+        'vectorized': time_calls(lambda: price_lines_vectorized(lines, discount), iterations),
+        # Arrays built once, e.g. a quote repriced after each edit
+        'prebuilt_arrays': time_calls(lambda: price_arrays(arrays, discount), iterations),
+    }
+    for key in ('vectorized', 'prebuilt_arrays'):
+        report[f'{key}_speedup'] = round(report['decimal']['mean_ms'] / report[key]['mean_ms'], 1)
+    return report
+
+
+def reprice_catalog(rng, catalog, iterations):
+    """Tax rates change on a fifth of the catalog and every product is repriced"""
+    from orders.pricing import LineArrays, price_arrays, price_lines_decimal
+
+    rates = [
+        line.tax_rate + cents(rng.choice([100, 250])) if rng.random() < 0.2 else line.tax_rate
+        for line in catalog
+    ]
+    arrays = LineArrays.from_lines(catalog)
+
+    def with_decimal():
+        return price_lines_decimal([line._replace(tax_rate=rate) for line, rate in zip(catalog, rates)])
+
+    def with_arrays():
+        return price_arrays(arrays.with_tax_rates(rates))
+
+    if not same(with_decimal(), with_arrays()):
+        raise SystemExit('catalog: Decimal and vectorized totals differ')
+    report = {
+        'lines': len(catalog),
+        'decimal': time_calls(with_decimal, iterations),
+        'prebuilt_arrays': time_calls(with_arrays, iterations),
+    }
+    report['prebuilt_arrays_speedup'] = round(report['decimal']['mean_ms'] / report['prebuilt_arrays']['mean_ms'], 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=10000, help='lines in the B2B quote')
+    parser.add_argument('--catalog', type=int, default=100000, help='products repriced after a tax change')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    configure()
+
+    rng = random.Random(args.seed)
+    quote = build_lines(rng, args.lines, (1, 500))
+    catalog = build_lines(rng, args.catalog, (1, 1))
+    discount = sum((line.unit_price * line.quantity for line in quote), Decimal('0.00')) / 20
+
+    report = {
+        'quote': compare('quote', quote, discount.quantize(Decimal('0.01')), args.iterations),
+        'catalog_reprice': reprice_catalog(rng, catalog, max(1, args.iterations // 4)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Benchmark concurrent-request throughput against a running server.
+
+Usage (from the backend directory, with the seeded dataset)::
+
+    # WSGI: the current deployment
+    gunicorn core.wsgi:application -k gthread --workers 2 --threads 4 -b :8000
+    # ASGI: async views on the event loop (core.asgi enables ASYNC_VIEWS)
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --workers 2 -b :8001
+
+    python -m benchmarks.concurrency http://localhost:8000 --label wsgi --output wsgi.json
+    python -m benchmarks.concurrency http://localhost:8001 --label asgi --compare wsgi.json
+
+Each concurrency level keeps N requests in flight for ``--duration`` seconds
+and reports requests per second, latency percentiles and error counts per
+endpoint. Needs no Django settings; ids are read from the API itself.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+import httpx
+
+
+ENDPOINTS = ('product_detail', 'gateways', 'process_payment')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Target:
+    """Request factory for one server, primed with ids and a token."""
+
+    def __init__(self, base_url, email, password, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.rng = random.Random(seed)
+        self.headers = {}
+        self.product_ids = []
+        self.order_ids = []
+        self.gateway = None
+
+    async def prime(self, client):
+        response = await client.post('/api/auth/login/', json={'email': self.email, 'password': self.password})
+        response.raise_for_status()
+        self.headers = {'Authorization': f"Bearer {response.json()['access']}"}
+
+        response = await client.get('/api/products/products/', params={'page_size': 100})
+        response.raise_for_status()
+        self.product_ids = [p['id'] for p in response.json().get('results', [])]
+
+        response = await client.get('/api/payments/gateways/', headers=self.headers)
+        response.raise_for_status()
+        gateways = response.json()
+        self.gateway = gateways[0]['name'] if gateways else None
+
+        response = await client.get('/api/orders/', headers=self.headers)
+        if response.status_code == 200:
+            orders = response.json()
+            self.order_ids = [(o['id'], o['total_amount']) for o in orders]
+
+    def request(self, client, endpoint):
+        if endpoint == 'product_detail':
+            return client.get(f'/api/products/products/{self.rng.choice(self.product_ids)}/')
+        if endpoint == 'gateways':
+            return client.get('/api/payments/gateways/', headers=self.headers)
+        order_id, total = self.rng.choice(self.order_ids)
+        return client.post('/api/payments/process/', headers=self.headers, json={
+            'order_id': order_id, 'gateway_name': self.gateway, 'amount': total,
+        })
+
+    def endpoints(self, requested):
+        available = []
+        for endpoint in requested:
+            if endpoint == 'product_detail' and not self.product_ids:
+                continue
+            if endpoint == 'process_payment' and not (self.order_ids and self.gateway):
+                continue
+            available.append(endpoint)
+        return available
+
+
+async def run_level(target, endpoint, concurrency, duration, timeout):
+    latencies = []
+    statuses = Counter()
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=target.base_url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await target.request(client, endpoint)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as exc:
+                    statuses[type(exc).__name__] += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    completed = sum(n for status, n in statuses.items() if isinstance(status, int) and status < 500)
+    return {
+        'concurrency': concurrency,
+        'requests': sum(statuses.values()),
+        'throughput_rps': round(completed / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'statuses': {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+    }
+
+
+async def run(args):
+    target = Target(args.base_url, args.email, args.password, seed=args.seed)
+    async with httpx.AsyncClient(base_url=target.base_url, timeout=args.timeout) as client:
+        await target.prime(client)
+
+    results = {}
+    for endpoint in target.endpoints(args.endpoints):
+        results[endpoint] = []
+        for concurrency in args.concurrency:
+            level = await run_level(target, endpoint, concurrency, args.duration, args.timeout)
+            results[endpoint].append(level)
+            print(f"{args.label:>6} {endpoint:<16} c={concurrency:<4} {level['throughput_rps']:>9.1f} req/s  "
+                  f"p50 {level['p50_ms']:.1f}ms  p99 {level['p99_ms']:.1f}ms")
+    return {'label': args.label, 'base_url': target.base_url, 'duration_s': args.duration, 'results': results}
+
+
+def compare(report, baseline):
+    print(f"\n{report['label']} vs {baseline['label']} (throughput)")
+    for endpoint, levels in report['results'].items():
+        previous = {level['concurrency']: level for level in baseline['results'].get(endpoint, [])}
+        for level in levels:
+            before = previous.get(level['concurrency'])
+            if before and before['throughput_rps']:
+                change = (level['throughput_rps'] / before['throughput_rps'] - 1) * 100
+                print(f"  {endpoint:<16} c={level['concurrency']:<4} {before['throughput_rps']:>9.1f} -> "
+                      f"{level['throughput_rps']:>9.1f} req/s ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base_url')
+    parser.add_argument('--label', default='server')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--email', default='user1@bench.example.com')
+    parser.add_argument('--password', default='bench-password-123')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='previous JSON report to diff against')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(report, json.load(fh))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Microbenchmark for coupon eligibility against large carts.
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.coupons --coupons 5000 --cart-lines 200 --iterations 200
+
+Builds a synthetic rule index in memory (no database) and times finding
+every coupon a cart qualifies for with the indexed one-pass evaluation
+against checking each coupon against the cart in turn.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import django
+from django.conf import settings
+
+
+def configure():
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        USE_TZ=True,
+        INSTALLED_APPS=[
+            'django.contrib.contenttypes', 'django.contrib.auth', 'accounts', 'products', 'orders', 'promotions',
+        ],
+        AUTH_USER_MODEL='accounts.User',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    )
+    django.setup()
+
+
+def build_rules(rng, coupons, products, categories, now):
+    from promotions.coupons import CouponRule
+
+    rules = []
+    for i in range(coupons):
+        kind = rng.random()
+        product_ids = rng.sample(products, rng.randint(1, 20)) if kind < 0.5 else ()
+        category_ids = rng.sample(categories, rng.randint(1, 3)) if 0.5 <= kind < 0.9 else ()
+        coupon = SimpleNamespace(
+            id=i, code=f'BENCH{i:06d}', name=f'Bench coupon {i}',
+            discount_type=rng.choice(['percentage', 'fixed']),
+            discount_value=Decimal(rng.randint(5, 30)),
+            minimum_order_amount=Decimal(rng.choice([0, 0, 50, 200])),
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=rng.choice([-2, 7, 30])),
+            usage_limit=None, usage_limit_per_user=None,
+        )
+        rules.append(CouponRule(coupon, product_ids, category_ids))
+    return rules
+
+
+def build_cart(rng, lines, products, category_of):
+    from promotions.coupons import CartLine
+
+    chosen = rng.sample(products, lines)
+    return [
+        CartLine(product_id, category_of[product_id], rng.randint(1, 3), Decimal(rng.randint(100, 50000)) / 100)
+        for product_id in chosen
+    ]
+
+
+def naive_eligible(index, rules, lines, now):
+    evaluations = []
+    for rule in rules:
+        if not rule.is_open(now):
+            continue
+        evaluation = index.evaluate(rule, lines)
+        if evaluation.eligible_total > 0 and evaluation.cart_total >= rule.minimum_order_amount:
+            evaluations.append(evaluation)
+    evaluations.sort(key=lambda evaluation: evaluation.discount, reverse=True)
+    return evaluations
+
+
+def time_calls(func, carts):
+    samples = []
+    for cart in carts:
+        start = time.perf_counter()
+        func(cart)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p99_ms': round(samples[int(len(samples) * 0.99)], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--coupons', type=int, default=5000)
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--categories', type=int, default=200)
+    parser.add_argument('--cart-lines', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    configure()
+
+    from django.utils import timezone
+    from promotions.coupons import CouponIndex
+
+    rng = random.Random(args.seed)
+    now = timezone.now()
+    categories = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(args.categories)]
+    products = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(args.products)]
+    category_of = {product_id: rng.choice(categories) for product_id in products}
+
+    start = time.perf_counter()
+    rules = build_rules(rng, args.coupons, products, categories, now)
+    index = CouponIndex(rules)
+    build_ms = (time.perf_counter() - start) * 1000
+    carts = [build_cart(rng, args.cart_lines, products, category_of) for _ in range(args.iterations)]
+
+    indexed = [[e.rule.code for e in index.eligible(cart, now)] for cart in carts[:5]]
+    naive = [[e.rule.code for e in naive_eligible(index, rules, cart, now)] for cart in carts[:5]]
+    if [sorted(codes) for codes in indexed] != [sorted(codes) for codes in naive]:
+        raise SystemExit('Indexed and per-coupon evaluation disagree')
+
+    report = {
+        'coupons': args.coupons,
+        'cart_lines': args.cart_lines,
+        'index_build_ms': round(build_ms, 1),
+        'per_coupon': time_calls(lambda cart: naive_eligible(index, rules, cart, now), carts),
+        'indexed': time_calls(lambda cart: index.eligible(cart, now), carts),
+    }
+    report['speedup'] = round(report['per_coupon']['mean_ms'] / report['indexed']['mean_ms'], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
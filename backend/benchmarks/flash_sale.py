@@ -0,0 +1,138 @@
+"""Load test for the flash sale inventory counter.
+
+Usage (from the backend directory, with Redis running)::
+
+    python -m benchmarks.flash_sale --redis-url redis://localhost:6379/0 \\
+        --buyers 5000 --stock 1000 --per-user 2 --threads 64
+
+Thousands of buyers race for one sale's stock through the Redis Lua claim,
+each trying to buy more than the per-user cap allows. The run fails if the
+sale oversells, a buyer exceeds the cap or stock is left while demand was
+turned away. Runs with minimal standalone settings, so no database is
+needed.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+
+
+def configure():
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        USE_TZ=True,
+        INSTALLED_APPS=[
+            'django.contrib.contenttypes', 'django.contrib.auth', 'accounts', 'products', 'orders', 'promotions',
+        ],
+        AUTH_USER_MODEL='accounts.User',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    )
+    django.setup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0')
+    parser.add_argument('--buyers', type=int, default=5000)
+    parser.add_argument('--stock', type=int, default=1000)
+    parser.add_argument('--per-user', type=int, default=2)
+    parser.add_argument('--attempts', type=int, default=3, help='claims each buyer makes')
+    parser.add_argument('--threads', type=int, default=64, help='claims in flight at once')
+    parser.add_argument('--sale-id', type=int, default=999999)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    configure()
+
+    import redis
+    from django.utils import timezone
+    from promotions.inventory import FlashSaleError, FlashSaleInventory, get_flash_sale_settings
+    from promotions.models import FlashSale
+
+    client = redis.Redis.from_url(args.redis_url, max_connections=args.threads * 2)
+    config = {**get_flash_sale_settings(), 'KEY_PREFIX': 'flash-bench'}
+    inventory = FlashSaleInventory(client, config)
+    client.delete(inventory.key(args.sale_id), inventory.users_key(args.sale_id), inventory.dirty_key)
+
+    now = timezone.now()
+    sale = FlashSale(
+        pk=args.sale_id, name='Load test', max_quantity=args.stock, quantity_sold=0, max_per_user=args.per_user,
+        start_time=now - timedelta(minutes=1), end_time=now + timedelta(hours=1), is_active=True,
+    )
+    inventory.sync(sale)
+
+    rng = random.Random(args.seed)
+    requests = [
+        (f'buyer-{buyer}', rng.randint(1, args.per_user))
+        for buyer in range(args.buyers)
+        for _ in range(args.attempts)
+    ]
+    rng.shuffle(requests)
+
+    outcomes = Counter()
+    bought = Counter()
+    lock = threading.Lock()
+    latencies = []
+
+    def attempt(request):
+        user_id, quantity = request
+        start = time.perf_counter()
+        try:
+            claim = inventory.claim(args.sale_id, user_id, quantity)
+            outcome = 'claimed'
+        except FlashSaleError as e:
+            claim = None
+            outcome = e.code
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+            if claim is not None:
+                bought[user_id] += claim.quantity
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(attempt, requests))
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    sold = sum(bought.values())
+    remaining = inventory.remaining(args.sale_id)
+    over_cap = [user for user, quantity in bought.items() if quantity > args.per_user]
+    mismatched = [user for user, quantity in bought.items() if inventory.held_by(args.sale_id, user) != quantity]
+    report = {
+        'claims': len(requests),
+        'threads': args.threads,
+        'claims_per_second': round(len(requests) / duration, 1),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)], 3),
+        'max_ms': round(latencies[-1], 3),
+        'outcomes': dict(outcomes),
+        'stock': args.stock,
+        'sold': sold,
+        'remaining': remaining,
+        'buyers_served': len(bought),
+        'buyers_over_cap': len(over_cap),
+        'holds_mismatched': len(mismatched),
+    }
+    print(json.dumps(report, indent=2))
+
+    client.delete(inventory.key(args.sale_id), inventory.users_key(args.sale_id), inventory.dirty_key)
+    if sold + remaining != args.stock or remaining < 0 or over_cap or mismatched:
+        raise SystemExit('Flash sale counter invariant violated')
+    if remaining and outcomes['insufficient'] + outcomes['sold_out']:
+        # Only partial requests larger than what was left may be turned away while stock remains
+        if remaining >= args.per_user:
+            raise SystemExit('Stock left over while buyers were turned away')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark password verification throughput (logins per second per core).
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.login --iterations 50
+    python -m benchmarks.login --workers 4 --pool process
+
+Measures each hasher in PASSWORD_HASHERS order (using the tuned costs from
+``accounts.hashers``) single-threaded, then through the verification pool
+with the requested number of workers. Runs with standalone settings so it
+needs no database.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+
+
+HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'accounts.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'accounts.hashers.TunedScryptPasswordHasher',
+}
+PASSWORD = 'correct horse battery staple'
+
+
+def configure():
+    if not settings.configured:
+        settings.configure(
+            SECRET_KEY='benchmark',
+            PASSWORD_HASHERS=list(HASHERS.values()),
+            PASSWORD_HASHING={},
+        )
+        django.setup()
+
+
+def verify(encoded):
+    configure()
+    from django.contrib.auth.hashers import check_password
+    return check_password(PASSWORD, encoded)
+
+
+def bench_hasher(name, iterations, workers, pool_kind):
+    from django.utils.module_loading import import_string
+    hasher = import_string(HASHERS[name])()
+    encoded = hasher.encode(PASSWORD, hasher.salt())
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        assert hasher.verify(PASSWORD, encoded)
+    single = time.perf_counter() - start
+
+    executor_class = ProcessPoolExecutor if pool_kind == 'process' else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as pool:
+        list(pool.map(verify, [encoded] * workers))  # warm up workers
+        start = time.perf_counter()
+        results = list(pool.map(verify, [encoded] * iterations * workers))
+        pooled = time.perf_counter() - start
+    assert all(results)
+
+    return {
+        'algorithm': hasher.algorithm,
+        'verify_ms': round(single / iterations * 1000, 2),
+        'logins_per_sec_per_core': round(iterations / single, 1),
+        'pool': pool_kind,
+        'pool_workers': workers,
+        'pool_logins_per_sec': round(iterations * workers / pooled, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=30, help='verifications per hasher (and per pool worker)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--hashers', nargs='*', default=list(HASHERS), choices=list(HASHERS))
+    args = parser.parse_args()
+
+    configure()
+    results = {name: bench_hasher(name, args.iterations, args.workers, args.pool) for name in args.hashers}
+    print(json.dumps({'cpu_count': os.cpu_count(), 'hashers': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Microbenchmark for the latency RateLimitMiddleware adds to each request.
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.ratelimit --backend local --iterations 50000
+    python -m benchmarks.ratelimit --backend redis --redis-url redis://localhost:6379/0
+
+Runs with minimal standalone settings so it doesn't need the database.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import django
+from django.conf import settings
+
+
+def configure(backend, redis_url):
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        ALLOWED_HOSTS=['*'],
+        CACHES={
+            'default': {
+                'BACKEND': 'django_redis.cache.RedisCache',
+                'LOCATION': redis_url,
+                'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+            }
+        } if backend == 'redis' else {},
+        RATE_LIMITS={
+            'ENABLED': True,
+            'BACKEND': backend,
+            'KEY_PREFIX': 'rl-bench',
+            'RULES': [
+                # High enough that every request is admitted; we measure the check itself
+                {'name': 'bench', 'pattern': r'^/api/', 'rate': '100000000/s', 'scope': 'ip'},
+            ],
+        },
+    )
+    django.setup()
+
+
+def time_calls(handler, request_factory, iterations, clients):
+    samples = []
+    for i in range(iterations):
+        request = request_factory.get('/api/products/products/', REMOTE_ADDR=f'10.0.{i % clients // 256}.{i % 256}')
+        start = time.perf_counter()
+        handler(request)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'mean_us': round(statistics.fmean(samples), 2),
+        'p50_us': round(samples[len(samples) // 2], 2),
+        'p99_us': round(samples[int(len(samples) * 0.99)], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['local', 'redis'], default='local')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0')
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=1000, help='distinct client IPs')
+    args = parser.parse_args()
+
+    configure(args.backend, args.redis_url)
+
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from core.middleware import RateLimitMiddleware
+
+    def view(request):
+        return HttpResponse('ok')
+
+    factory = RequestFactory()
+    baseline = time_calls(view, factory, args.iterations, args.clients)
+    limited = time_calls(RateLimitMiddleware(view), factory, args.iterations, args.clients)
+
+    print(json.dumps({
+        'backend': args.backend,
+        'baseline': baseline,
+        'rate_limited': limited,
+        'added_p50_us': round(limited['p50_us'] - baseline['p50_us'], 2),
+        'added_p99_us': round(limited['p99_us'] - baseline['p99_us'], 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
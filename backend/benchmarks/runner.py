@@ -0,0 +1,126 @@
+"""Benchmark runner producing JSON reports comparable across commits."""
+import os
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_worker(scenario, context, iterations, warmup, offset):
+    """Run a scenario on the current thread and return raw samples."""
+    client = scenario.client(context)
+    scenario.setup(client, context)
+    for i in range(warmup):
+        scenario.prepare(client, context, i)
+        scenario.request(client, context, i)
+
+    latencies = []
+    queries = []
+    statuses = Counter()
+    try:
+        for i in range(offset, offset + iterations):
+            scenario.prepare(client, context, i)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = scenario.request(client, context, i)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses[response.status_code] += 1
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return latencies, queries, statuses
+
+
+def run_scenario(scenario, context, iterations, warmup=5, concurrency=1):
+    """Run a scenario and summarise latency, query counts and throughput."""
+    per_worker = max(1, iterations // concurrency)
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [run_worker(scenario, context, per_worker, warmup, 0)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(run_worker, scenario, context, per_worker, warmup, n * per_worker)
+                for n in range(concurrency)
+            ]
+            results = [future.result() for future in futures]
+    wall = time.perf_counter() - start
+
+    latencies = sorted(l for result in results for l in result[0])
+    queries = [q for result in results for q in result[1]]
+    statuses = sum((result[2] for result in results), Counter())
+    errors = sum(n for code, n in statuses.items() if code >= 400)
+    return {
+        'iterations': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'status_codes': {str(code): n for code, n in sorted(statuses.items())},
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p90': round(percentile(latencies, 0.90), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'queries': {
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        },
+        # Includes untimed prepare() work, so treat as a lower bound for heavy setups
+        'throughput_rps': round(len(latencies) / wall, 2),
+    }
+
+
+def environment_info():
+    db = connection.settings_dict
+    return {
+        'commit': git_revision(),
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'database': f"{db['ENGINE'].rsplit('.', 1)[-1]}:{db.get('NAME')}",
+    }
+
+
+def compare_reports(previous, current):
+    """Return per-scenario deltas between two reports (positive means slower)."""
+    deltas = {}
+    for name, result in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        deltas[name] = {
+            'p50_ms': round(result['latency_ms']['p50'] - before['latency_ms']['p50'], 3),
+            'p95_ms': round(result['latency_ms']['p95'] - before['latency_ms']['p95'], 3),
+            'queries_mean': round(result['queries']['mean'] - before['queries']['mean'], 2),
+            'throughput_pct': round(
+                (result['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100, 1
+            ) if before['throughput_rps'] else None,
+        }
+    return deltas
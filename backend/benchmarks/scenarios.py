@@ -0,0 +1,157 @@
+"""API benchmark scenarios.
+
+Each scenario issues one request per iteration through DRF's test client,
+so the full middleware, auth, serializer and ORM stack is exercised against
+whatever database ``DATABASES['default']`` points at.
+"""
+import random
+
+from rest_framework.test import APIClient
+
+
+class BenchmarkContext:
+    """Sample ids and users loaded once from the seeded dataset."""
+
+    def __init__(self, seed=0):
+        from accounts.models import User
+        from products.models import Product
+        from core.management.commands.seed_benchmark_data import BENCHMARK_EMAIL_DOMAIN, WORDS, NOUNS
+
+        self.rng = random.Random(seed)
+        users = User.objects.filter(email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}')
+        self.admin = users.filter(is_staff=True).first()
+        self.customers = list(users.filter(is_staff=False)[:200])
+        self.product_ids = list(
+            Product.objects.filter(is_active=True, is_deleted=False, stock_quantity__gt=10)
+            .values_list('id', flat=True)[:2000]
+        )
+        self.search_terms = list(WORDS + NOUNS)
+        if not (self.admin and self.customers and self.product_ids):
+            raise RuntimeError('No benchmark data found; run `manage.py seed_benchmark_data` first.')
+
+    def customer(self):
+        return self.rng.choice(self.customers)
+
+    def product_id(self):
+        return str(self.rng.choice(self.product_ids))
+
+
+class Scenario:
+    """A named benchmark issuing one API request per iteration."""
+
+    name = None
+    admin = False
+
+    def client(self, context):
+        client = APIClient()
+        client.force_authenticate(context.admin if self.admin else context.customer())
+        return client
+
+    def setup(self, client, context):
+        """Run once per client before any iteration."""
+
+    def prepare(self, client, context, iteration):
+        """Run before each iteration, outside the timed section."""
+
+    def request(self, client, context, iteration):
+        raise NotImplementedError
+
+
+class ProductList(Scenario):
+    name = 'product_list'
+
+    def request(self, client, context, iteration):
+        return client.get('/api/products/products/', {'page': iteration % 10 + 1})
+
+
+class ProductSearch(Scenario):
+    name = 'product_search'
+
+    def request(self, client, context, iteration):
+        return client.get('/api/products/products/', {'search': context.rng.choice(context.search_terms)})
+
+
+class ProductDetail(Scenario):
+    name = 'product_detail'
+
+    def request(self, client, context, iteration):
+        return client.get(f'/api/products/products/{context.product_id()}/')
+
+
+class CartAdd(Scenario):
+    name = 'cart_add'
+
+    def request(self, client, context, iteration):
+        return client.post('/api/carts/add/', {'product_id': context.product_id(), 'quantity': 1}, format='json')
+
+
+class CartGet(Scenario):
+    name = 'cart_get'
+
+    def setup(self, client, context):
+        for _ in range(5):
+            client.post('/api/carts/add/', {'product_id': context.product_id(), 'quantity': 1}, format='json')
+
+    def request(self, client, context, iteration):
+        return client.get('/api/carts/')
+
+
+class Checkout(Scenario):
+    name = 'checkout'
+
+    ADDRESS = {
+        'shipping_address': '1 Benchmark Way', 'shipping_city': 'Accra', 'shipping_state': 'Greater Accra',
+        'shipping_country': 'Ghana', 'shipping_postal_code': '00233',
+        'billing_address': '1 Benchmark Way', 'billing_city': 'Accra', 'billing_state': 'Greater Accra',
+        'billing_country': 'Ghana', 'billing_postal_code': '00233',
+    }
+
+    def prepare(self, client, context, iteration):
+        # Checkout consumes the cart, so refill it with three lines each time
+        for _ in range(3):
+            client.post('/api/carts/add/', {'product_id': context.product_id(), 'quantity': 1}, format='json')
+
+    def request(self, client, context, iteration):
+        return client.post('/api/orders/create/', {**self.ADDRESS, 'from_cart': True, 'items': []}, format='json')
+
+
+class AnalyticsScenario(Scenario):
+    admin = True
+    path = None
+
+    def request(self, client, context, iteration):
+        return client.get(self.path)
+
+
+class RevenueAnalytics(AnalyticsScenario):
+    name = 'analytics_revenue'
+    path = '/api/analytics/revenue/'
+
+
+class ProductAnalytics(AnalyticsScenario):
+    name = 'analytics_products'
+    path = '/api/analytics/products/'
+
+
+class OrderAnalytics(AnalyticsScenario):
+    name = 'analytics_orders'
+    path = '/api/analytics/orders/'
+
+
+class TopProductsAnalytics(AnalyticsScenario):
+    name = 'analytics_top_products'
+    path = '/api/analytics/top-products/'
+
+
+class TopCustomersAnalytics(AnalyticsScenario):
+    name = 'analytics_top_customers'
+    path = '/api/analytics/top-customers/'
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        ProductList, ProductSearch, ProductDetail, CartAdd, CartGet, Checkout,
+        RevenueAnalytics, ProductAnalytics, OrderAnalytics, TopProductsAnalytics, TopCustomersAnalytics,
+    )
+}
@@ -0,0 +1,134 @@
+"""Benchmark catalog search, in-process index versus database ``ILIKE``.
+
+Usage (from the backend directory, with the seeded dataset)::
+
+    python manage.py seed_benchmark_data --products 50000
+    python -m benchmarks.search_index --queries 500
+
+Runs against ``DATABASES['default']`` through ``core.settings``. Times
+building the index from the database, saving the snapshot and mapping it
+back, then answers the same mix of one-word, two-word and prefix queries
+both ways. Each query fetches what a listing page needs: the match count
+and the first page of ids. The database path applies the product list
+view's ``SearchFilter`` lookups; the index path ranks with BM25.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+PAGE_SIZE = 20
+DB_SEARCH_FIELDS = ('name', 'description', 'sku', 'barcode')
+
+
+def configure():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+
+
+def build_queries(rng, count):
+    from core.management.commands.seed_benchmark_data import NOUNS, WORDS
+
+    queries = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            queries.append(rng.choice(WORDS + NOUNS))
+        elif kind == 1:
+            queries.append(f'{rng.choice(WORDS)} {rng.choice(NOUNS)}')
+        else:
+            noun = rng.choice(NOUNS)
+            queries.append(f'{rng.choice(WORDS)} {noun[:rng.randint(2, len(noun))]}')
+    return queries
+
+
+def database_search(query):
+    from django.db.models import Q
+    from products.models import Product
+
+    queryset = Product.objects.filter(is_active=True, is_deleted=False)
+    for term in query.split():
+        condition = Q()
+        for field in DB_SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+    return queryset.count(), list(queryset.order_by('-created_at').values_list('id', flat=True)[:PAGE_SIZE])
+
+
+def index_search(index, query):
+    results = index.search(query, prefix=True)
+    return len(results), [product_id for product_id, _ in results[:PAGE_SIZE]]
+
+
+def time_queries(func, queries):
+    samples = []
+    matches = 0
+    start = time.perf_counter()
+    for query in queries:
+        began = time.perf_counter()
+        count, _ = func(query)
+        samples.append((time.perf_counter() - began) * 1000)
+        matches += count
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        'queries': len(samples),
+        'queries_per_second': round(len(samples) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p99_ms': round(samples[int(len(samples) * 0.99)], 3),
+        'mean_matches': round(matches / len(samples), 1),
+    }
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    configure()
+    from products.models import Product
+    from products.search import CompactSegment, SearchIndex, build_index, get_search_settings
+
+    if not Product.objects.exists():
+        raise SystemExit('No products found; run `manage.py seed_benchmark_data` first.')
+    config = get_search_settings()
+    index, build_ms = timed(lambda: build_index(config))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'product-search.idx')
+        _, save_ms = timed(lambda: index.base.save(path))
+        mapped, open_ms = timed(lambda: SearchIndex(CompactSegment.open(path), config=config))
+        snapshot_bytes = os.path.getsize(path)
+
+        queries = build_queries(random.Random(args.seed), args.queries)
+        report = {
+            'products': len(index),
+            'terms': len(index.base.terms),
+            'postings': len(index.base.postings),
+            'build_ms': build_ms,
+            'snapshot_save_ms': save_ms,
+            'snapshot_open_ms': open_ms,
+            'snapshot_bytes': snapshot_bytes,
+            'database': time_queries(database_search, queries),
+            'index': time_queries(lambda query: index_search(mapped, query), queries),
+        }
+    report['speedup'] = round(
+        report['index']['queries_per_second'] / report['database']['queries_per_second'], 1
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
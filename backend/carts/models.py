@@ -18,7 +18,8 @@ class Cart(models.Model):
 
     @property
     def total_cost(self):
-        return sum(item.total_price for item in self.items.all())
+        from promotions.pricing import price_items
+        return price_items(self.items.all()).subtotal
 
     @property
     def total_items(self):
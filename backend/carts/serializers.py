@@ -1,17 +1,24 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
 from products.serializers import ProductSerializer
+from promotions.pricing import price_items
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
-    total_price = serializers.ReadOnlyField()
+    total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'product_id', 'quantity', 'total_price', 'added_at']
         read_only_fields = ['added_at']
 
+    def get_total_price(self, obj):
+        prices = self.context.setdefault('prices', {})
+        if obj.product_id not in prices:
+            prices[obj.product_id] = obj.product.price_quote
+        return prices[obj.product_id].unit_price * obj.quantity
+
     def validate_quantity(self, value):
         if value < 1:
             raise serializers.ValidationError("Quantity must be at least 1")
@@ -20,7 +27,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
-    total_cost = serializers.ReadOnlyField()
+    total_cost = serializers.SerializerMethodField()
     total_items = serializers.ReadOnlyField()
 
     class Meta:
@@ -28,16 +35,27 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'session_key', 'items', 'total_cost', 'total_items', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        # Price every line in one pass; items, products and the total all read these quotes
+        self._priced = price_items(instance.items.all())
+        self.context.setdefault('prices', {}).update(
+            (line.product.pk, line.quote) for line in self._priced.lines
+        )
+        return super().to_representation(instance)
+
+    def get_total_cost(self, obj):
+        return self._priced.subtotal
+
 
 class AddToCartSerializer(serializers.Serializer):
-    product_id = serializers.IntegerField()
+    product_id = serializers.UUIDField()
     quantity = serializers.IntegerField(min_value=1, default=1)
 
     def validate_product_id(self, value):
         try:
             from products.models import Product
             product = Product.objects.get(id=value, is_active=True)
-            if product.stock <= 0:
+            if product.stock_quantity <= 0:
                 raise serializers.ValidationError("Product is out of stock")
             return value
         except Product.DoesNotExist:
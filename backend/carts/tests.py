@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.testing import redis_or_skip
+from products.models import Category, Product
+
+
+ADDRESS = {
+    f'{kind}_{field}': 'x'
+    for kind in ('shipping', 'billing')
+    for field in ('address', 'city', 'state', 'country', 'postal_code')
+}
+
+
+class CartStockTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('alice@example.com', 'password', username='alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Tools')
+        self.product = Product.objects.create(
+            name='Hammer', sku='HAM-1', category=category, price=Decimal('10.00'), stock_quantity=5
+        )
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def add(self, quantity):
+        return self.client.post('/api/carts/add/', {'product_id': str(self.product.pk), 'quantity': quantity})
+
+    def test_adding_holds_stock_and_removing_returns_it(self):
+        self.assertEqual(self.add(2).status_code, 201)
+        self.assertEqual(self.stock(), 3)
+        item_id = self.user.cart.items.get().pk
+
+        self.assertEqual(self.client.put(f'/api/carts/item/{item_id}/', {'quantity': 4}).status_code, 200)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(self.client.put(f'/api/carts/item/{item_id}/', {'quantity': 6}).status_code, 400)
+        self.assertEqual(self.stock(), 1)
+
+        self.client.delete(f'/api/carts/item/{item_id}/remove/')
+        self.assertEqual(self.stock(), 5)
+
+    def test_cannot_hold_more_than_is_left(self):
+        self.assertEqual(self.add(6).status_code, 400)
+        self.assertEqual(self.stock(), 5)
+
+    def test_checkout_keeps_the_cart_hold_without_taking_more(self):
+        redis_or_skip()  # checkout claims flash sale units from Redis
+        self.add(2)
+        response = self.client.post('/api/orders/create/', {'from_cart': True, 'items': [], **ADDRESS}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.stock(), 3)
+        self.assertFalse(self.user.cart.items.exists())
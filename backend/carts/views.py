@@ -2,12 +2,41 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.db.models import F, Prefetch
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from .models import Cart, CartItem
 from .serializers import CartSerializer, AddToCartSerializer, UpdateCartItemSerializer
 from products.models import Product
 
 
+def cart_data(cart):
+    """Serialize a cart with its items, products and their relations loaded in a fixed number of queries"""
+    items = CartItem.objects.select_related('product__category', 'product__brand').prefetch_related(
+        'product__images', 'product__reviews__user'
+    )
+    cart = Cart.objects.prefetch_related(Prefetch('items', queryset=items)).get(pk=cart.pk)
+    return CartSerializer(cart).data
+
+
+def take_stock(product, quantity):
+    """Hold units of a product for a cart; False when fewer than that are left.
+
+    Carts hold stock from the moment an item is added, and an order placed from the
+    cart keeps it, so checkout takes nothing more.
+    """
+    return bool(Product.objects.filter(pk=product.pk, stock_quantity__gte=quantity).update(
+        stock_quantity=F('stock_quantity') - quantity, updated_at=timezone.now()
+    ))
+
+
+def return_stock(product, quantity):
+    """Give units held by a cart back to the product"""
+    Product.objects.filter(pk=product.pk).update(
+        stock_quantity=F('stock_quantity') + quantity, updated_at=timezone.now()
+    )
+
+
 def get_or_create_user_cart(user):
     """Get or create a cart for authenticated user"""
     cart, created = Cart.objects.get_or_create(user=user)
@@ -25,8 +54,7 @@ def get_or_create_guest_cart(session_key):
 def get_cart(request):
     """Get authenticated user's cart"""
     cart, created = Cart.objects.get_or_create(user=request.user)
-    serializer = CartSerializer(cart)
-    return Response(serializer.data)
+    return Response(cart_data(cart))
 
 
 @api_view(['POST'])
@@ -43,7 +71,7 @@ def add_to_cart(request):
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        if product.stock < quantity:
+        if not take_stock(product, quantity):
             return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
         
         cart, created = Cart.objects.get_or_create(user=request.user)
@@ -57,12 +85,7 @@ def add_to_cart(request):
             cart_item.quantity += quantity
             cart_item.save()
         
-        # Update product stock
-        product.stock -= quantity
-        product.save()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(cart_data(cart), status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -77,21 +100,17 @@ def update_cart_item(request, item_id):
     if serializer.is_valid():
         new_quantity = serializer.validated_data['quantity']
         
-        # Check if there's enough stock
-        if cart_item.product.stock + cart_item.quantity < new_quantity:
-            return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Adjust product stock
+        # Hold the extra units, or give back the ones no longer wanted
         stock_difference = new_quantity - cart_item.quantity
-        cart_item.product.stock -= stock_difference
-        cart_item.product.save()
+        if stock_difference > 0 and not take_stock(cart_item.product, stock_difference):
+            return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
+        if stock_difference < 0:
+            return_stock(cart_item.product, -stock_difference)
         
         cart_item.quantity = new_quantity
         cart_item.save()
         
-        cart = cart_item.cart
-        cart_serializer = CartSerializer(cart)
-        return Response(cart_serializer.data)
+        return Response(cart_data(cart_item.cart))
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -103,14 +122,12 @@ def remove_from_cart(request, item_id):
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     
     # Return stock to product
-    cart_item.product.stock += cart_item.quantity
-    cart_item.product.save()
+    return_stock(cart_item.product, cart_item.quantity)
     
     cart_item.delete()
     
     cart = get_or_create_user_cart(request.user)
-    cart_serializer = CartSerializer(cart)
-    return Response(cart_serializer.data)
+    return Response(cart_data(cart))
 
 
 @api_view(['DELETE'])
@@ -121,13 +138,11 @@ def clear_cart(request):
     
     # Return all stock to products
     for item in cart.items.all():
-        item.product.stock += item.quantity
-        item.product.save()
+        return_stock(item.product, item.quantity)
     
     cart.items.all().delete()
     
-    cart_serializer = CartSerializer(cart)
-    return Response(cart_serializer.data)
+    return Response(cart_data(cart))
 
 
 @api_view(['POST'])
@@ -148,7 +163,7 @@ def guest_add_to_cart(request):
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        if product.stock < quantity:
+        if not take_stock(product, quantity):
             return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
         
         cart = get_or_create_guest_cart(session_key)
@@ -162,12 +177,7 @@ def guest_add_to_cart(request):
             cart_item.quantity += quantity
             cart_item.save()
         
-        # Update product stock
-        product.stock -= quantity
-        product.save()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(cart_data(cart), status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -188,5 +198,4 @@ def guest_get_cart(request):
         })
     
     cart, created = Cart.objects.get_or_create(session_key=session_key)
-    serializer = CartSerializer(cart)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(cart_data(cart))
\ No newline at end of file
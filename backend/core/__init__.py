@@ -1 +1,4 @@
-"""Core package for the Smart E-Commerce platform."""
\ No newline at end of file
+"""Core package for the Smart E-Commerce platform."""
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
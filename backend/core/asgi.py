@@ -0,0 +1,20 @@
+"""
+ASGI config for Smart E-Commerce platform.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker``
+or ``uvicorn core.asgi:application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Route I/O-bound endpoints to their async implementations under ASGI
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
@@ -0,0 +1,52 @@
+"""Helpers for the async (ASGI) views of the Smart E-Commerce platform.
+
+DRF 3.14 views are sync-only, so async views are plain Django views that
+reuse the DRF authentication class and serializers where it matters.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+
+
+def api_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=DjangoJSONEncoder)
+
+
+async def authenticate(request):
+    """Authenticate a bearer token with the default DRF authentication class."""
+    from accounts.authentication import CachedJWTAuthentication
+    result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    if result is None:
+        return AnonymousUser(), None
+    return result
+
+
+def async_api_view(methods, login_required=False):
+    """Decorate an async view with method checks, JWT auth and DRF-style errors."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return api_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                request.user, request.auth = await authenticate(request)
+            except APIException as exc:
+                return api_response({'detail': str(exc.detail)}, status=exc.status_code)
+            if login_required and not request.user.is_authenticated:
+                return api_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+            return await view(request, *args, **kwargs)
+        # Token-authenticated like the DRF views; csrf_exempt() cannot wrap coroutines on Django 4.2
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def parse_json_body(request):
+    if not request.body:
+        return {}
+    return json.loads(request.body)
@@ -0,0 +1,90 @@
+"""Per-process copies of data that is expensive to build.
+
+Category trees, coupon and flash sale indexes, the payment gateway registry
+and the search suggestion index are all read on hot paths and change
+rarely. Each process keeps its own copy in memory. Writers publish a new
+version key to the shared cache, and at most once per check interval a
+process compares that key with the version its copy was built from and
+reloads when they differ. While the shared cache is unreachable the
+current copy keeps being served.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve(value):
+    return value() if callable(value) else value
+
+
+class VersionedProcessCache:
+    """A value built by ``loader`` and rebuilt when the shared version key changes.
+
+    ``version_key`` and ``check_interval`` may be callables, read at every
+    check so they follow settings. ``description`` names the value in log
+    messages.
+    """
+
+    _STALE = object()
+
+    def __init__(self, loader, version_key, check_interval, description):
+        self.loader = loader
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.description = description
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = self._STALE
+        self._next_check = 0.0
+
+    @property
+    def current(self):
+        """The value held now, without checking its version; None before the first load."""
+        return self._value
+
+    def is_fresh(self):
+        return self._value is not None and time.monotonic() < self._next_check
+
+    def _shared_version(self):
+        try:
+            return cache.get(_resolve(self.version_key))
+        except Exception:
+            logger.warning('%s version check failed', self.description, exc_info=True)
+            return self._version if self._value is not None else None
+
+    def get(self):
+        if self.is_fresh():
+            return self._value
+        with self._lock:
+            if not self.is_fresh():
+                version = self._shared_version()
+                if self._value is None or version != self._version:
+                    self._value = self.loader()
+                    self._version = version
+                self._next_check = time.monotonic() + _resolve(self.check_interval)
+            return self._value
+
+    async def aget(self):
+        if self.is_fresh():
+            return self._value
+        return await sync_to_async(self.get)()
+
+    def invalidate(self):
+        """Reload this process's copy at the next read."""
+        self._version = self._STALE
+        self._next_check = 0.0
+
+    def bump(self):
+        """Tell every process to reload its copy."""
+        try:
+            cache.set(_resolve(self.version_key), uuid.uuid4().hex, None)
+        except Exception:
+            logger.warning('Could not publish %s version', self.description.lower(), exc_info=True)
+        self.invalidate()
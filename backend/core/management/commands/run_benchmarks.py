@@ -0,0 +1,56 @@
+"""Run the API benchmark scenarios and write a JSON report."""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmarks.runner import compare_reports, environment_info, run_scenario
+from benchmarks.scenarios import SCENARIOS, BenchmarkContext
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API endpoints against the seeded dataset and report latency percentiles as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"scenario names (default: all of {', '.join(SCENARIOS)})")
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='write the JSON report to this file')
+        parser.add_argument('--compare', help='previous JSON report to diff against')
+        parser.add_argument('--keep-rate-limits', action='store_true',
+                            help='leave RateLimitMiddleware enabled (every client shares one IP)')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['keep_rate_limits']:
+            overrides['RATE_LIMITS'] = {**getattr(settings, 'RATE_LIMITS', {}), 'ENABLED': False}
+
+        with override_settings(**overrides):
+            context = BenchmarkContext(seed=options['seed'])
+            report = {'environment': environment_info(), 'scenarios': {}}
+            for name in names:
+                self.stderr.write(f'Running {name}...')
+                report['scenarios'][name] = run_scenario(
+                    SCENARIOS[name](), context,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    concurrency=options['concurrency'],
+                )
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as fh:
+                report['delta'] = compare_reports(json.load(fh), report)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,220 @@
+"""Seed a synthetic dataset for the benchmark suite."""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from accounts.models import User, UserProfile
+from analytics.models import ProductView as AnalyticsProductView
+from orders.models import Order, OrderItem
+from products.categories import bump_category_tree_version
+from products.models import Brand, Category, Product, ProductReview, ProductView
+from products.search import bump_search_generation
+
+
+BENCHMARK_EMAIL_DOMAIN = 'bench.example.com'
+BENCHMARK_PASSWORD = 'bench-password-123'
+
+WORDS = (
+    'wireless smart classic premium organic portable leather cotton steel ultra '
+    'compact deluxe vintage modern outdoor kitchen travel gaming studio eco'
+).split()
+NOUNS = (
+    'headphones phone watch shoe jacket kettle blender backpack lamp speaker '
+    'camera keyboard mouse bottle chair desk blanket mug charger sunglasses'
+).split()
+COLORS = ['black', 'white', 'red', 'blue', 'green', 'grey', 'yellow', '']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', '']
+MATERIALS = ['cotton', 'leather', 'steel', 'plastic', 'wood', 'glass', '']
+
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic dataset (products, reviews, users, orders, views) for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--views', type=int, default=50000)
+        parser.add_argument('--categories', type=int, default=40)
+        parser.add_argument('--brands', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--flush', action='store_true', help='delete previously seeded benchmark data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        if options['flush']:
+            self.flush()
+
+        with transaction.atomic():
+            categories = self.seed_categories(options['categories'])
+            brands = self.seed_brands(options['brands'])
+            products = self.seed_products(options['products'], categories, brands)
+            users = self.seed_users(options['users'])
+            self.seed_reviews(options['reviews'], products, users)
+            self.seed_orders(options['orders'], products, users)
+            self.seed_views(options['views'], products, users)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(products)} products, {len(users)} users, {options['reviews']} reviews, "
+            f"{options['orders']} orders and {options['views']} views"
+        ))
+
+    def flush(self):
+        users = User.objects.filter(email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}')
+        Order.objects.filter(user__in=users).delete()
+        Product.objects.filter(sku__startswith='BENCH-').delete()
+        Category.objects.filter(slug__startswith='bench-').delete()
+        Brand.objects.filter(name__startswith='Bench ').delete()
+        users.delete()
+
+    def seed_categories(self, count):
+        roots = [
+            Category(name=f'Bench Department {i}', slug=f'bench-department-{i}')
+            for i in range(max(1, count // 5))
+        ]
+        Category.objects.bulk_create(roots, batch_size=self.batch_size)
+        children = [
+            Category(name=f'Bench Category {i}', slug=f'bench-category-{i}', parent=self.rng.choice(roots))
+            for i in range(count - len(roots))
+        ]
+        Category.objects.bulk_create(children, batch_size=self.batch_size)
+        # bulk_create sends no signals, so publish the new tree explicitly
+        transaction.on_commit(bump_category_tree_version)
+        return children or roots
+
+    def seed_brands(self, count):
+        brands = [Brand(name=f'Bench Brand {i}') for i in range(count)]
+        return Brand.objects.bulk_create(brands, batch_size=self.batch_size)
+
+    def seed_products(self, count, categories, brands):
+        products = []
+        for i in range(count):
+            name = f'{self.rng.choice(WORDS).title()} {self.rng.choice(WORDS)} {self.rng.choice(NOUNS)} {i}'
+            price = Decimal(self.rng.randint(500, 500000)) / 100
+            discount_price = None
+            discount_percent = None
+            if self.rng.random() < 0.3:
+                discount_price = (price * Decimal(self.rng.randint(50, 95)) / 100).quantize(Decimal('0.01'))
+                discount_percent = ((price - discount_price) / price * 100).quantize(Decimal('0.01'))
+            products.append(Product(
+                name=name,
+                slug=f'{slugify(name)}-{i}',
+                description=f'{name}. ' * 5,
+                short_description=name,
+                sku=f'BENCH-{i:08d}',
+                category=self.rng.choice(categories),
+                brand=self.rng.choice(brands),
+                price=price,
+                discount_price=discount_price,
+                discount_percent=discount_percent,
+                tax_rate=self.rng.choice([Decimal('0'), Decimal('7.5'), Decimal('15')]),
+                stock_quantity=self.rng.randint(0, 500),
+                is_featured=self.rng.random() < 0.05,
+                is_trending=self.rng.random() < 0.05,
+                color=self.rng.choice(COLORS),
+                size=self.rng.choice(SIZES),
+                material=self.rng.choice(MATERIALS),
+                shipping_cost=Decimal(self.rng.choice([0, 0, 500, 1000])) / 100,
+                rating=Decimal(self.rng.randint(0, 50)) / 10,
+            ))
+        products = Product.objects.bulk_create(products, batch_size=self.batch_size)
+        transaction.on_commit(bump_search_generation)
+        return products
+
+    def seed_users(self, count):
+        password = make_password(BENCHMARK_PASSWORD)  # hash once, not per user
+        users = [
+            User(
+                email=f'user{i}@{BENCHMARK_EMAIL_DOMAIN}',
+                username=f'bench_user_{i}',
+                password=password,
+                first_name='Bench',
+                last_name=f'User{i}',
+                is_staff=(i == 0),
+                user_type='admin' if i == 0 else 'customer',
+            )
+            for i in range(count)
+        ]
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        UserProfile.objects.bulk_create([UserProfile(user=u) for u in users], batch_size=self.batch_size)
+        return users
+
+    def seed_reviews(self, count, products, users):
+        seen = set()
+        reviews = []
+        attempts = 0
+        while len(reviews) < count and attempts < count * 3:
+            attempts += 1
+            product = self.rng.choice(products)
+            user = self.rng.choice(users)
+            if (product.pk, user.pk) in seen:
+                continue
+            seen.add((product.pk, user.pk))
+            reviews.append(ProductReview(
+                product=product,
+                user=user,
+                rating=self.rng.randint(1, 5),
+                title='Benchmark review',
+                comment='Synthetic review generated for benchmarks.',
+            ))
+        ProductReview.objects.bulk_create(reviews, batch_size=self.batch_size)
+
+    def seed_orders(self, count, products, users):
+        orders = []
+        for _ in range(count):
+            orders.append(Order(
+                user=self.rng.choice(users),
+                order_number=f'ORD-{uuid.UUID(int=self.rng.getrandbits(128)).hex[:12].upper()}',
+                status=self.rng.choice(['pending', 'confirmed', 'delivered', 'cancelled']),
+                payment_status=self.rng.choice(['paid', 'paid', 'paid', 'pending']),
+                shipping_address='1 Benchmark Way', shipping_city='Accra', shipping_state='Greater Accra',
+                shipping_country='Ghana', shipping_postal_code='00233',
+                billing_address='1 Benchmark Way', billing_city='Accra', billing_state='Greater Accra',
+                billing_country='Ghana', billing_postal_code='00233',
+            ))
+        orders = Order.objects.bulk_create(orders, batch_size=self.batch_size)
+
+        items = []
+        for order in orders:
+            subtotal = Decimal('0')
+            for product in self.rng.sample(products, k=min(len(products), self.rng.randint(1, 5))):
+                quantity = self.rng.randint(1, 3)
+                price = product.discount_price or product.price
+                items.append(OrderItem(
+                    order=order, product=product, quantity=quantity, price=price, total_price=price * quantity
+                ))
+                subtotal += price * quantity
+            order.subtotal = subtotal
+            order.total_amount = subtotal
+        OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        Order.objects.bulk_update(orders, ['subtotal', 'total_amount'], batch_size=self.batch_size)
+
+        # created_at is auto_now_add, so spread orders over the last month afterwards
+        for order in orders:
+            order.created_at = self.now - timedelta(days=self.rng.randint(0, 29), minutes=self.rng.randint(0, 1439))
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=self.batch_size)
+
+    def seed_views(self, count, products, users):
+        views = []
+        analytics_views = []
+        for _ in range(count):
+            product = self.rng.choice(products)
+            user = self.rng.choice(users) if self.rng.random() < 0.6 else None
+            ip_address = f'10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}'
+            timestamp = self.now - timedelta(minutes=self.rng.randint(0, 30 * 1440))
+            views.append(ProductView(product=product, user=user, ip_address=ip_address, timestamp=timestamp))
+            analytics_views.append(AnalyticsProductView(product=product, user=user, ip_address=ip_address))
+        ProductView.objects.bulk_create(views, batch_size=self.batch_size)
+        AnalyticsProductView.objects.bulk_create(analytics_views, batch_size=self.batch_size)
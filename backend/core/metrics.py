@@ -0,0 +1,263 @@
+"""Request metrics collection for the Smart E-Commerce platform.
+
+The request thread only enqueues a small tuple; a background thread drains
+the queue in batches, updates the per-route latency histograms and writes the
+batch to the configured sink (structured log file or Redis stream).
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SINK': 'file',  # 'file', 'redis' or None
+    'LOG_FILE': 'logs/requests.jsonl',
+    'REDIS_STREAM': 'metrics:requests',
+    'REDIS_STREAM_MAXLEN': 100000,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,  # seconds
+}
+
+
+def get_metrics_settings():
+    """Return request metrics settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'REQUEST_METRICS', {}))
+    return config
+
+
+# Bucket upper bounds in milliseconds, roughly 10% apart from 0.1ms to 60s.
+BUCKET_BOUNDS = tuple(round(0.1 * (1.1 ** i), 3) for i in range(141))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.status_counts = {}
+
+    def observe(self, duration_ms, status_code):
+        self.counts[bisect_left(BUCKET_BOUNDS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+        status_class = f'{status_code // 100}xx'
+        self.status_counts[status_class] = self.status_counts.get(status_class, 0) + 1
+
+    def percentile(self, q):
+        """Return the bucket upper bound containing the q-th quantile (0-1)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                if index < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[index], self.max_ms)
+                return self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 3),
+            'status': dict(self.status_counts),
+        }
+
+
+class FileSink:
+    """Append metric batches to a JSON Lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, records):
+        lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            fh.write(lines)
+
+
+class RedisStreamSink:
+    """Append metric batches to a capped Redis stream with one pipeline round trip."""
+
+    def __init__(self, stream, maxlen):
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection('default')
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def write(self, records):
+        pipe = self.client.pipeline(transaction=False)
+        for record in records:
+            pipe.xadd(self.stream, {k: str(v) for k, v in record.items()},
+                      maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+
+def build_sink(config):
+    """Instantiate the sink named in the metrics settings."""
+    if config['SINK'] == 'file':
+        path = config['LOG_FILE']
+        if not os.path.isabs(path):
+            path = os.path.join(settings.BASE_DIR, path)
+        return FileSink(path)
+    if config['SINK'] == 'redis':
+        return RedisStreamSink(config['REDIS_STREAM'], config['REDIS_STREAM_MAXLEN'])
+    return None
+
+
+class RequestMetrics:
+    """Process-local request metrics recorder with a batching background writer."""
+
+    def __init__(self, config=None, sink=None):
+        self.config = config or get_metrics_settings()
+        self._sink = sink
+        self._queue = queue.Queue(maxsize=self.config['QUEUE_SIZE'])
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def record(self, method, route, status_code, duration_ms, user_id=None):
+        """Enqueue a request sample. Never blocks and never performs I/O."""
+        if not self.config['ENABLED']:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((time.time(), method, route, status_code, duration_ms, user_id))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so restart the writer in each worker process.
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            if self._pid is not None:
+                self._queue = queue.Queue(maxsize=self.config['QUEUE_SIZE'])
+                self._histograms = {}
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='request-metrics', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        if self._sink is None:
+            try:
+                self._sink = build_sink(self.config)
+            except Exception:
+                logger.exception('Could not initialise request metrics sink')
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._process(batch)
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.config['FLUSH_INTERVAL'])
+        except queue.Empty:
+            return []
+        batch = [first]
+        while len(batch) < self.config['BATCH_SIZE']:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, batch):
+        with self._lock:
+            for _, method, route, status_code, duration_ms, _ in batch:
+                key = f'{method} {route}'
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.observe(duration_ms, status_code)
+
+        if self._sink is None:
+            return
+        records = [
+            {
+                'timestamp': timestamp,
+                'method': method,
+                'route': route,
+                'status_code': status_code,
+                'duration_ms': round(duration_ms, 3),
+                'user_id': user_id or '',
+            }
+            for timestamp, method, route, status_code, duration_ms, user_id in batch
+        ]
+        try:
+            self._sink.write(records)
+        except Exception:
+            logger.exception('Failed to write %d request metric records', len(records))
+
+    def flush(self, timeout=5.0):
+        """Process everything currently queued on the calling thread."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            batch = []
+            while len(batch) < self.config['BATCH_SIZE']:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._process(batch)
+
+    def snapshot(self):
+        """Return per-route latency summaries for this process."""
+        with self._lock:
+            routes = {key: histogram.summary() for key, histogram in self._histograms.items()}
+        return {
+            'pid': os.getpid(),
+            'queued': self._queue.qsize(),
+            'dropped': self.dropped,
+            'routes': routes,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.dropped = 0
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_request_metrics():
+    """Return the process-wide request metrics recorder."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = RequestMetrics()
+    return _metrics
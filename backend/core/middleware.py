@@ -1,46 +1,150 @@
 """Custom middleware for the Smart E-Commerce platform."""
 import json
 import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
-from utils.logging import log_request
+from .metrics import get_request_metrics
+from .profiling import QueryProfiler, get_profiling_settings, view_query_stats
+from .ratelimit import (
+    RateLimitRule, build_rate_limiter, get_client_ip, get_rate_limit_settings,
+    get_token_user_id, retry_after_header
+)
 
 
 class RequestLoggingMiddleware(MiddlewareMixin):
-    """Middleware to log API requests for analytics and debugging."""
+    """Middleware to record API request metrics for analytics and debugging."""
     
     def process_request(self, request):
-        request.start_time = time.time()
+        request.start_time = time.perf_counter()
         return None
 
     def process_response(self, request, response):
         if hasattr(request, 'start_time') and request.path.startswith('/api/'):
-            duration = time.time() - request.start_time
+            duration_ms = (time.perf_counter() - request.start_time) * 1000
             
-            # Log request details
-            log_data = {
-                'method': request.method,
-                'path': request.path,
-                'user': str(request.user) if hasattr(request, 'user') and request.user.is_authenticated else 'Anonymous',
-                'status_code': response.status_code,
-                'duration': duration,
-                'timestamp': time.time(),
-            }
+            # Use the route template so histograms don't explode per object id
+            resolver_match = getattr(request, 'resolver_match', None)
+            route = resolver_match.route if resolver_match else 'unresolved'
+            user = getattr(request, 'user', None)
+            user_id = str(user.pk) if user is not None and user.is_authenticated else None
             
-            # Log to file or external service
-            log_request(log_data)
+            # Enqueue only; the metrics writer thread handles histograms and the sink
+            get_request_metrics().record(request.method, route, response.status_code, duration_ms, user_id)
+        
+        return response
+
+
+class QueryProfilingMiddleware:
+    """Opt-in middleware recording query count, DB time and duplicate queries per request.
+    
+    Works in both sync and async stacks. Under ASGI the ORM runs in the
+    request's thread-sensitive executor thread, so the profiler is installed
+    on that thread's connections rather than the event loop's.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_profiling_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profiler = QueryProfiler()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.install(stack, profiler)
+            response = self.get_response(request)
+        return self.record(request, response, profiler, start)
+    
+    async def __acall__(self, request):
+        profiler = QueryProfiler()
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.install)(stack, profiler)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, profiler, start)
+    
+    def install(self, stack, profiler):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profiler))
+    
+    def record(self, request, response, profiler, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = (resolver_match.view_name or resolver_match.route) if resolver_match else 'unresolved'
+        threshold = self.config['DUPLICATE_THRESHOLD']
+        view_query_stats.add(view_name, profiler, threshold)
+        
+        if self.config['SERVER_TIMING']:
+            duplicates = sum(n - 1 for n in profiler.duplicates(threshold).values())
+            timing = (
+                f'db;dur={profiler.duration_ms:.2f};desc="{profiler.count} queries", '
+                f'dbdup;desc="{duplicates} duplicate queries", '
+                f'app;dur={total_ms:.2f}'
+            )
+            if response.has_header('Server-Timing'):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response['Server-Timing'] = timing
         
         return response
 
 
 class RateLimitMiddleware(MiddlewareMixin):
-    """Middleware to implement rate limiting."""
+    """Middleware to implement token-bucket rate limiting.
+    
+    Runs before authentication and sessions so throttled requests never reach
+    the database. The first rule in ``settings.RATE_LIMITS['RULES']`` whose
+    pattern matches the path is applied.
+    """
+    
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.config = get_rate_limit_settings()
+        self.rules = [RateLimitRule(**rule) for rule in self.config['RULES']]
+        self.limiter = build_rate_limiter(self.config) if self.config['ENABLED'] else None
     
     def process_request(self, request):
-        # Implement rate limiting logic here
-        # This is a simplified version - in production, use django-ratelimit
-        return None
+        if self.limiter is None:
+            return None
+        
+        rule = next((r for r in self.rules if r.matches(request)), None)
+        if rule is None:
+            return None
+        
+        user_id = get_token_user_id(request) if rule.scope == 'user' else None
+        if user_id:
+            key = f'{rule.name}:u:{user_id}'
+        else:
+            key = f'{rule.name}:ip:{get_client_ip(request, self.config["TRUSTED_PROXY_DEPTH"])}'
+        
+        allowed, retry_after = self.limiter.hit(key, rule.rate, rule.capacity)
+        if allowed:
+            return None
+        
+        response = JsonResponse(
+            {'error': 'Too many requests', 'retry_after': retry_after_header(retry_after)},
+            status=429
+        )
+        response['Retry-After'] = retry_after_header(retry_after)
+        return response
 
 
 class SecurityHeadersMiddleware(MiddlewareMixin):
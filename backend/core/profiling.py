@@ -0,0 +1,115 @@
+"""Per-request database query profiling for the Smart E-Commerce platform.
+
+Opt in with ``settings.QUERY_PROFILING['ENABLED']``. Each request gets a
+``QueryProfiler`` installed through ``connection.execute_wrapper`` that
+counts queries, accumulates DB time and fingerprints the SQL so repeated
+statements (usually N+1 lookups) stand out.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def get_profiling_settings():
+    config = {
+        'ENABLED': False,
+        'SERVER_TIMING': True,
+        'DUPLICATE_THRESHOLD': 2,  # report fingerprints executed at least this many times
+    }
+    config.update(getattr(settings, 'QUERY_PROFILING', {}))
+    return config
+
+
+def fingerprint(sql):
+    """Normalise SQL so queries differing only by parameters compare equal."""
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _LITERAL_RE.sub('?', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class QueryProfiler:
+    """``execute_wrapper`` callable that records query count, time and fingerprints."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    def duplicates(self, threshold=2):
+        return {sql: n for sql, n in self.fingerprints.most_common() if n >= threshold}
+
+
+class ViewQueryStats:
+    """Process-wide aggregate of query profiles keyed by view name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view_name, profiler, duplicate_threshold=2):
+        duplicates = profiler.duplicates(duplicate_threshold)
+        with self._lock:
+            stats = self._views.get(view_name)
+            if stats is None:
+                stats = self._views[view_name] = {
+                    'requests': 0,
+                    'queries': 0,
+                    'max_queries': 0,
+                    'db_ms': 0.0,
+                    'max_db_ms': 0.0,
+                    'duplicate_queries': 0,
+                    'top_duplicates': Counter(),
+                }
+            stats['requests'] += 1
+            stats['queries'] += profiler.count
+            stats['max_queries'] = max(stats['max_queries'], profiler.count)
+            stats['db_ms'] += profiler.duration_ms
+            stats['max_db_ms'] = max(stats['max_db_ms'], profiler.duration_ms)
+            stats['duplicate_queries'] += sum(n - 1 for n in duplicates.values())
+            stats['top_duplicates'].update(duplicates)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for view_name, stats in self._views.items():
+                requests = stats['requests']
+                result[view_name] = {
+                    'requests': requests,
+                    'avg_queries': round(stats['queries'] / requests, 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_ms': round(stats['db_ms'] / requests, 3),
+                    'max_db_ms': round(stats['max_db_ms'], 3),
+                    'avg_duplicate_queries': round(stats['duplicate_queries'] / requests, 2),
+                    'top_duplicates': [
+                        {'sql': sql, 'count': n} for sql, n in stats['top_duplicates'].most_common(5)
+                    ],
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+
+view_query_stats = ViewQueryStats()
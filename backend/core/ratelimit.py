@@ -0,0 +1,186 @@
+"""Token-bucket rate limiting for the Smart E-Commerce platform.
+
+Buckets live in Redis and are updated with a single Lua call per request so
+every worker shares the same budget. When Redis is unreachable the limiter
+falls back to per-process buckets until Redis comes back.
+"""
+import logging
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET_SCRIPT = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(retry_after), tostring(tokens)}
+"""
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """Parse '100/m' style rates into (tokens per second, default capacity)."""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    seconds = PERIODS[period.strip().lower()]
+    return count / seconds, count
+
+
+class RateLimitRule:
+    """A compiled rate limit rule from ``settings.RATE_LIMITS['RULES']``."""
+
+    def __init__(self, name, pattern, rate, burst=None, scope='user', methods=None):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.rate, capacity = parse_rate(rate)
+        self.capacity = burst or capacity
+        self.scope = scope  # 'user' falls back to IP for anonymous requests, 'ip' always uses IP
+        self.methods = {m.upper() for m in methods} if methods else None
+
+    def matches(self, request):
+        if self.methods and request.method not in self.methods:
+            return False
+        return self.pattern.match(request.path) is not None
+
+
+class LocalTokenBuckets:
+    """In-process token buckets used when Redis is unavailable."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._evict(now)
+        return allowed, retry_after
+
+    def _evict(self, now):
+        # Drop buckets that have been idle long enough to be full again
+        stale = [k for k, (_, ts) in self._buckets.items() if now - ts > 3600]
+        for k in stale or list(self._buckets)[: self.max_keys // 10]:
+            del self._buckets[k]
+
+
+class RedisTokenBuckets:
+    """Shared token buckets updated atomically by a Lua script."""
+
+    def __init__(self, client, prefix='rl'):
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def hit(self, key, rate, capacity):
+        allowed, retry_after, _ = self.script(keys=[f'{self.prefix}:{key}'], args=[rate, capacity])
+        return bool(int(allowed)), float(retry_after)
+
+
+class RateLimiter:
+    """Redis-backed limiter with a local fallback and a cool-off after Redis errors."""
+
+    def __init__(self, redis_buckets=None, local_buckets=None, retry_interval=5.0):
+        self.redis_buckets = redis_buckets
+        self.local_buckets = local_buckets or LocalTokenBuckets()
+        self.retry_interval = retry_interval
+        self._redis_down_until = 0.0
+
+    def hit(self, key, rate, capacity):
+        if self.redis_buckets is not None and time.monotonic() >= self._redis_down_until:
+            try:
+                return self.redis_buckets.hit(key, rate, capacity)
+            except Exception:
+                logger.warning('Rate limiter falling back to in-process buckets', exc_info=True)
+                self._redis_down_until = time.monotonic() + self.retry_interval
+        return self.local_buckets.hit(key, rate, capacity)
+
+
+def get_rate_limit_settings():
+    config = {
+        'ENABLED': True,
+        'BACKEND': 'redis',  # 'redis' or 'local'
+        'KEY_PREFIX': 'rl',
+        'TRUSTED_PROXY_DEPTH': 0,  # X-Forwarded-For hops set by our own proxies; 0 uses REMOTE_ADDR
+        'RULES': [],
+    }
+    config.update(getattr(settings, 'RATE_LIMITS', {}))
+    return config
+
+
+def build_rate_limiter(config):
+    redis_buckets = None
+    if config['BACKEND'] == 'redis':
+        try:
+            from django_redis import get_redis_connection
+            redis_buckets = RedisTokenBuckets(get_redis_connection('default'), config['KEY_PREFIX'])
+        except Exception:
+            logger.warning('Redis unavailable for rate limiting, using in-process buckets', exc_info=True)
+    return RateLimiter(redis_buckets)
+
+
+def get_client_ip(request, proxy_depth=0):
+    """Return the client IP, trusting ``proxy_depth`` entries of X-Forwarded-For.
+
+    The header is client-controlled unless a proxy we run rewrites it, so it is
+    only read when ``proxy_depth`` says how many trusted proxies append to it.
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for and proxy_depth:
+        hops = [ip.strip() for ip in x_forwarded_for.split(',') if ip.strip()]
+        if hops:
+            return hops[-min(proxy_depth, len(hops))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_token_user_id(request):
+    """Read the user id from a bearer token without touching the database."""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        from rest_framework_simplejwt.tokens import AccessToken
+        from rest_framework_simplejwt.settings import api_settings
+        return str(AccessToken(header[7:].strip())[api_settings.USER_ID_CLAIM])
+    except Exception:
+        return None
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
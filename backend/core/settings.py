@@ -7,6 +7,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +42,7 @@ INSTALLED_APPS = [
     'celery',
     
     # Local apps
+    'core',
     'accounts',
     'products',
     'categories',
@@ -53,6 +56,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.RateLimitMiddleware',
+    'core.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +87,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
+
+# Serve I/O-bound endpoints (payments, product detail) from async views.
+# core/asgi.py turns this on; under WSGI the sync DRF views are used.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False').lower() == 'true'
 
 
 # Database
@@ -99,6 +109,30 @@ DATABASES = {
 }
 
 
+# Password hashing
+# The first hasher is used for new hashes; existing hashes are upgraded on login.
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunedArgon2PasswordHasher',
+    'accounts.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+PASSWORD_HASHING = {
+    'ARGON2_TIME_COST': int(os.environ.get('ARGON2_TIME_COST', 2)),
+    'ARGON2_MEMORY_COST': int(os.environ.get('ARGON2_MEMORY_COST', 19456)),  # KiB
+    'ARGON2_PARALLELISM': int(os.environ.get('ARGON2_PARALLELISM', 1)),
+    'SCRYPT_WORK_FACTOR': int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 14)),
+    'VERIFY_POOL': os.environ.get('PASSWORD_VERIFY_POOL', 'thread') or None,  # 'thread', 'process' or ''
+    'VERIFY_POOL_SIZE': int(os.environ['PASSWORD_VERIFY_POOL_SIZE']) if os.environ.get('PASSWORD_VERIFY_POOL_SIZE') else None,
+    'VERIFY_TIMEOUT': 10.0,
+    'BUSY_RETRY_AFTER': 5,
+}
+
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.OffloadedModelBackend',
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -155,7 +189,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -176,11 +210,27 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
 }
 
+# Seconds an authenticated user stays cached for CachedJWTAuthentication
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 300))
+
 # Redis Configuration
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
 REDIS_PORT = os.environ.get('REDIS_PORT', 6379)
 REDIS_DB = os.environ.get('REDIS_DB', 0)
 
+# Cache Configuration
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'SOCKET_CONNECT_TIMEOUT': 0.5,
+            'SOCKET_TIMEOUT': 0.5,
+        },
+    }
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
@@ -188,9 +238,82 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
+# Refund calls get their own queue so a refund backlog never delays emails or login bookkeeping
+CELERY_TASK_ROUTES = {
+    'payments.tasks.process_refund': {'queue': 'refunds'},
+}
+# Periodic jobs run by `celery -A core beat`
+CELERY_BEAT_SCHEDULE = {
+    # Flips promotion is_live flags and arms timers for the boundaries in the next interval
+    'plan-promotion-boundaries': {
+        'task': 'promotions.tasks.plan_promotion_boundaries',
+        'schedule': 60.0,
+    },
+    'reconcile-flash-sales': {
+        'task': 'promotions.tasks.reconcile_flash_sales',
+        'schedule': 300.0,
+    },
+    'expire-flash-sale-reservations': {
+        'task': 'promotions.tasks.expire_flash_sale_reservations',
+        'schedule': 60.0,
+    },
+    'rebuild-search-suggestions': {
+        'task': 'products.tasks.rebuild_search_suggestions',
+        'schedule': 600.0,
+    },
+    'build-product-recommendations': {
+        'task': 'products.tasks.build_product_recommendations',
+        'schedule': 3600.0,
+    },
+}
+
+# Rate limiting (see core.ratelimit). The first matching rule applies.
+RATE_LIMITS = {
+    'ENABLED': os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() == 'true',
+    'BACKEND': os.environ.get('RATE_LIMIT_BACKEND', 'redis'),  # 'redis' or 'local'
+    'KEY_PREFIX': 'rl',
+    # Number of reverse proxies in front of the app that append to X-Forwarded-For. Keep 0 when
+    # clients connect directly, otherwise they can pick their own rate-limit key; set it to 1 behind
+    # a single load balancer or nginx, 2 behind a CDN plus a load balancer, and so on.
+    'TRUSTED_PROXY_DEPTH': int(os.environ.get('RATE_LIMIT_PROXY_DEPTH', 0)),
+    'RULES': [
+        {'name': 'auth', 'pattern': r'^/api/auth/(login|register)/', 'rate': '10/m', 'scope': 'ip',
+         'methods': ['POST']},
+        {'name': 'webhooks', 'pattern': r'^/api/payments/webhooks/', 'rate': '6000/m', 'burst': 1000,
+         'scope': 'ip'},
+        {'name': 'search', 'pattern': r'^/api/products/products/$', 'rate': '60/m', 'burst': 20},
+        # One request per keystroke while typing
+        {'name': 'suggest', 'pattern': r'^/api/products/suggest/$', 'rate': '600/m', 'burst': 60},
+        {'name': 'products', 'pattern': r'^/api/products/', 'rate': '300/m', 'burst': 60},
+        {'name': 'api', 'pattern': r'^/api/', 'rate': '600/m', 'burst': 120},
+    ],
+}
+
+# Query profiling (see core.profiling). Adds Server-Timing headers when enabled.
+QUERY_PROFILING = {
+    'ENABLED': os.environ.get('QUERY_PROFILING_ENABLED', 'False').lower() == 'true',
+    'SERVER_TIMING': True,
+    'DUPLICATE_THRESHOLD': 2,
+}
+
+# Request metrics (see core.metrics)
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('REQUEST_METRICS_ENABLED', 'True').lower() == 'true',
+    'SINK': os.environ.get('REQUEST_METRICS_SINK', 'file') or None,  # 'file', 'redis' or ''
+    'LOG_FILE': os.environ.get('REQUEST_METRICS_LOG_FILE', os.path.join(BASE_DIR, 'logs', 'requests.jsonl')),
+    'REDIS_STREAM': 'metrics:requests',
+    'REDIS_STREAM_MAXLEN': 100000,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+}
 
 # CORS Settings
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
 
 # Email Configuration
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -199,6 +322,8 @@ EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@localhost')
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
 # Payment Gateway Configuration
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
@@ -211,4 +336,135 @@ PAYPAL_CLIENT_SECRET = os.environ.get('PAYPAL_CLIENT_SECRET', '')
 FLUTTERWAVE_PUBLIC_KEY = os.environ.get('FLUTTERWAVE_PUBLIC_KEY', '')
 FLUTTERWAVE_SECRET_KEY = os.environ.get('FLUTTERWAVE_SECRET_KEY', '')
 
-PAYSTACK_SECRET_KEY = os.environ.get('PAYSTACK_SECRET_KEY', '')
\ No newline at end of file
+PAYSTACK_SECRET_KEY = os.environ.get('PAYSTACK_SECRET_KEY', '')
+# Payment gateway clients (see payments.gateways). Each gateway gets its own
+# pooled HTTP client, timeouts, retry policy and circuit breaker; credentials
+# stored in PaymentGateway.config override the ones below.
+PAYMENT_GATEWAYS = {
+    # Route every gateway to `manage.py run_mock_gateway` for local runs and benchmarks
+    'MOCK_URL': os.environ.get('PAYMENT_GATEWAY_MOCK_URL', ''),
+    'TIMEOUTS': {
+        'CONNECT': float(os.environ.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3.0)),
+        'READ': float(os.environ.get('PAYMENT_GATEWAY_READ_TIMEOUT', 10.0)),
+        'WRITE': 5.0,
+        'POOL': 2.0,
+    },
+    'POOL': {'MAX_CONNECTIONS': 20, 'MAX_KEEPALIVE': 10},
+    'RETRY': {'MAX_ATTEMPTS': 3, 'BACKOFF_BASE': 0.2, 'BACKOFF_CAP': 2.0},
+    'CIRCUIT_BREAKER': {'FAILURE_THRESHOLD': 5, 'RESET_TIMEOUT': 30.0},
+    # Workers compare their in-process gateway registry with the shared version key this often
+    'REGISTRY_CHECK_INTERVAL': float(os.environ.get('PAYMENT_GATEWAY_REGISTRY_CHECK_INTERVAL', 1.0)),
+    'GATEWAYS': {
+        'stripe': {
+            'BASE_URL': 'https://api.stripe.com',
+            'CREDENTIALS': {'secret_key': STRIPE_SECRET_KEY},
+        },
+        'paypal': {
+            'BASE_URL': os.environ.get('PAYPAL_API_URL', 'https://api-m.sandbox.paypal.com'),
+            'CREDENTIALS': {'client_id': PAYPAL_CLIENT_ID, 'client_secret': PAYPAL_CLIENT_SECRET},
+        },
+        'paystack': {
+            'BASE_URL': 'https://api.paystack.co',
+            'CREDENTIALS': {'secret_key': PAYSTACK_SECRET_KEY},
+        },
+        'flutterwave': {
+            'BASE_URL': 'https://api.flutterwave.com',
+            'CREDENTIALS': {'secret_key': FLUTTERWAVE_SECRET_KEY},
+        },
+    },
+}
+
+# Idempotency-Key handling for payment requests (see payments.idempotency)
+PAYMENT_IDEMPOTENCY = {
+    'REQUIRED': os.environ.get('PAYMENT_IDEMPOTENCY_REQUIRED', 'False').lower() == 'true',
+    'TTL': 24 * 3600,
+    'LOCK_TTL': 90,
+    'WAIT_TIMEOUT': 30.0,
+}
+
+# Refund worker pipeline (see payments.refunds)
+PAYMENT_REFUNDS = {
+    # Concurrent refund calls per gateway across all workers
+    'CONCURRENCY': {'DEFAULT': 4, 'stripe': 10, 'paypal': 4, 'paystack': 4, 'flutterwave': 4},
+    'LEASE_SECONDS': 60,
+    'MAX_GATEWAY_ATTEMPTS': 10,
+    'BULK_MAX_REFUNDS': 5000,
+}
+
+# Gateway webhook ingestion (see payments.webhooks)
+PAYMENT_WEBHOOKS = {
+    'SECRETS': {
+        'stripe': STRIPE_WEBHOOK_SECRET,
+        'paystack': PAYSTACK_SECRET_KEY,  # Paystack signs callbacks with the secret key
+        'flutterwave': os.environ.get('FLUTTERWAVE_WEBHOOK_HASH', ''),
+        'paypal': os.environ.get('PAYPAL_WEBHOOK_SECRET', ''),
+    },
+    'PARTITIONS': 8,  # events for one transaction reference always land in the same partition
+    'BATCH_SIZE': 500,
+}
+
+# In-process category tree (see products.categories)
+CATEGORY_TREE = {
+    'CHECK_INTERVAL': 1.0,
+}
+
+# Product listing facet counts (see products.facets)
+PRODUCT_FACETS = {
+    'CACHE_TTL': 300,
+    'PRICE_BANDS': [25, 50, 100, 250, 500, 1000],
+}
+
+# In-process product search index (see products.search); build the snapshot with
+# `manage.py build_search_index` so new workers map it instead of querying the catalog
+PRODUCT_SEARCH = {
+    'ENABLED': os.environ.get('PRODUCT_SEARCH_INDEX', 'False').lower() == 'true',
+    'SNAPSHOT_PATH': os.environ.get('PRODUCT_SEARCH_SNAPSHOT', str(BASE_DIR / 'var' / 'product-search.idx')),
+    'CHECK_INTERVAL': 1.0,
+}
+
+# Search box suggestions (see products.suggest), rebuilt by the
+# rebuild-search-suggestions entry in CELERY_BEAT_SCHEDULE
+PRODUCT_SUGGEST = {
+    'WINDOW_DAYS': 30,
+    'HALF_LIFE_DAYS': 7,
+    'MIN_SEARCHES': 2,
+}
+
+# Item-to-item recommendations (see products.recommendations), rebuilt by the
+# build-product-recommendations entry in CELERY_BEAT_SCHEDULE
+PRODUCT_RECOMMENDATIONS = {
+    'TOP_K': 20,
+    'PURCHASE_WINDOW_DAYS': 365,
+    'VIEW_WINDOW_DAYS': 90,
+}
+
+# Order totals, tax and shipping (see orders.pricing)
+ORDER_PRICING = {
+    'VECTOR_MIN_LINES': 64,
+}
+
+# Coupon rule index (see promotions.coupons)
+PROMOTION_COUPONS = {
+    'CHECK_INTERVAL': 1.0,
+    'MAX_ELIGIBLE': 20,
+}
+
+# Effective product prices with live flash sales (see promotions.pricing)
+PROMOTION_PRICING = {
+    'CHECK_INTERVAL': 1.0,
+}
+
+# Flash sale inventory counters in Redis (see promotions.inventory)
+PROMOTION_FLASH_SALES = {
+    'DEFAULT_PER_USER_LIMIT': int(os.environ.get('FLASH_SALE_PER_USER_LIMIT', 0)),  # 0 = only FlashSale.max_per_user
+    'RESERVATION_LIMIT': int(os.environ.get('FLASH_SALE_RESERVATION_LIMIT', 5)),
+    'RESERVATION_TTL': 600,  # expired holds are swept by the expire-flash-sale-reservations beat entry
+    'WRITE_BACK_DEBOUNCE': 2.0,
+}
+
+# Promotion start/end scheduler (see promotions.scheduler); keep BEAT_INTERVAL in
+# step with the plan-promotion-boundaries entry in CELERY_BEAT_SCHEDULE
+PROMOTION_SCHEDULER = {
+    'HORIZON': 3600,
+    'BEAT_INTERVAL': 60,
+}
@@ -0,0 +1,69 @@
+"""Test helpers for catching N+1 query patterns, and for tests that need Redis.
+
+Example::
+
+    class ProductListQueryTests(QueryCountAssertionsMixin, APITestCase):
+        def test_list_is_not_n_plus_one(self):
+            self.assertQueryCountConstant(
+                lambda: self.client.get('/api/products/products/'),
+                grow=lambda n: ProductFactory.create_batch(n),
+            )
+"""
+import unittest
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from .profiling import fingerprint
+
+
+def redis_or_skip(alias='default'):
+    """The django-redis client for a cache alias, skipping the test when Redis is not reachable."""
+    try:
+        from django_redis import get_redis_connection
+        client = get_redis_connection(alias)
+        client.ping()
+    except Exception:
+        raise unittest.SkipTest('Redis is not available')
+    return client
+
+
+def count_queries(func, using='default'):
+    """Run ``func`` and return ``(result, captured_queries)`` for the connection."""
+    with CaptureQueriesContext(connections[using]) as context:
+        result = func()
+    return result, list(context.captured_queries)
+
+
+class QueryCountAssertionsMixin:
+    """Assertions comparing query counts as the size of the result grows."""
+
+    def assertQueryCountConstant(self, fetch, grow, sizes=(1, 5), using='default', tolerance=0):
+        """Fail if ``fetch()`` issues more queries after ``grow(n)`` adds more rows.
+
+        ``grow(n)`` is called with the number of rows to add before each
+        measurement, so the result set size goes through ``sizes`` in turn.
+        """
+        counts = []
+        previous = 0
+        for size in sizes:
+            grow(size - previous)
+            previous = size
+            _, queries = count_queries(fetch, using)
+            counts.append((size, queries))
+
+        baseline_size, baseline_queries = counts[0]
+        for size, queries in counts[1:]:
+            if len(queries) > len(baseline_queries) + tolerance:
+                repeated = {}
+                for query in queries:
+                    key = fingerprint(query['sql'])
+                    repeated[key] = repeated.get(key, 0) + 1
+                repeated = '\n'.join(
+                    f'  {n}x {sql}' for sql, n in sorted(repeated.items(), key=lambda kv: -kv[1]) if n > 1
+                )
+                self.fail(
+                    f'Query count grew with result size: {len(baseline_queries)} queries for '
+                    f'{baseline_size} rows, {len(queries)} queries for {size} rows.\n'
+                    f'Repeated queries:\n{repeated}'
+                )
@@ -0,0 +1,47 @@
+"""Tests for the core helpers."""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .caching import VersionedProcessCache
+
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class VersionedProcessCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.loads = 0
+        self.now = 100.0
+        patcher = mock.patch('core.caching.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = VersionedProcessCache(self.load, 'tests:version', 5.0, 'Test value')
+
+    def load(self):
+        self.loads += 1
+        return self.loads
+
+    def test_serves_the_loaded_value_until_the_version_changes(self):
+        self.assertEqual(self.cache.get(), 1)
+        self.now += 10
+        self.assertEqual(self.cache.get(), 1)
+        cache.set('tests:version', 'v2')
+        self.assertEqual(self.cache.get(), 1)  # not checked again until the interval passes
+        self.now += 10
+        self.assertEqual(self.cache.get(), 2)
+
+    def test_bump_reloads_this_process_immediately(self):
+        self.cache.get()
+        self.cache.bump()
+        self.assertEqual(self.cache.get(), 2)
+        self.assertIsNotNone(cache.get('tests:version'))
+
+    def test_keeps_serving_when_the_shared_cache_fails(self):
+        self.cache.get()
+        self.now += 10
+        with mock.patch('core.caching.cache.get', side_effect=ConnectionError), self.assertLogs('core.caching'):
+            self.assertEqual(self.cache.get(), 1)
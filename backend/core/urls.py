@@ -17,6 +17,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,6 +30,8 @@ urlpatterns = [
     path('api/promotions/', include('promotions.urls')),
     path('api/reviews/', include('reviews.urls')),
     path('api/analytics/', include('analytics.urls')),
+    path('api/metrics/requests/', views.request_metrics, name='request-metrics'),
+    path('api/metrics/queries/', views.query_metrics, name='query-metrics'),
 ]
 
 # Serve media files during development
@@ -0,0 +1,39 @@
+"""Operational views for the Smart E-Commerce platform."""
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .metrics import get_request_metrics
+from .profiling import view_query_stats
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    """Get per-route latency percentiles recorded by this worker process."""
+    metrics = get_request_metrics()
+    data = metrics.snapshot()
+    
+    route_filter = request.query_params.get('route')
+    if route_filter:
+        data['routes'] = {k: v for k, v in data['routes'].items() if route_filter in k}
+    
+    return Response(data)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def query_metrics(request):
+    """Get per-view query counts and DB time aggregated by the profiling middleware."""
+    if request.method == 'DELETE':
+        view_query_stats.reset()
+    
+    views = view_query_stats.snapshot()
+    ordering = request.query_params.get('ordering', 'avg_queries')
+    if ordering not in ('avg_queries', 'max_queries', 'avg_db_ms', 'avg_duplicate_queries'):
+        ordering = 'avg_queries'
+    
+    return Response(sorted(
+        ({'view': name, **stats} for name, stats in views.items()),
+        key=lambda row: row[ordering],
+        reverse=True
+    ))
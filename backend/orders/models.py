@@ -85,6 +85,9 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Price at time of order
     total_price = models.DecimalField(max_digits=10, decimal_places=2)  # quantity * price
+    flash_sale = models.ForeignKey(
+        'promotions.FlashSale', null=True, blank=True, on_delete=models.SET_NULL, related_name='order_items'
+    )  # Sale the units were claimed from, so a cancellation can return them
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in order {self.order.order_number}"
@@ -0,0 +1,249 @@
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+
+import numpy as np
+from django.conf import settings
+
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+# Products with more cents than this in a single product of two operands are
+# computed with Python integers instead of int64
+INT64_SAFE = 2 ** 62
+
+
+def get_order_pricing_settings():
+    config = {
+        'VECTOR_MIN_LINES': 64,  # below this many lines the Decimal path is faster than building arrays
+    }
+    config.update(getattr(settings, 'ORDER_PRICING', {}))
+    return config
+
+
+# unit_price, tax_rate (percent) and shipping_cost (per unit) are Decimals with two places;
+# only discountable lines share the order discount
+QuoteLine = namedtuple(
+    'QuoteLine', ['product_id', 'quantity', 'unit_price', 'tax_rate', 'shipping_cost', 'discountable'],
+    defaults=[True],
+)
+
+
+def quote_line(product, quantity, unit_price, discountable=True):
+    return QuoteLine(product.pk, quantity, unit_price, product.tax_rate, product.shipping_cost, discountable)
+
+
+class QuoteTotals:
+    """Per-line and order totals, all Decimals with two places"""
+
+    def __init__(self, line_totals, line_discounts, line_taxes, line_shipping):
+        self.line_totals = line_totals
+        self.line_discounts = line_discounts
+        self.line_taxes = line_taxes
+        self.line_shipping = line_shipping
+        self.subtotal = sum(line_totals, ZERO)
+        self.discount = sum(line_discounts, ZERO)
+        self.tax = sum(line_taxes, ZERO)
+        self.shipping = sum(line_shipping, ZERO)
+
+    @property
+    def total(self):
+        return self.subtotal - self.discount + self.tax + self.shipping
+
+    def apply_to(self, order):
+        order.subtotal = self.subtotal
+        order.discount_amount = self.discount
+        order.tax_amount = self.tax
+        order.shipping_cost = self.shipping
+        order.total_amount = self.total
+
+    def as_dict(self):
+        return {
+            'subtotal': self.subtotal,
+            'discount_amount': self.discount,
+            'tax_amount': self.tax,
+            'shipping_cost': self.shipping,
+            'total_amount': self.total,
+        }
+
+
+def allocate_decimal(discount, amounts, discountable):
+    """Split a discount over lines in proportion to their totals
+
+    Each share is rounded down to the cent and the cents left over go to the
+    largest remainders, earlier lines first on ties, so the shares always add
+    up to the discount exactly.
+    """
+    base = sum((amount for amount, eligible in zip(amounts, discountable) if eligible), ZERO)
+    shares = [ZERO] * len(amounts)
+    if not discount or not base:
+        return shares
+    # Whole cents and enough precision for discount * amount keep every division exact
+    discount, base = min(discount, base) / CENT, base / CENT
+    remainders = []
+    with localcontext() as context:
+        context.prec = 60
+        for i, (amount, eligible) in enumerate(zip(amounts, discountable)):
+            if eligible:
+                cents, remainder = divmod(discount * amount / CENT, base)
+                shares[i] = (cents * CENT).quantize(CENT)
+                remainders.append((-remainder, i))
+    left = int(discount - sum(shares, ZERO) / CENT)
+    for _, i in sorted(remainders)[:left]:
+        shares[i] += CENT
+    return shares
+
+
+def price_lines_decimal(lines, discount=ZERO):
+    """Reference implementation, one Decimal line at a time"""
+    totals = [(line.unit_price * line.quantity).quantize(CENT) for line in lines]
+    discounts = allocate_decimal(discount, totals, [line.discountable for line in lines])
+    taxes = [
+        ((amount - share) * line.tax_rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        for line, amount, share in zip(lines, totals, discounts)
+    ]
+    shipping = [(line.shipping_cost * line.quantity).quantize(CENT) for line in lines]
+    return QuoteTotals(totals, discounts, taxes, shipping)
+
+
+def to_cents(value):
+    # Prices and rates have two places, so this is exact
+    return int(value * 100)
+
+
+def from_cents(value):
+    return Decimal(value).scaleb(-2)
+
+
+def widen(a, b):
+    """Operands for a * b, as Python integers if the product could overflow int64"""
+    bound = (int(np.abs(a).max(initial=0)) or 1) * (int(np.abs(b).max(initial=0)) or 1)
+    if bound >= INT64_SAFE:
+        return a.astype(object), b.astype(object)
+    return a, b
+
+
+def sum_cents(values):
+    if values.dtype != object and len(values) * int(np.abs(values).max(initial=0)) < INT64_SAFE:
+        return int(values.sum())
+    return int(values.sum(dtype=object))
+
+
+class LineArrays:
+    """Quote lines as parallel arrays of integer cents, built once and priced any number of times"""
+
+    def __init__(self, product_ids, quantity, unit, rate, shipping_unit, discountable):
+        self.product_ids = product_ids
+        self.quantity = quantity
+        self.unit = unit
+        self.rate = rate  # basis points, i.e. tax_rate percent in cents
+        self.shipping_unit = shipping_unit
+        self.discountable = discountable
+
+    @classmethod
+    def from_lines(cls, lines):
+        count = len(lines)
+        return cls(
+            [line.product_id for line in lines],
+            np.fromiter((line.quantity for line in lines), dtype=np.int64, count=count),
+            np.fromiter((to_cents(line.unit_price) for line in lines), dtype=np.int64, count=count),
+            np.fromiter((to_cents(line.tax_rate) for line in lines), dtype=np.int64, count=count),
+            np.fromiter((to_cents(line.shipping_cost) for line in lines), dtype=np.int64, count=count),
+            np.fromiter((line.discountable for line in lines), dtype=bool, count=count),
+        )
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def with_tax_rates(self, rates):
+        """A copy with new tax rates (Decimal percent, or basis points as an array)"""
+        if not isinstance(rates, np.ndarray):
+            rates = np.fromiter((to_cents(rate) for rate in rates), dtype=np.int64, count=len(self))
+        return LineArrays(self.product_ids, self.quantity, self.unit, rates, self.shipping_unit, self.discountable)
+
+
+class CentsTotals(QuoteTotals):
+    """QuoteTotals held as arrays of cents; per-line Decimals are only built when read"""
+
+    def __init__(self, totals, shares, taxes, shipping):
+        self.cents = {'totals': totals, 'discounts': shares, 'taxes': taxes, 'shipping': shipping}
+        self.subtotal = from_cents(sum_cents(totals))
+        self.discount = from_cents(sum_cents(shares))
+        self.tax = from_cents(sum_cents(taxes))
+        self.shipping = from_cents(sum_cents(shipping))
+
+    def line_values(self, name):
+        return [from_cents(value) for value in self.cents[name].tolist()]
+
+    @property
+    def line_totals(self):
+        return self.line_values('totals')
+
+    @property
+    def line_discounts(self):
+        return self.line_values('discounts')
+
+    @property
+    def line_taxes(self):
+        return self.line_values('taxes')
+
+    @property
+    def line_shipping(self):
+        return self.line_values('shipping')
+
+
+def allocate_cents(discount, amounts, discountable):
+    """allocate_decimal over integer cents"""
+    shares = np.zeros(len(amounts), dtype=np.int64)
+    eligible = np.flatnonzero(discountable)
+    base = sum_cents(amounts[eligible])
+    if not discount or not base:
+        return shares
+    discount = min(discount, base)
+    weighted = amounts[eligible]
+    if base >= INT64_SAFE or int(weighted.max()) * discount >= INT64_SAFE:
+        weighted = weighted.astype(object)
+    weighted = weighted * discount
+    floors, remainders = weighted // base, weighted % base
+    shares[eligible] = floors.astype(np.int64)
+    left = discount - sum_cents(floors)
+    if left:
+        # Stable sort on descending remainder keeps earlier lines first on ties
+        order = np.argsort(-remainders, kind='stable')
+        shares[eligible[order[:left]]] += 1
+    return shares
+
+
+def price_arrays(arrays, discount=ZERO):
+    """The same totals as price_lines_decimal, computed over arrays of integer cents"""
+    totals = np.multiply(*widen(arrays.unit, arrays.quantity))
+    shares = allocate_cents(to_cents(discount), totals, arrays.discountable)
+    net, rate = widen(totals - shares, arrays.rate)
+    # Half-up rounding of net * rate / 10000; net is never negative
+    taxes = (net * rate + 5000) // 10000
+    shipping = np.multiply(*widen(arrays.shipping_unit, arrays.quantity))
+    return CentsTotals(totals, shares, taxes, shipping)
+
+
+def price_lines_vectorized(lines, discount=ZERO):
+    return price_arrays(LineArrays.from_lines(lines), discount)
+
+
+def price_lines(lines, discount=ZERO):
+    """Line totals, discount shares, tax and shipping for a quote or order"""
+    lines = list(lines)
+    if len(lines) < get_order_pricing_settings()['VECTOR_MIN_LINES']:
+        return price_lines_decimal(lines, discount)
+    return price_lines_vectorized(lines, discount)
+
+
+def order_totals(priced, evaluation=None):
+    """Totals for lines priced by promotions.pricing, sharing a coupon's discount over the lines it applies to"""
+    lines = [
+        quote_line(
+            line.product, line.quantity, line.unit_price,
+            evaluation is None or evaluation.rule.applies_to(line.as_cart_line()),
+        )
+        for line in priced.lines
+    ]
+    return price_lines(lines, evaluation.discount if evaluation is not None else ZERO)
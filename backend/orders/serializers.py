@@ -1,6 +1,12 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem
+from .pricing import price_lines, quote_line
 from products.serializers import ProductSerializer
+from promotions.inventory import get_inventory, schedule_write_back
+from promotions.pricing import (
+    PricedCart, PricedLine, claim_flash_sale_lines, price_products, release_flash_sale_claims,
+)
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -40,28 +46,45 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
+        user = validated_data['user']
         
-        # Calculate totals
-        subtotal = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = item_data.get('price', product.final_price)
-            
-            # Create order item
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price
-            )
-            
-            subtotal += price * quantity
+        # Price every line at once: effective prices from the promotions engine, then
+        # line totals, tax and shipping over arrays of cents for large orders
+        quotes = price_products([item_data['product'] for item_data in items_data])
+        priced = PricedCart([
+            PricedLine(item_data, item_data['product'], item_data['quantity'], quotes[item_data['product'].pk])
+            for item_data in items_data
+        ])
+        # Flash sale prices need units from the live counter, as for cart checkouts;
+        # they go back if the order cannot be written
+        inventory = get_inventory()
+        flash_lines = PricedCart([line for line in priced.lines if 'price' not in line.item])
+        flash_claims = claim_flash_sale_lines(flash_lines, user, inventory)
+        try:
+            with transaction.atomic():
+                order = self.create_order(validated_data, items_data, priced)
+        except Exception:
+            release_flash_sale_claims(flash_claims, user, inventory)
+            raise
+        if flash_claims:
+            schedule_write_back()
+        return order
+
+    def create_order(self, validated_data, items_data, priced):
+        order = Order.objects.create(**validated_data)
+        lines = [
+            quote_line(line.product, line.quantity, line.item.get('price', line.unit_price))
+            for line in priced.lines
+        ]
+        totals = price_lines(lines)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item_data['product'], quantity=line.quantity,
+                      price=line.unit_price, total_price=total,
+                      flash_sale_id=None if 'price' in item_data else priced_line.quote.flash_sale_id)
+            for item_data, priced_line, line, total in zip(items_data, priced.lines, lines, totals.line_totals)
+        ])
         
-        # Calculate totals
-        order.subtotal = subtotal
-        order.total_amount = subtotal + order.shipping_cost - order.discount_amount
+        totals.apply_to(order)
         order.save()
         
         return order
@@ -91,5 +114,20 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
             
             if new_status not in valid_transitions.get(old_status, []):
                 raise serializers.ValidationError(f"Cannot change status from {old_status} to {new_status}")
+            
+            # A cancelled order gives its flash sale units back once the change commits
+            if new_status == 'cancelled':
+                items = list(instance.items.filter(flash_sale__isnull=False))
+                if items:
+                    transaction.on_commit(lambda: release_order_flash_sales(instance, items))
         
-        return super().update(instance, validated_data)
\ No newline at end of file
+        return super().update(instance, validated_data)
+
+
+def release_order_flash_sales(order, items):
+    """Return the flash sale units a cancelled order had claimed"""
+    inventory = get_inventory()
+    release_flash_sale_claims(
+        [(item.flash_sale_id, item.quantity, 0) for item in items], order.user, inventory
+    )
+    schedule_write_back()
\ No newline at end of file
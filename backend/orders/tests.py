@@ -0,0 +1,100 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from carts.models import Cart, CartItem
+from products.models import Category, Product
+from promotions.models import FlashSale
+from .models import Order, OrderItem
+from .serializers import OrderCreateSerializer
+
+
+ADDRESS = {
+    f'{kind}_{field}': 'x'
+    for kind in ('shipping', 'billing')
+    for field in ('address', 'city', 'state', 'country', 'postal_code')
+}
+CLAIMS = [(7, 2, 0)]
+
+
+class FlashSaleClaimReleaseTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('alice@example.com', 'password', username='alice')
+        self.client = APIClient(raise_request_exception=True)
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Tools')
+        self.product = Product.objects.create(
+            name='Hammer', sku='HAM-1', category=category, price=Decimal('10.00'), stock_quantity=5
+        )
+        self.release = mock.Mock()
+        for target, value in (
+            ('get_inventory', mock.Mock()),
+            ('claim_flash_sale_lines', mock.Mock(return_value=CLAIMS)),
+            ('release_flash_sale_claims', self.release),
+        ):
+            for module in ('orders.views', 'orders.serializers'):
+                patcher = mock.patch(f'{module}.{target}', value)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+    def test_failed_cart_checkout_releases_claims(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        with mock.patch('orders.views.order_totals', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.client.post('/api/orders/create/', {'from_cart': True, 'items': [], **ADDRESS}, format='json')
+        self.release.assert_called_once_with(CLAIMS, self.user, mock.ANY)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(cart.items.exists())
+
+    def test_failed_direct_order_releases_claims(self):
+        serializer = OrderCreateSerializer()
+        items = [{'product': self.product, 'quantity': 2}]
+        with mock.patch('orders.serializers.price_lines', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            serializer.create({'user': self.user, 'items': items, **ADDRESS})
+        self.release.assert_called_once_with(CLAIMS, self.user, mock.ANY)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderCancellationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('bob@example.com', 'password', username='bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Tools')
+        product = Product.objects.create(
+            name='Saw', sku='SAW-1', category=category, price=Decimal('20.00'), stock_quantity=5
+        )
+        now = timezone.now()
+        self.sale = FlashSale.objects.create(
+            product=product, name='Saw sale', original_price=Decimal('20.00'), sale_price=Decimal('10.00'),
+            discount_percentage=Decimal('50.00'), start_time=now, end_time=now + timedelta(hours=1),
+            max_quantity=10,
+        )
+        self.order = Order.objects.create(user=self.user, **ADDRESS)
+        OrderItem.objects.create(
+            order=self.order, product=product, quantity=3, price=Decimal('10.00'), flash_sale=self.sale
+        )
+        self.inventory = mock.Mock()
+        for target, value in (('get_inventory', mock.Mock(return_value=self.inventory)),
+                              ('schedule_write_back', mock.Mock())):
+            patcher = mock.patch(f'orders.serializers.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cancelling_returns_flash_sale_units(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/orders/{self.order.pk}/update/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.inventory.release.assert_called_once_with(self.sale.pk, self.user.pk, 3, reserved=0)
+
+    def test_other_transitions_keep_flash_sale_units(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/orders/{self.order.pk}/update/', {'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.inventory.release.assert_not_called()
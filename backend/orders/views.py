@@ -2,10 +2,15 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from .models import Order, OrderItem
+from .pricing import order_totals
 from .serializers import OrderSerializer, OrderCreateSerializer, OrderUpdateSerializer
 from carts.models import Cart
+from promotions.coupons import CouponRejected, redeem_coupon
+from promotions.inventory import get_inventory, schedule_write_back
+from promotions.pricing import cart_items, claim_flash_sale_lines, price_items, release_flash_sale_claims
 
 
 @api_view(['GET'])
@@ -54,40 +59,55 @@ def create_order(request):
                     if field in request.data:
                         order_data[field] = request.data[field]
                 
-                # Create order items from cart items
-                for cart_item in cart.items.all():
+                # Price every line in one pass; flash sale lines take their units from the
+                # live counter and fall back to the regular price when none are left
+                priced = price_items(cart_items(cart))
+                inventory = get_inventory()
+                flash_claims = claim_flash_sale_lines(priced, request.user, inventory)
+                for line in priced.lines:
                     order_data['items'].append({
-                        'product': cart_item.product,
-                        'quantity': cart_item.quantity,
-                        'price': cart_item.product.final_price
+                        'product': line.product,
+                        'quantity': line.quantity,
+                        'price': line.unit_price,
+                        'flash_sale_id': line.quote.flash_sale_id
                     })
                 
-                # Create the order
-                order = Order.objects.create(**{k: v for k, v in order_data.items() if k != 'items'})
-                
-                # Create order items and update stock
-                subtotal = 0
-                for item_data in order_data['items']:
-                    order_item = OrderItem.objects.create(
-                        order=order,
-                        product=item_data['product'],
-                        quantity=item_data['quantity'],
-                        price=item_data['price']
-                    )
-                    subtotal += order_item.total_price
-                    
-                    # Reduce product stock
-                    product = item_data['product']
-                    product.stock -= item_data['quantity']
-                    product.save()
-                
-                # Calculate totals
-                order.subtotal = subtotal
-                order.total_amount = subtotal + order.shipping_cost - order.discount_amount
-                order.save()
-                
-                # Clear the cart after successful order creation
-                cart.items.all().delete()
+                # The order, the emptied cart and the coupon use commit together, and any
+                # failure rolls everything back and returns the flash sale units claimed
+                coupon_code = request.data.get('coupon_code')
+                try:
+                    with transaction.atomic():
+                        order = Order.objects.create(**{k: v for k, v in order_data.items() if k != 'items'})
+                        
+                        # Create order items; the cart already holds their stock
+                        for item_data in order_data['items']:
+                            OrderItem.objects.create(
+                                order=order,
+                                product=item_data['product'],
+                                quantity=item_data['quantity'],
+                                price=item_data['price'],
+                                flash_sale_id=item_data['flash_sale_id']
+                            )
+                        
+                        # Consume one use of the coupon against the lines actually ordered
+                        evaluation = None
+                        if coupon_code:
+                            evaluation = redeem_coupon(coupon_code, request.user, priced.cart_lines(), order=order)
+                        
+                        # Subtotal, discount, tax and shipping over all lines at once
+                        order_totals(priced, evaluation).apply_to(order)
+                        order.save()
+                        
+                        # Clear the cart after successful order creation
+                        cart.items.all().delete()
+                except CouponRejected as e:
+                    release_flash_sale_claims(flash_claims, request.user, inventory)
+                    return Response({'error': e.message, 'code': e.code}, status=status.HTTP_400_BAD_REQUEST)
+                except Exception:
+                    release_flash_sale_claims(flash_claims, request.user, inventory)
+                    raise
+                if flash_claims:
+                    schedule_write_back()
                 
                 order_serializer = OrderSerializer(order)
                 return Response(order_serializer.data, status=status.HTTP_201_CREATED)
@@ -97,7 +117,7 @@ def create_order(request):
         
         else:
             # Create order from provided data
-            order = serializer.save()
+            order = serializer.save(user=request.user)
             return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,97 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+
+from core.asyncviews import api_response, async_api_view, parse_json_body
+from orders.models import Order
+from .models import Transaction
+from .serializers import ProcessPaymentSerializer, TransactionSerializer
+from .gateways import GatewayError, gateway_registry
+from .idempotency import aidempotent
+from .views import record_gateway_error
+
+
+@async_api_view(['GET'], login_required=True)
+async def list_payment_gateways(request):
+    """Get all active payment gateways"""
+    return HttpResponse(await gateway_registry.alisting_json(), content_type='application/json')
+
+
+@async_api_view(['POST'], login_required=True)
+@aidempotent('process_payment')
+async def process_payment(request):
+    """Process a payment without holding a worker while the gateway responds"""
+    try:
+        payload = parse_json_body(request)
+    except ValueError:
+        return api_response({'error': 'Invalid JSON body'}, status=400)
+
+    serializer = ProcessPaymentSerializer(data=payload)
+    if not await sync_to_async(serializer.is_valid)():
+        return api_response(serializer.errors, status=400)
+
+    data = serializer.validated_data
+    try:
+        order = await Order.objects.aget(id=data['order_id'], user=request.user)
+    except Order.DoesNotExist:
+        return api_response({'error': 'Order not found'}, status=404)
+
+    entry = await gateway_registry.aget(data['gateway_name'])
+    if entry is None:
+        return api_response({'error': 'Payment gateway not supported'}, status=400)
+    gateway = entry.gateway
+
+    if data['amount'] != order.total_amount:
+        return api_response({'error': 'Amount does not match order total'}, status=400)
+
+    transaction = await Transaction.objects.acreate(
+        order=order,
+        user=request.user,
+        gateway=gateway,
+        reference=f"TXN-{uuid.uuid4().hex[:12].upper()}",
+        amount=data['amount'],
+        description=f"Payment for order {order.order_number}",
+        status='pending'
+    )
+
+    try:
+        # The pooled async client awaits the gateway without tying up a worker thread
+        client = entry.require_client()
+        payment_result = await client.acharge(transaction, data)
+    except GatewayError as e:
+        body, response_status = await sync_to_async(record_gateway_error)(transaction, e)
+        return api_response(body, status=response_status)
+    except Exception as e:
+        transaction.status = 'failed'
+        transaction.gateway_response = {'error': str(e)}
+        await transaction.asave()
+        return api_response({
+            'success': False,
+            'error': 'Payment processing error',
+            'details': str(e)
+        }, status=500)
+
+    if payment_result['success']:
+        transaction.status = 'completed'
+        transaction.gateway_response = payment_result.get('response', {})
+        transaction.completed_at = payment_result.get('completed_at')
+        await transaction.asave()
+
+        order.payment_status = 'paid'
+        await order.asave(update_fields=['payment_status', 'updated_at'])
+
+        return api_response({
+            'success': True,
+            'transaction': await sync_to_async(lambda: TransactionSerializer(transaction).data)(),
+            'message': 'Payment processed successfully'
+        })
+
+    transaction.status = 'failed'
+    transaction.gateway_response = payment_result.get('error', {})
+    await transaction.asave()
+    return api_response({
+        'success': False,
+        'error': payment_result.get('message', 'Payment failed'),
+        'transaction': await sync_to_async(lambda: TransactionSerializer(transaction).data)()
+    }, status=400)
@@ -0,0 +1,8 @@
+from .base import CircuitBreaker, CircuitOpenError, GatewayClient, GatewayError, GatewayTimeout, RetryPolicy
+from .registry import GatewayRegistry, bump_registry_version, build_client, gateway_health, gateway_registry, get_gateway_client
+
+__all__ = [
+    'CircuitBreaker', 'CircuitOpenError', 'GatewayClient', 'GatewayError', 'GatewayTimeout', 'RetryPolicy',
+    'GatewayRegistry', 'bump_registry_version', 'build_client', 'gateway_health', 'gateway_registry',
+    'get_gateway_client',
+]
@@ -0,0 +1,325 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .base import GatewayClient, GatewayError
+
+
+def minor_units(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal('1')))
+
+
+class StripeClient(GatewayClient):
+    name = 'stripe'
+    idempotency_header = 'Idempotency-Key'
+
+    def build_charge(self, transaction, payment_data):
+        return 'POST', '/v1/payment_intents', {'data': {
+            'amount': minor_units(transaction.amount),
+            'currency': self.credentials.get('currency', 'usd').lower(),
+            'payment_method': payment_data.get('card_token', ''),
+            'confirm': 'true',
+            'description': transaction.description,
+            'metadata[reference]': transaction.reference,
+        }}
+
+    def parse_charge(self, response):
+        if response.status_code >= 400:
+            return self.declined(response)
+        body = response.json()
+        if body.get('status') != 'succeeded':
+            return self.declined(response, f"Payment {body.get('status', 'failed')}")
+        return {
+            'success': True,
+            'response': {'gateway': self.name, 'status': body['status'], 'payment_intent_id': body.get('id')},
+            'completed_at': timezone.now(),
+        }
+
+    def build_refund(self, refund, transaction):
+        return 'POST', '/v1/refunds', {'data': {
+            'payment_intent': transaction.gateway_response.get('payment_intent_id', ''),
+            'amount': minor_units(refund.requested_amount),
+            'metadata[refund]': str(refund.pk),
+        }}
+
+    def parse_refund(self, response):
+        if response.status_code >= 400:
+            return self.declined(response, 'Refund declined')
+        body = response.json()
+        if body.get('status') not in ('succeeded', 'pending'):
+            return self.declined(response, f"Refund {body.get('status', 'failed')}")
+        return {'success': True, 'refund_id': body.get('id', ''), 'response': body}
+
+
+class PayPalClient(GatewayClient):
+    name = 'paypal'
+    idempotency_header = 'PayPal-Request-Id'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = threading.Lock()
+
+    def _token_request(self):
+        return {
+            'auth': (self.credentials.get('client_id', ''), self.credentials.get('client_secret', '')),
+            'data': {'grant_type': 'client_credentials'},
+        }
+
+    def _store_token(self, response):
+        if response.status_code != 200:
+            raise GatewayError(
+                'paypal rejected the client credentials', status_code=response.status_code, sent=False
+            )
+        body = response.json()
+        self._token = body['access_token']
+        # Refresh a minute early so in-flight requests never carry an expired token
+        self._token_expires = time.monotonic() + body.get('expires_in', 3600) - 60
+
+    def _token_valid(self):
+        return self._token is not None and time.monotonic() < self._token_expires
+
+    def auth_headers(self):
+        with self._token_lock:
+            if not self._token_valid():
+                self._store_token(self.client.post('/v1/oauth2/token', **self._token_request()))
+            return {'Authorization': f'Bearer {self._token}'}
+
+    async def aauth_headers(self):
+        if not self._token_valid():
+            self._store_token(await self.async_client.post('/v1/oauth2/token', **self._token_request()))
+        return {'Authorization': f'Bearer {self._token}'}
+
+    def charge(self, transaction, payment_data):
+        response = self.execute(self.build_charge(transaction, payment_data), transaction.reference, self.raw)
+        if self.needs_capture(response):
+            response = self.execute(self.build_capture(response), f'{transaction.reference}:capture', self.raw)
+        return self.parse_charge(response)
+
+    async def acharge(self, transaction, payment_data):
+        response = await self.aexecute(
+            self.build_charge(transaction, payment_data), transaction.reference, self.raw
+        )
+        if self.needs_capture(response):
+            response = await self.aexecute(self.build_capture(response), f'{transaction.reference}:capture', self.raw)
+        return self.parse_charge(response)
+
+    @staticmethod
+    def raw(response):
+        return response
+
+    def needs_capture(self, response):
+        # An order the payer has approved moves no money until it is captured
+        return response.status_code < 400 and response.json().get('status') == 'APPROVED'
+
+    def build_capture(self, response):
+        return 'POST', f"/v2/checkout/orders/{response.json()['id']}/capture", {
+            'headers': {'Content-Type': 'application/json'},
+        }
+
+    def build_charge(self, transaction, payment_data):
+        order = {
+            'json': {
+                'intent': 'CAPTURE',
+                'purchase_units': [{
+                    'reference_id': transaction.reference,
+                    'description': transaction.description,
+                    'amount': {
+                        'currency_code': self.credentials.get('currency', 'USD').upper(),
+                        'value': str(transaction.amount),
+                    },
+                }],
+                'payer': {'email_address': payment_data.get('email', '')},
+            },
+        }
+        if payment_data.get('card_token'):
+            # A vaulted payment method approves the order without a payer redirect
+            order['json']['payment_source'] = {'paypal': {'vault_id': payment_data['card_token']}}
+        return 'POST', '/v2/checkout/orders', order
+
+    def parse_charge(self, response):
+        if response.status_code >= 400:
+            return self.declined(response)
+        body = response.json()
+        # Anything short of COMPLETED (an order still waiting for the payer) has moved no money
+        if body.get('status') != 'COMPLETED':
+            return self.declined(response, f"Payment {body.get('status', 'failed').lower()}")
+        captures = (body.get('purchase_units') or [{}])[0].get('payments', {}).get('captures') or [{}]
+        return {
+            'success': True,
+            'response': {
+                'gateway': self.name,
+                'status': body['status'].lower(),
+                'transaction_id': body.get('id'),
+                'capture_id': captures[0].get('id'),
+                'payer_id': body.get('payer', {}).get('payer_id'),
+            },
+            'completed_at': timezone.now(),
+        }
+
+    def build_refund(self, refund, transaction):
+        response = transaction.gateway_response
+        capture_id = response.get('capture_id') or response.get('transaction_id', '')
+        return 'POST', f'/v2/payments/captures/{capture_id}/refund', {'json': {
+            'amount': {
+                'currency_code': self.credentials.get('currency', 'USD').upper(),
+                'value': str(refund.requested_amount),
+            },
+            'note_to_payer': refund.reason[:255],
+        }}
+
+    def parse_refund(self, response):
+        if response.status_code >= 400:
+            return self.declined(response, 'Refund declined')
+        body = response.json()
+        if body.get('status') not in ('COMPLETED', 'PENDING'):
+            return self.declined(response, f"Refund {body.get('status', 'failed').lower()}")
+        return {'success': True, 'refund_id': body.get('id', ''), 'response': body}
+
+
+class PaystackClient(GatewayClient):
+    name = 'paystack'
+
+    def build_charge(self, transaction, payment_data):
+        return 'POST', '/transaction/charge_authorization', {'json': {
+            'email': payment_data.get('email', ''),
+            'amount': minor_units(transaction.amount),
+            'currency': self.credentials.get('currency', 'NGN').upper(),
+            'authorization_code': payment_data.get('card_token', ''),
+            'reference': transaction.reference,
+        }}
+
+    def parse_charge(self, response):
+        if response.status_code >= 400:
+            return self.declined(response)
+        data = response.json().get('data') or {}
+        if data.get('status') != 'success':
+            return self.declined(response, data.get('gateway_response') or 'Payment failed')
+        return {
+            'success': True,
+            'response': {'gateway': self.name, 'status': data['status'], 'reference': data.get('reference')},
+            'completed_at': timezone.now(),
+        }
+
+    def build_refund(self, refund, transaction):
+        return 'POST', '/refund', {'json': {
+            'transaction': transaction.reference,
+            'amount': minor_units(refund.requested_amount),
+            'merchant_note': refund.reason,
+        }}
+
+    def parse_refund(self, response):
+        if response.status_code >= 400:
+            return self.declined(response, 'Refund declined')
+        data = response.json().get('data') or {}
+        if data.get('status') not in ('pending', 'processing', 'processed'):
+            return self.declined(response, 'Refund failed')
+        return {'success': True, 'refund_id': str(data.get('id', '')), 'response': data}
+
+
+class FlutterwaveClient(GatewayClient):
+    name = 'flutterwave'
+
+    def build_charge(self, transaction, payment_data):
+        return 'POST', '/v3/tokenized-charges', {'json': {
+            'token': payment_data.get('card_token', ''),
+            'email': payment_data.get('email', ''),
+            'amount': str(transaction.amount),
+            'currency': self.credentials.get('currency', 'NGN').upper(),
+            'tx_ref': transaction.reference,
+        }}
+
+    def parse_charge(self, response):
+        if response.status_code >= 400:
+            return self.declined(response)
+        data = response.json().get('data') or {}
+        if data.get('status') != 'successful':
+            return self.declined(response, data.get('processor_response') or 'Payment failed')
+        return {
+            'success': True,
+            'response': {
+                'gateway': self.name,
+                'status': data['status'],
+                'transaction_id': data.get('id'),
+                'flw_ref': data.get('flw_ref'),
+            },
+            'completed_at': timezone.now(),
+        }
+
+    def build_refund(self, refund, transaction):
+        transaction_id = transaction.gateway_response.get('transaction_id', '')
+        return 'POST', f'/v3/transactions/{transaction_id}/refund', {'json': {
+            'amount': str(refund.requested_amount),
+        }}
+
+    def parse_refund(self, response):
+        if response.status_code >= 400:
+            return self.declined(response, 'Refund declined')
+        body = response.json()
+        data = body.get('data') or {}
+        if body.get('status') != 'success':
+            return self.declined(response, body.get('message') or 'Refund failed')
+        return {'success': True, 'refund_id': str(data.get('id', '')), 'response': data}
+
+
+class GenericClient(GatewayClient):
+    """Mobile money and bank transfer providers exposing a simple charge endpoint"""
+
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    def build_charge(self, transaction, payment_data):
+        return 'POST', self.credentials.get('charge_path', '/charge'), {'json': {
+            'reference': transaction.reference,
+            'amount': str(transaction.amount),
+            'currency': self.credentials.get('currency', 'USD').upper(),
+            'phone': payment_data.get('phone', ''),
+            'account_number': payment_data.get('account_number', ''),
+            'email': payment_data.get('email', ''),
+        }}
+
+    def parse_charge(self, response):
+        if response.status_code >= 400:
+            return self.declined(response)
+        body = response.json()
+        if body.get('status') not in ('success', 'successful', 'completed'):
+            return self.declined(response, body.get('message') or 'Payment failed')
+        return {
+            'success': True,
+            'response': {
+                'gateway': self.name,
+                'status': body['status'],
+                'reference': body.get('reference'),
+                'message': body.get('message', f'Payment processed via {self.name}'),
+            },
+            'completed_at': timezone.now(),
+        }
+
+    def build_refund(self, refund, transaction):
+        return 'POST', self.credentials.get('refund_path', '/refund'), {'json': {
+            'reference': transaction.reference,
+            'gateway_reference': transaction.gateway_response.get('reference', ''),
+            'amount': str(refund.requested_amount),
+            'currency': self.credentials.get('currency', 'USD').upper(),
+            'reason': refund.reason,
+        }}
+
+    def parse_refund(self, response):
+        if response.status_code >= 400:
+            return self.declined(response, 'Refund declined')
+        body = response.json()
+        if body.get('status') not in ('success', 'successful', 'completed', 'pending'):
+            return self.declined(response, body.get('message') or 'Refund failed')
+        return {'success': True, 'refund_id': str(body.get('refund_id') or body.get('reference', '')), 'response': body}
+
+
+ADAPTERS = {
+    'stripe': StripeClient,
+    'paypal': PayPalClient,
+    'paystack': PaystackClient,
+    'flutterwave': FlutterwaveClient,
+}
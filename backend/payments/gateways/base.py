@@ -0,0 +1,321 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or returned a server error
+
+    ``sent`` is False only when the gateway cannot have acted on the request:
+    the connection was never made, or it was turned away with a 429.
+    """
+
+    def __init__(self, message, status_code=None, response=None, sent=True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response or {}
+        self.sent = sent
+
+
+class GatewayTimeout(GatewayError):
+    """The request was sent but no response arrived in time, so the outcome is unknown"""
+
+
+class CircuitOpenError(GatewayError):
+    """The gateway is failing and calls are short-circuited until it recovers"""
+
+    def __init__(self, message):
+        super().__init__(message, sent=False)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker shared by every caller in the process
+
+    closed -> open after ``failure_threshold`` failures in a row; open -> half-open
+    after ``reset_timeout`` seconds, letting ``half_open_max_calls`` trial calls
+    through; one success closes the circuit, one failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_calls = 0
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, max_attempts=3, backoff_base=0.2, backoff_cap=2.0):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+
+class GatewayClient:
+    """Base adapter: one pooled HTTP client per gateway with timeouts, retries and a breaker
+
+    Subclasses build the gateway-specific charge and refund requests and
+    translate the responses into the result dicts the payment code expects.
+    """
+
+    name = None
+    # Gateways honouring an idempotency header can safely retry a request that may have been processed
+    idempotency_header = None
+
+    def __init__(self, base_url, credentials=None, timeouts=None, pool=None, retry=None, breaker=None):
+        timeouts = timeouts or {}
+        pool = pool or {}
+        self.base_url = base_url.rstrip('/')
+        self.credentials = credentials or {}
+        self.timeout = httpx.Timeout(
+            connect=timeouts.get('CONNECT', 3.0),
+            read=timeouts.get('READ', 10.0),
+            write=timeouts.get('WRITE', 5.0),
+            # Waiting for a free pooled connection is bounded too, so a slow gateway sheds load
+            pool=timeouts.get('POOL', 2.0),
+        )
+        self.limits = httpx.Limits(
+            max_connections=pool.get('MAX_CONNECTIONS', 20),
+            max_keepalive_connections=pool.get('MAX_KEEPALIVE', 10),
+            keepalive_expiry=pool.get('KEEPALIVE_EXPIRY', 30.0),
+        )
+        self.retry = RetryPolicy(**(retry or {}))
+        self.breaker = CircuitBreaker(**(breaker or {}))
+        self._client = None
+        self._async_client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # Connection pools
+
+    def _reset_after_fork(self):
+        # Pools inherited from a parent process share sockets with it
+        if self._pid != os.getpid():
+            self._client = None
+            self._async_client = None
+            self._pid = os.getpid()
+
+    @property
+    def client(self):
+        with self._lock:
+            self._reset_after_fork()
+            if self._client is None:
+                self._client = httpx.Client(
+                    base_url=self.base_url, timeout=self.timeout, limits=self.limits, headers=self.default_headers()
+                )
+            return self._client
+
+    @property
+    def async_client(self):
+        with self._lock:
+            self._reset_after_fork()
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(
+                    base_url=self.base_url, timeout=self.timeout, limits=self.limits, headers=self.default_headers()
+                )
+            return self._async_client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # Gateway specifics
+
+    def default_headers(self):
+        headers = {'Accept': 'application/json'}
+        if self.credentials.get('secret_key'):
+            headers['Authorization'] = f"Bearer {self.credentials['secret_key']}"
+        return headers
+
+    def auth_headers(self):
+        """Per-request auth headers, for gateways using short-lived tokens"""
+        return {}
+
+    async def aauth_headers(self):
+        return self.auth_headers()
+
+    def build_charge(self, transaction, payment_data):
+        """Return ``(method, path, request kwargs)`` for a charge"""
+        raise NotImplementedError
+
+    def parse_charge(self, response):
+        """Translate a gateway response into a payment result dict"""
+        raise NotImplementedError
+
+    def build_refund(self, refund, transaction):
+        """Return ``(method, path, request kwargs)`` refunding part of a transaction"""
+        raise NotImplementedError
+
+    def parse_refund(self, response):
+        """Translate a gateway response into a refund result dict with ``refund_id``"""
+        raise NotImplementedError
+
+    def declined(self, response, message='Payment declined'):
+        try:
+            body = response.json()
+        except ValueError:
+            body = {'body': response.text[:500]}
+        return {'success': False, 'message': message, 'error': {'status_code': response.status_code, **body}}
+
+    # Request execution
+
+    def _should_retry(self, exc, attempt):
+        if attempt + 1 >= self.retry.max_attempts:
+            return False
+        if exc.sent:
+            # The charge may have gone through; only retry when the gateway dedupes it
+            return self.idempotency_header is not None
+        return True
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f'{self.name} is unavailable; retry in {self.breaker.retry_after():.1f}s'
+            )
+
+    def _request_kwargs(self, idempotency_value, kwargs, auth_headers):
+        headers = {**kwargs.get('headers', {}), **auth_headers}
+        if self.idempotency_header:
+            headers[self.idempotency_header] = idempotency_value
+        return {**kwargs, 'headers': headers}
+
+    def _classify(self, response):
+        if response.status_code in self.retry.RETRY_STATUSES:
+            # A 429 is turned away before any processing; a 5xx may come after it
+            raise GatewayError(
+                f'{self.name} returned HTTP {response.status_code}', status_code=response.status_code,
+                sent=response.status_code != 429,
+            )
+        return response
+
+    def _translate(self, exc):
+        if isinstance(exc, (httpx.ReadTimeout, httpx.WriteTimeout)):
+            return GatewayTimeout(f'{self.name} did not respond in time')
+        if isinstance(exc, httpx.PoolTimeout):
+            return GatewayError(f'{self.name} connection pool exhausted', sent=False)
+        if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return GatewayError(f'{self.name} unreachable: {exc.__class__.__name__}', sent=False)
+        return GatewayError(f'{self.name} unreachable: {exc.__class__.__name__}')
+
+    def charge(self, transaction, payment_data):
+        return self.execute(self.build_charge(transaction, payment_data), transaction.reference, self.parse_charge)
+
+    async def acharge(self, transaction, payment_data):
+        return await self.aexecute(
+            self.build_charge(transaction, payment_data), transaction.reference, self.parse_charge
+        )
+
+    def refund(self, refund, transaction):
+        # Refund ids are stable across task retries, so gateways with an idempotency header dedupe repeats
+        return self.execute(self.build_refund(refund, transaction), f'refund-{refund.pk}', self.parse_refund)
+
+    def execute(self, request, idempotency_value, parse):
+        method, path, kwargs = request
+        auth_headers = None
+        attempt = 0
+        while True:
+            # One breaker check per attempt: in half-open each check takes a trial slot
+            self._check_breaker()
+            try:
+                try:
+                    if auth_headers is None:
+                        auth_headers = self.auth_headers()
+                    response = self._classify(self.client.request(
+                        method, path, **self._request_kwargs(idempotency_value, kwargs, auth_headers)
+                    ))
+                except httpx.HTTPError as exc:
+                    raise self._translate(exc) from exc
+            except GatewayError as exc:
+                self.breaker.record_failure()
+                if not self._should_retry(exc, attempt):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return parse(response)
+
+    async def aexecute(self, request, idempotency_value, parse):
+        method, path, kwargs = request
+        auth_headers = None
+        attempt = 0
+        while True:
+            # One breaker check per attempt: in half-open each check takes a trial slot
+            self._check_breaker()
+            try:
+                try:
+                    if auth_headers is None:
+                        auth_headers = await self.aauth_headers()
+                    response = self._classify(await self.async_client.request(
+                        method, path, **self._request_kwargs(idempotency_value, kwargs, auth_headers)
+                    ))
+                except httpx.HTTPError as exc:
+                    raise self._translate(exc) from exc
+            except GatewayError as exc:
+                self.breaker.record_failure()
+                if not self._should_retry(exc, attempt):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return parse(response)
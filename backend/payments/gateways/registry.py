@@ -0,0 +1,176 @@
+import json
+import logging
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.caching import VersionedProcessCache
+from .adapters import ADAPTERS, GenericClient
+
+
+DEFAULTS = {
+    'MOCK_URL': '',
+    'TIMEOUTS': {'CONNECT': 3.0, 'READ': 10.0, 'WRITE': 5.0, 'POOL': 2.0},
+    'POOL': {'MAX_CONNECTIONS': 20, 'MAX_KEEPALIVE': 10, 'KEEPALIVE_EXPIRY': 30.0},
+    'RETRY': {'MAX_ATTEMPTS': 3, 'BACKOFF_BASE': 0.2, 'BACKOFF_CAP': 2.0},
+    'CIRCUIT_BREAKER': {'FAILURE_THRESHOLD': 5, 'RESET_TIMEOUT': 30.0, 'HALF_OPEN_MAX_CALLS': 1},
+    'GATEWAYS': {},
+    'REGISTRY_CHECK_INTERVAL': 1.0,  # seconds between version checks against the shared cache
+}
+
+VERSION_KEY = 'payments:gateways:version'
+
+logger = logging.getLogger(__name__)
+
+
+def get_gateway_settings():
+    config = {key: (dict(value) if isinstance(value, dict) else value) for key, value in DEFAULTS.items()}
+    for key, value in getattr(settings, 'PAYMENT_GATEWAYS', {}).items():
+        if isinstance(value, dict) and key != 'GATEWAYS':
+            config[key].update(value)
+        else:
+            config[key] = value
+    return config
+
+
+def _lower_keys(options):
+    return {key.lower(): value for key, value in options.items()}
+
+
+def build_client(name, gateway_config=None):
+    """Build an adapter from PAYMENT_GATEWAYS merged with the gateway's stored config"""
+    config = get_gateway_settings()
+    overrides = config['GATEWAYS'].get(name, {})
+    credentials = {**overrides.get('CREDENTIALS', {}), **(gateway_config or {})}
+    base_url = config['MOCK_URL'] or credentials.pop('base_url', None) or overrides.get('BASE_URL')
+    if not base_url:
+        raise ValueError(f"No BASE_URL configured for payment gateway '{name}'")
+
+    options = {
+        'credentials': credentials,
+        'timeouts': {**config['TIMEOUTS'], **overrides.get('TIMEOUTS', {})},
+        'pool': {**config['POOL'], **overrides.get('POOL', {})},
+        'retry': _lower_keys({**config['RETRY'], **overrides.get('RETRY', {})}),
+        'breaker': _lower_keys({**config['CIRCUIT_BREAKER'], **overrides.get('CIRCUIT_BREAKER', {})}),
+    }
+    adapter = ADAPTERS.get(name)
+    if adapter is None:
+        return GenericClient(name, base_url, **options)
+    return adapter(base_url, **options)
+
+
+class GatewayEntry:
+    """A gateway row with its parsed config and ready-built client"""
+
+    def __init__(self, gateway, signature, client):
+        self.gateway = gateway
+        self.name = gateway.name
+        self.config = gateway.config
+        self.signature = signature
+        self.client = client
+
+    def require_client(self):
+        if self.client is None:
+            raise ValueError(f"No BASE_URL configured for payment gateway '{self.name}'")
+        return self.client
+
+
+GatewaySnapshot = namedtuple('GatewaySnapshot', ['entries', 'listing', 'listing_json'])
+
+
+class GatewayRegistry:
+    """In-process snapshot of PaymentGateway rows, clients and the public listing
+
+    Lookups are dict reads. At most once per ``REGISTRY_CHECK_INTERVAL`` a
+    process compares its snapshot version with the version key in the cache,
+    which the PaymentGateway signals bump on every change, and reloads when
+    they differ. Clients whose config did not change are carried over, so
+    their connection pools and circuit breakers survive a reload.
+    """
+
+    def __init__(self):
+        self._snapshot = VersionedProcessCache(
+            self._load,
+            VERSION_KEY,
+            lambda: get_gateway_settings()['REGISTRY_CHECK_INTERVAL'],
+            'Gateway registry',
+        )
+
+    def is_fresh(self):
+        return self._snapshot.is_fresh()
+
+    def _load(self):
+        from ..models import PaymentGateway
+        from ..serializers import PaymentGatewaySerializer
+
+        previous = self._snapshot.current.entries if self._snapshot.current is not None else {}
+        entries = {}
+        for gateway in PaymentGateway.objects.order_by('pk'):
+            signature = json.dumps(gateway.config, sort_keys=True, default=str)
+            old = previous.get(gateway.name)
+            if old is not None and old.signature == signature:
+                client = old.client
+            else:
+                try:
+                    client = build_client(gateway.name, gateway.config)
+                except ValueError:
+                    logger.warning('Payment gateway %s has no usable client configuration', gateway.name)
+                    client = None
+            entries[gateway.name] = GatewayEntry(gateway, signature, client)
+
+        active = [entry.gateway for entry in entries.values() if entry.gateway.is_active]
+        listing_json = json.dumps(PaymentGatewaySerializer(active, many=True).data, cls=DjangoJSONEncoder).encode()
+        return GatewaySnapshot(entries, json.loads(listing_json), listing_json)
+
+    def _lookup(self, snapshot, name, include_inactive):
+        entry = snapshot.entries.get(name)
+        if entry is None or not (include_inactive or entry.gateway.is_active):
+            return None
+        return entry
+
+    def get(self, name, include_inactive=False):
+        """Active gateway entry by name, or None; refunds pass ``include_inactive``"""
+        return self._lookup(self._snapshot.get(), name, include_inactive)
+
+    async def aget(self, name, include_inactive=False):
+        return self._lookup(await self._snapshot.aget(), name, include_inactive)
+
+    def listing(self):
+        return self._snapshot.get().listing
+
+    async def alisting_json(self):
+        return (await self._snapshot.aget()).listing_json
+
+    def invalidate(self):
+        self._snapshot.invalidate()
+
+    def bump(self):
+        self._snapshot.bump()
+
+    def entries(self):
+        return dict(self._snapshot.get().entries)
+
+
+gateway_registry = GatewayRegistry()
+
+
+def bump_registry_version():
+    """Tell every process to reload the gateway registry"""
+    gateway_registry.bump()
+
+
+def get_gateway_client(gateway):
+    """Return the process-wide client for a PaymentGateway, reusing its connection pool"""
+    entry = gateway_registry.get(gateway.name, include_inactive=True)
+    if entry is None:
+        raise ValueError(f"No BASE_URL configured for payment gateway '{gateway.name}'")
+    return entry.require_client()
+
+
+def gateway_health():
+    return {
+        name: {'base_url': entry.client.base_url, 'circuit': entry.client.breaker.state}
+        for name, entry in gateway_registry.entries().items()
+        if entry.client is not None
+    }
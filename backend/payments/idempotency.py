@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.asyncviews import api_response, parse_json_body
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+PENDING, DONE = 'pending', 'done'
+
+
+def get_idempotency_settings():
+    config = {
+        'REQUIRED': False,
+        'CACHE_ALIAS': 'default',
+        'TTL': 24 * 3600,  # how long a completed response is replayed
+        'LOCK_TTL': 90,  # must outlive the slowest gateway call, retries included
+        'WAIT_TIMEOUT': 30.0,  # how long a concurrent duplicate waits for the first request
+        'POLL_INTERVAL': 0.05,
+        # Responses for failures where the gateway certainly did not charge are not kept,
+        # so a retry with the same key runs again
+        'RELEASE_STATUSES': (502, 503),
+        'MAX_KEY_LENGTH': 255,
+    }
+    config.update(getattr(settings, 'PAYMENT_IDEMPOTENCY', {}))
+    return config
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a request that has not finished, or by a different payload"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims keys with an atomic cache ``add`` and replays stored responses
+
+    The first request for a key stores a pending marker and runs; duplicates
+    arriving meanwhile poll until the stored response appears and replay it,
+    so only one gateway call is made per key.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_idempotency_settings()
+        self.cache = caches[self.config['CACHE_ALIAS']]
+
+    def cache_key(self, scope, key):
+        return f"idem:{scope}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+    def _pending(self, fingerprint):
+        return {'state': PENDING, 'fingerprint': fingerprint}
+
+    def _resolve(self, record, fingerprint):
+        """Return the stored response for a finished record, raising on payload mismatch"""
+        if record['fingerprint'] != fingerprint:
+            raise IdempotencyConflict(
+                'Idempotency-Key was already used with a different request body',
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record['state'] == DONE:
+            return record['status'], record['body']
+        return None
+
+    def _timed_out(self):
+        return IdempotencyConflict(
+            'A request with this Idempotency-Key is still being processed', status.HTTP_409_CONFLICT
+        )
+
+    def begin(self, cache_key, fingerprint):
+        """Claim the key; returns None for the owner or ``(status, body)`` to replay"""
+        deadline = time.monotonic() + self.config['WAIT_TIMEOUT']
+        while True:
+            if self.cache.add(cache_key, self._pending(fingerprint), self.config['LOCK_TTL']):
+                return None
+            record = self.cache.get(cache_key)
+            if record is not None:
+                stored = self._resolve(record, fingerprint)
+                if stored is not None:
+                    return stored
+            if time.monotonic() >= deadline:
+                raise self._timed_out()
+            time.sleep(self.config['POLL_INTERVAL'])
+
+    async def abegin(self, cache_key, fingerprint):
+        deadline = time.monotonic() + self.config['WAIT_TIMEOUT']
+        while True:
+            if await self.cache.aadd(cache_key, self._pending(fingerprint), self.config['LOCK_TTL']):
+                return None
+            record = await self.cache.aget(cache_key)
+            if record is not None:
+                stored = self._resolve(record, fingerprint)
+                if stored is not None:
+                    return stored
+            if time.monotonic() >= deadline:
+                raise self._timed_out()
+            await asyncio.sleep(self.config['POLL_INTERVAL'])
+
+    def _done(self, fingerprint, status_code, body):
+        return {'state': DONE, 'fingerprint': fingerprint, 'status': status_code, 'body': body}
+
+    def complete(self, cache_key, fingerprint, status_code, body):
+        if status_code in self.config['RELEASE_STATUSES']:
+            self.cache.delete(cache_key)
+        else:
+            self.cache.set(cache_key, self._done(fingerprint, status_code, body), self.config['TTL'])
+
+    async def acomplete(self, cache_key, fingerprint, status_code, body):
+        if status_code in self.config['RELEASE_STATUSES']:
+            await self.cache.adelete(cache_key)
+        else:
+            await self.cache.aset(cache_key, self._done(fingerprint, status_code, body), self.config['TTL'])
+
+    def release(self, cache_key):
+        self.cache.delete(cache_key)
+
+    async def arelease(self, cache_key):
+        await self.cache.adelete(cache_key)
+
+
+def validate_key(request, config):
+    """Return the request's Idempotency-Key, or an error body and status"""
+    key = request.META.get(HEADER, '').strip()
+    if not key:
+        if config['REQUIRED']:
+            return None, ({'error': 'Idempotency-Key header is required'}, status.HTTP_400_BAD_REQUEST)
+        return None, None
+    if len(key) > config['MAX_KEY_LENGTH']:
+        return None, ({'error': 'Idempotency-Key is too long'}, status.HTTP_400_BAD_REQUEST)
+    return key, None
+
+
+def idempotent(scope):
+    """Make a DRF function view replay its response for a repeated Idempotency-Key
+
+    Keys are scoped per user and per ``scope``. Place below ``@api_view`` and
+    ``@permission_classes`` so the request is already authenticated.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            store = IdempotencyStore()
+            key, error = validate_key(request, store.config)
+            if error:
+                return Response(error[0], status=error[1])
+            if key is None:
+                return view(request, *args, **kwargs)
+
+            cache_key = store.cache_key(f'{scope}:{request.user.pk}', key)
+            fingerprint = request_fingerprint(request.data)
+            try:
+                stored = store.begin(cache_key, fingerprint)
+            except IdempotencyConflict as exc:
+                return Response({'error': str(exc)}, status=exc.status_code)
+            except Exception:
+                logger.warning('Idempotency store unavailable, processing without it', exc_info=True)
+                return view(request, *args, **kwargs)
+            if stored is not None:
+                response = Response(stored[1], status=stored[0])
+                response[REPLAY_HEADER] = 'true'
+                return response
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                store.release(cache_key)
+                raise
+            store.complete(cache_key, fingerprint, response.status_code, response.data)
+            return response
+        return wrapper
+    return decorator
+
+
+def aidempotent(scope):
+    """``idempotent`` for async views returning JSON responses"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            store = IdempotencyStore()
+            key, error = validate_key(request, store.config)
+            if error:
+                return api_response(error[0], status=error[1])
+            try:
+                payload = parse_json_body(request)
+            except ValueError:
+                key = None  # the view rejects the body; nothing worth replaying
+            if key is None:
+                return await view(request, *args, **kwargs)
+
+            cache_key = store.cache_key(f'{scope}:{request.user.pk}', key)
+            fingerprint = request_fingerprint(payload)
+            try:
+                stored = await store.abegin(cache_key, fingerprint)
+            except IdempotencyConflict as exc:
+                return api_response({'error': str(exc)}, status=exc.status_code)
+            except Exception:
+                logger.warning('Idempotency store unavailable, processing without it', exc_info=True)
+                return await view(request, *args, **kwargs)
+            if stored is not None:
+                response = api_response(stored[1], status=stored[0])
+                response[REPLAY_HEADER] = 'true'
+                return response
+
+            try:
+                response = await view(request, *args, **kwargs)
+            except BaseException:
+                await store.arelease(cache_key)
+                raise
+            await store.acomplete(cache_key, fingerprint, response.status_code, json.loads(response.content))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+"""Reprocess stored gateway webhook events."""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from payments.models import WebhookEvent
+from payments.webhooks import drain_partition, replay, schedule_drain
+
+
+class Command(BaseCommand):
+    help = ('Reset stored webhook events to received and process them again. '
+            'Processing is idempotent, so replaying already-applied events is safe.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gateway')
+        parser.add_argument('--reference', help='Transaction.reference')
+        parser.add_argument('--event-id', action='append', dest='event_ids')
+        parser.add_argument('--status', choices=['received', 'processed', 'ignored', 'failed'],
+                            help='only events currently in this state (e.g. failed)')
+        parser.add_argument('--since', help='ISO datetime; events received at or after it')
+        parser.add_argument('--until', help='ISO datetime; events received before it')
+        parser.add_argument('--async', action='store_true', dest='use_workers',
+                            help='queue the drains on Celery instead of processing here')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        events = WebhookEvent.objects.all()
+        if options['gateway']:
+            events = events.filter(gateway=options['gateway'])
+        if options['reference']:
+            events = events.filter(reference=options['reference'])
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+        if options['status']:
+            events = events.filter(status=options['status'])
+        for option, lookup in (('since', 'received_at__gte'), ('until', 'received_at__lt')):
+            if options[option]:
+                value = parse_datetime(options[option])
+                if value is None:
+                    raise CommandError(f'--{option} must be an ISO datetime')
+                events = events.filter(**{lookup: value})
+
+        if options['dry_run']:
+            self.stdout.write(f'{events.count()} events would be replayed')
+            return
+
+        count, partitions = replay(events)
+        self.stdout.write(f'Reset {count} events across {len(partitions)} partitions')
+        for partition in partitions:
+            if options['use_workers']:
+                schedule_drain(partition)
+            else:
+                handled = drain_partition(partition)
+                self.stdout.write(f'  partition {partition}: processed {handled} events')
@@ -0,0 +1,35 @@
+"""Run the local mock payment gateway."""
+from django.core.management.base import BaseCommand
+
+from payments.mock_gateway import make_server
+
+
+class Command(BaseCommand):
+    help = ('Serve a mock Stripe/PayPal/Paystack/Flutterwave API with injectable latency and failures. '
+            'Point the app at it with PAYMENT_GATEWAY_MOCK_URL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+        parser.add_argument('--latency-ms', type=float, default=50)
+        parser.add_argument('--jitter-ms', type=float, default=20)
+        parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+        parser.add_argument('--decline-rate', type=float, default=0.0, help='fraction of charges declined')
+        parser.add_argument('--hang-rate', type=float, default=0.0, help='fraction of requests that stall')
+        parser.add_argument('--hang-seconds', type=float, default=30.0)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'],
+            latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'], decline_rate=options['decline_rate'],
+            hang_rate=options['hang_rate'], hang_seconds=options['hang_seconds'], seed=options['seed'],
+        )
+        self.stdout.write(f"Mock gateway listening on http://{options['host']}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
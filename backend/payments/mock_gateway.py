@@ -0,0 +1,167 @@
+"""Local stand-in for the payment gateways, for tests and benchmarks
+
+Speaks just enough of the Stripe, PayPal, Paystack and Flutterwave charge
+and refund APIs (plus a generic ``/charge`` and ``/refund``) for the
+adapters in ``payments.gateways``. Latency, errors, declines and hangs are
+injected at configurable rates so timeouts, retries and the circuit breaker
+can be exercised locally.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class MockGatewayConfig:
+    def __init__(self, latency_ms=50, jitter_ms=20, error_rate=0.0, decline_rate=0.0, hang_rate=0.0,
+                 hang_seconds=30.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.idempotent_responses = {}
+        self.stats = {'requests': 0, 'errors': 0, 'declines': 0, 'hangs': 0, 'replays': 0}
+
+    def roll(self):
+        with self.lock:
+            return self.rng.random()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def success_body(path, payload):
+    reference = payload.get('reference') or payload.get('tx_ref') or uuid.uuid4().hex[:12]
+    if path == '/v1/payment_intents':
+        return {'id': f'pi_{uuid.uuid4().hex[:16]}', 'object': 'payment_intent', 'status': 'succeeded',
+                'amount': int(payload.get('amount', 0))}
+    if path == '/v2/checkout/orders':
+        return {'id': f'PAY-{uuid.uuid4().hex[:16].upper()}', 'status': 'COMPLETED',
+                'payer': {'payer_id': f'PAYER-{uuid.uuid4().hex[:10].upper()}'}}
+    if path == '/transaction/charge_authorization':
+        return {'status': True, 'data': {'status': 'success', 'reference': reference}}
+    if path == '/v3/tokenized-charges':
+        return {'status': 'success', 'data': {'status': 'successful', 'id': random.randint(10 ** 6, 10 ** 7),
+                                              'flw_ref': f'flw_{uuid.uuid4().hex[:10]}'}}
+    return {'status': 'successful', 'reference': f'REF-{uuid.uuid4().hex[:12].upper()}',
+            'message': 'Payment processed'}
+
+
+def refund_body(path, payload):
+    refund_id = f're_{uuid.uuid4().hex[:14]}'
+    if path == '/v1/refunds':
+        return {'id': refund_id, 'object': 'refund', 'status': 'succeeded', 'amount': int(payload.get('amount', 0))}
+    if path.startswith('/v2/payments/captures/'):
+        return {'id': refund_id, 'status': 'COMPLETED'}
+    if path.startswith('/v3/transactions/'):
+        return {'status': 'success', 'data': {'id': random.randint(10 ** 5, 10 ** 6), 'status': 'completed'}}
+    if path == '/refund' and 'transaction' in payload:
+        return {'status': True, 'data': {'id': random.randint(10 ** 5, 10 ** 6), 'status': 'pending'}}
+    return {'status': 'success', 'refund_id': refund_id}
+
+
+def is_refund(path):
+    return path in ('/v1/refunds', '/refund') or path.endswith('/refund')
+
+
+def decline_body(path):
+    if path == '/v1/payment_intents':
+        return 402, {'error': {'type': 'card_error', 'code': 'card_declined', 'message': 'Your card was declined.'}}
+    if path == '/transaction/charge_authorization':
+        return 200, {'status': True, 'data': {'status': 'failed', 'gateway_response': 'Declined'}}
+    if path == '/v3/tokenized-charges':
+        return 200, {'status': 'success', 'data': {'status': 'failed', 'processor_response': 'Declined'}}
+    return 422, {'status': 'failed', 'message': 'Payment declined'}
+
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so client connection pooling is exercised
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_payload(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+        if not raw:
+            return {}
+        if 'json' in self.headers.get('Content-Type', ''):
+            return json.loads(raw)
+        return dict(parse_qsl(raw))
+
+    def do_GET(self):
+        if self.path == '/health':
+            with self.config.lock:
+                return self.send_json(200, {'status': 'ok', **self.config.stats})
+        self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        config = self.config
+        config.count('requests')
+        payload = self.read_payload()
+
+        if self.path == '/v1/oauth2/token':
+            return self.send_json(200, {'access_token': uuid.uuid4().hex, 'token_type': 'Bearer', 'expires_in': 3600})
+
+        key = self.headers.get('Idempotency-Key') or self.headers.get('PayPal-Request-Id')
+        if key:
+            key = (self.path, key)
+            with config.lock:
+                replay = config.idempotent_responses.get(key)
+            if replay is not None:
+                config.count('replays')
+                return self.send_json(*replay)
+
+        time.sleep(max(0.0, config.latency_ms + config.rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000)
+        roll = config.roll()
+        if roll < config.hang_rate:
+            config.count('hangs')
+            time.sleep(config.hang_seconds)
+            return self.send_json(504, {'error': 'upstream timeout'})
+        roll -= config.hang_rate
+        if roll < config.error_rate:
+            config.count('errors')
+            return self.send_json(503, {'error': 'service unavailable'})
+        roll -= config.error_rate
+        if roll < config.decline_rate:
+            config.count('declines')
+            result = decline_body(self.path)
+        elif is_refund(self.path):
+            result = (200, refund_body(self.path, payload))
+        else:
+            result = (200, success_body(self.path, payload))
+
+        if key:
+            with config.lock:
+                config.idempotent_responses[key] = result
+        self.send_json(*result)
+
+
+def make_server(host='127.0.0.1', port=8099, **options):
+    handler = type('ConfiguredMockGatewayHandler', (MockGatewayHandler,), {'config': MockGatewayConfig(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(host='127.0.0.1', port=0, **options):
+    """Start a server on a background thread; returns ``(server, base_url)``"""
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
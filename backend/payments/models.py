@@ -109,4 +109,39 @@ class Refund(models.Model):
 
     class Meta:
         db_table = 'refunds'
-        ordering = ['-requested_at']
\ No newline at end of file
+        ordering = ['-requested_at']
+
+class WebhookEvent(models.Model):
+    """Raw gateway callbacks, appended on receipt and processed by workers"""
+    STATUS_CHOICES = [
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)  # insertion order is processing order
+    gateway = models.CharField(max_length=50)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100, blank=True)
+    reference = models.CharField(max_length=100, blank=True)  # Transaction.reference
+    partition = models.PositiveSmallIntegerField(default=0)  # events for one reference share a partition
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.gateway} {self.event_type} {self.event_id}"
+
+    class Meta:
+        db_table = 'webhook_events'
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'event_id'], name='unique_gateway_event'),
+        ]
+        indexes = [
+            models.Index(fields=['partition', 'status', 'id']),
+            models.Index(fields=['reference']),
+        ]
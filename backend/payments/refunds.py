@@ -0,0 +1,344 @@
+import logging
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .gateways import gateway_registry
+from .models import Refund, Transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Allowed Refund.status transitions; everything else is rejected
+TRANSITIONS = {
+    'requested': {'approved', 'processing', 'rejected'},
+    'approved': {'processing', 'rejected'},
+    # processing -> processing resumes a call the gateway dedupes; -> approved requeues one never sent
+    'processing': {'processing', 'approved', 'completed', 'rejected'},
+    'completed': set(),
+    'rejected': set(),
+}
+OPEN_STATUSES = ('requested', 'approved', 'processing')
+
+SEMAPHORE_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local token = ARGV[2]
+local lease_ms = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+if redis.call('ZSCORE', key, token) or redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now + lease_ms, token)
+    redis.call('PEXPIRE', key, lease_ms * 2)
+    return 1
+end
+return 0
+"""
+
+
+def get_refund_settings():
+    config = {
+        'CONCURRENCY': {'DEFAULT': 4},  # concurrent gateway refund calls per gateway, across all workers
+        'LEASE_SECONDS': 60,  # must outlive the slowest gateway call, retries included
+        'SLOT_RETRY_DELAY': 1.0,
+        'MAX_GATEWAY_ATTEMPTS': 10,
+        'BULK_MAX_REFUNDS': 5000,
+        'KEY_PREFIX': 'refunds',
+    }
+    config.update(getattr(settings, 'PAYMENT_REFUNDS', {}))
+    return config
+
+
+class RefundError(Exception):
+    """A refund request that cannot be accepted"""
+
+
+def transition(refund, status):
+    if status not in TRANSITIONS[refund.status]:
+        raise RefundError(f"Refund {refund.pk} cannot move from '{refund.status}' to '{status}'")
+    refund.status = status
+
+
+def reserved_amounts(transaction_ids):
+    """Amount already claimed by refunds that are not rejected, per transaction"""
+    rows = (
+        Refund.objects.filter(transaction_id__in=transaction_ids)
+        .exclude(status='rejected')
+        .values('transaction_id')
+        .annotate(total=Sum('requested_amount'))
+    )
+    return {row['transaction_id']: row['total'] for row in rows}
+
+
+def enqueue(refund_ids):
+    from .tasks import process_refund
+
+    refund_ids = list(refund_ids)
+    db_transaction.on_commit(lambda: [process_refund.delay(refund_id) for refund_id in refund_ids])
+
+
+def request_refund(transaction_id, user, amount, reason):
+    """Record a customer refund request and queue it; raises RefundError if not refundable"""
+    with db_transaction.atomic():
+        # Locking the transaction serialises concurrent requests so their sum can't exceed it
+        try:
+            payment = Transaction.objects.select_for_update().get(id=transaction_id, user=user, status='completed')
+        except Transaction.DoesNotExist:
+            raise RefundError('Transaction not found or not eligible for refund')
+
+        reserved = reserved_amounts([payment.id]).get(payment.id, Decimal('0'))
+        if amount <= 0:
+            raise RefundError('Refund amount must be positive')
+        if reserved + amount > payment.amount:
+            raise RefundError(
+                f'Refund amount exceeds the refundable balance of {payment.amount - reserved}'
+            )
+
+        refund = Refund.objects.create(
+            transaction=payment,
+            order_id=payment.order_id,
+            user=user,
+            reason=reason,
+            requested_amount=amount,
+        )
+        enqueue([refund.pk])
+    return refund
+
+
+def flash_sale_refund_plans(flash_sale):
+    """Refund the flash-sale line of every paid order placed during the sale"""
+    items = (
+        OrderItem.objects.filter(
+            product_id=flash_sale.product_id,
+            order__created_at__gte=flash_sale.start_time,
+            order__created_at__lte=flash_sale.end_time,
+            order__payment_status='paid',
+        )
+        .values('order_id')
+        .annotate(total=Sum('total_price'))
+    )
+    totals = {row['order_id']: row['total'] for row in items}
+    payments = Transaction.objects.filter(
+        order_id__in=totals, status='completed', transaction_type='payment'
+    ).values_list('id', 'order_id')
+    return [(payment_id, totals[order_id]) for payment_id, order_id in payments]
+
+
+def bulk_request_refunds(plans, reason, notes=''):
+    """Create approved refunds for ``(transaction_id, amount or None)`` pairs in one pass
+
+    ``None`` refunds whatever is left. Amounts are capped at the refundable
+    balance; transactions with nothing left are reported as skipped.
+    """
+    requested = {}
+    for transaction_id, amount in plans:
+        previous = requested.get(transaction_id, Decimal('0'))
+        requested[transaction_id] = None if amount is None or previous is None else previous + amount
+
+    created, skipped = [], []
+    with db_transaction.atomic():
+        # Lock in primary key order so concurrent bulk runs can't deadlock each other
+        payments = list(
+            Transaction.objects.select_for_update()
+            .filter(id__in=requested, status='completed')
+            .order_by('id')
+        )
+        reserved = reserved_amounts([p.id for p in payments])
+        found = {p.id for p in payments}
+        skipped.extend({'transaction_id': str(t), 'reason': 'not found or not completed'}
+                       for t in requested if t not in found)
+
+        refunds = []
+        now = timezone.now()
+        for payment in payments:
+            available = payment.amount - reserved.get(payment.id, Decimal('0'))
+            amount = requested[payment.id]
+            amount = available if amount is None else min(amount, available)
+            if amount <= 0:
+                skipped.append({'transaction_id': str(payment.id), 'reason': 'already fully refunded'})
+                continue
+            refunds.append(Refund(
+                transaction=payment,
+                order_id=payment.order_id,
+                user_id=payment.user_id,
+                reason=reason,
+                notes=notes,
+                status='approved',
+                requested_amount=amount,
+                processed_at=now,
+            ))
+        created = Refund.objects.bulk_create(refunds, batch_size=1000)
+        enqueue(refund.pk for refund in created)
+    return created, skipped
+
+
+def start_refund(refund_id, resume=False):
+    """Move a refund to processing; returns it with its transaction, or None if it must not be sent
+
+    A refund already in processing may have reached the gateway, for instance
+    when a worker died mid-call and the task was redelivered. It is only sent
+    again when ``resume`` says the gateway dedupes repeats.
+    """
+    with db_transaction.atomic():
+        refund = Refund.objects.select_for_update().select_related('transaction').get(pk=refund_id)
+        if refund.status not in OPEN_STATUSES:
+            return None
+        if refund.status == 'processing' and not resume:
+            logger.error('Refund %s is already processing; left for reconciliation rather than sent again', refund_id)
+            return None
+        transition(refund, 'processing')
+        refund.processed_at = refund.processed_at or timezone.now()
+        refund.save(update_fields=['status', 'processed_at'])
+    return refund
+
+
+def requeue_refund(refund_id):
+    """Put a refund the gateway never received back to approved so it can be sent again"""
+    with db_transaction.atomic():
+        refund = Refund.objects.select_for_update().get(pk=refund_id)
+        if refund.status == 'processing':
+            transition(refund, 'approved')
+            refund.save(update_fields=['status'])
+
+
+def finish_refund(refund_id, result):
+    """Apply a gateway result; marks the transaction and order refunded once fully refunded"""
+    with db_transaction.atomic():
+        refund = Refund.objects.select_for_update().get(pk=refund_id)
+        if refund.status != 'processing':
+            return refund
+        now = timezone.now()
+        if result['success']:
+            transition(refund, 'completed')
+            refund.refunded_amount = refund.requested_amount
+            refund.gateway_refund_id = result.get('refund_id', '')[:100]
+            refund.gateway_response = result.get('response', {})
+            refund.completed_at = now
+        else:
+            transition(refund, 'rejected')
+            refund.gateway_response = result.get('error', {})
+            refund.notes = '\n'.join(filter(None, [refund.notes, result.get('message', '')]))
+        refund.save(update_fields=[
+            'status', 'refunded_amount', 'gateway_refund_id', 'gateway_response', 'notes', 'completed_at',
+        ])
+
+        if refund.status == 'completed':
+            payment = Transaction.objects.select_for_update().get(pk=refund.transaction_id)
+            refunded = (
+                Refund.objects.filter(transaction_id=payment.pk, status='completed')
+                .aggregate(total=Sum('refunded_amount'))['total']
+            ) or Decimal('0')
+            if refunded >= payment.amount and payment.status != 'refunded':
+                payment.status = 'refunded'
+                payment.save(update_fields=['status', 'updated_at'])
+                Order.objects.filter(pk=payment.order_id).update(payment_status='refunded', updated_at=now)
+    return refund
+
+
+class GatewaySemaphore:
+    """Distributed counting semaphore limiting in-flight refund calls per gateway
+
+    Slots are leases in a Redis sorted set scored by expiry, so a worker that
+    dies mid-call frees its slot after ``LEASE_SECONDS``.
+    """
+
+    def __init__(self, client, config):
+        self.client = client
+        self.config = config
+        self.script = client.register_script(SEMAPHORE_SCRIPT)
+
+    def key(self, gateway_name):
+        return f"{self.config['KEY_PREFIX']}:inflight:{gateway_name}"
+
+    def limit(self, gateway_name):
+        concurrency = self.config['CONCURRENCY']
+        return concurrency.get(gateway_name, concurrency.get('DEFAULT', 4))
+
+    def acquire(self, gateway_name, token):
+        lease_ms = int(self.config['LEASE_SECONDS'] * 1000)
+        return bool(self.script(keys=[self.key(gateway_name)], args=[self.limit(gateway_name), token, lease_ms]))
+
+    def release(self, gateway_name, token):
+        self.client.zrem(self.key(gateway_name), token)
+
+    def in_flight(self, gateway_name):
+        now_ms = int(time.time() * 1000)
+        return self.client.zcount(self.key(gateway_name), now_ms, '+inf')
+
+
+class RefundMetrics:
+    """Per-gateway refund counters and per-minute throughput buckets in Redis"""
+
+    OUTCOMES = ('completed', 'rejected', 'error')
+    WINDOWS = (1, 5, 15)  # minutes
+
+    def __init__(self, client, config):
+        self.client = client
+        self.prefix = f"{config['KEY_PREFIX']}:metrics"
+
+    def record(self, gateway_name, outcome, duration_ms):
+        minute = int(time.time() // 60)
+        bucket = f'{self.prefix}:{gateway_name}:{minute}'
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(f'{self.prefix}:{gateway_name}', outcome, 1)
+        pipe.hincrbyfloat(f'{self.prefix}:{gateway_name}', 'gateway_ms', duration_ms)
+        pipe.hincrby(bucket, outcome, 1)
+        pipe.expire(bucket, max(self.WINDOWS) * 60 + 120)
+        pipe.execute()
+
+    def snapshot(self, gateway_name):
+        minute = int(time.time() // 60)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(f'{self.prefix}:{gateway_name}')
+        for offset in range(max(self.WINDOWS)):
+            pipe.hgetall(f'{self.prefix}:{gateway_name}:{minute - offset}')
+        totals, *buckets = pipe.execute()
+
+        totals = {k.decode(): float(v) for k, v in totals.items()}
+        calls = sum(totals.get(outcome, 0) for outcome in self.OUTCOMES)
+        result = {outcome: int(totals.get(outcome, 0)) for outcome in self.OUTCOMES}
+        result['avg_gateway_ms'] = round(totals.get('gateway_ms', 0) / calls, 2) if calls else 0.0
+        for window in self.WINDOWS:
+            done = sum(
+                int(bucket.get(b'completed', 0)) + int(bucket.get(b'rejected', 0)) for bucket in buckets[:window]
+            )
+            result[f'per_minute_{window}m'] = round(done / window, 2)
+        return result
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def refund_metrics():
+    """Throughput, outcomes and backlog per gateway for the admin metrics endpoint"""
+    config = get_refund_settings()
+    client = get_redis()
+    metrics = RefundMetrics(client, config)
+    semaphore = GatewaySemaphore(client, config)
+    queued = {}
+    for row in (
+        Refund.objects.filter(status__in=OPEN_STATUSES)
+        .values('transaction__gateway__name', 'status')
+        .annotate(count=Count('id'), total=Sum('requested_amount'))
+    ):
+        entry = queued.setdefault(row['transaction__gateway__name'], {'queued': {}, 'queued_amount': Decimal('0')})
+        entry['queued'][row['status']] = row['count']
+        entry['queued_amount'] += row['total']
+
+    result = {}
+    for name in gateway_registry.entries():
+        result[name] = {
+            **metrics.snapshot(name),
+            'in_flight': semaphore.in_flight(name),
+            'concurrency_limit': semaphore.limit(name),
+            **queued.get(name, {'queued': {}, 'queued_amount': Decimal('0')}),
+        }
+    return result
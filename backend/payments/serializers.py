@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from decimal import Decimal
 from .models import PaymentGateway, Transaction, Refund
 from orders.serializers import OrderSerializer
 
@@ -59,15 +60,27 @@ class ProcessPaymentSerializer(serializers.Serializer):
     account_number = serializers.CharField(required=False)  # For bank transfers
     
     def validate_gateway_name(self, value):
-        from .models import PaymentGateway
-        try:
-            gateway = PaymentGateway.objects.get(name=value, is_active=True)
-            return value
-        except PaymentGateway.DoesNotExist:
+        from .gateways import gateway_registry
+        if gateway_registry.get(value) is None:
             raise serializers.ValidationError(f"Payment gateway '{value}' is not supported or inactive")
+        return value
 
 
 class RefundRequestSerializer(serializers.Serializer):
     transaction_id = serializers.UUIDField()
     reason = serializers.CharField(max_length=200)
-    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
\ No newline at end of file
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class BulkRefundSerializer(serializers.Serializer):
+    """Either a flash sale to unwind or an explicit list of transactions"""
+    reason = serializers.CharField(max_length=200)
+    flash_sale_id = serializers.IntegerField(required=False)
+    transaction_ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    # Per transaction; defaults to whatever is left to refund
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=Decimal('0.01'))
+
+    def validate(self, attrs):
+        if bool(attrs.get('flash_sale_id')) == bool(attrs.get('transaction_ids')):
+            raise serializers.ValidationError('Provide exactly one of flash_sale_id or transaction_ids')
+        return attrs
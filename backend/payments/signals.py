@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .gateways import bump_registry_version
+from .models import PaymentGateway
+
+
+@receiver(post_save, sender=PaymentGateway)
+@receiver(post_delete, sender=PaymentGateway)
+def invalidate_gateway_registry(sender, instance, **kwargs):
+    """Publish a new registry version once the gateway change is committed"""
+    transaction.on_commit(bump_registry_version)
@@ -0,0 +1,96 @@
+import logging
+import time
+
+from celery import shared_task
+from django.db import DatabaseError
+
+from .gateways import GatewayError, get_gateway_client
+from .models import Refund
+from .refunds import (
+    GatewaySemaphore, RefundMetrics, finish_refund, get_redis, get_refund_settings, requeue_refund, start_refund,
+)
+from .webhooks import drain_partition
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=None)
+def process_refund(self, refund_id, attempt=0):
+    """Send a queued refund to its gateway, holding one of the gateway's concurrency slots"""
+    config = get_refund_settings()
+    gateway = Refund.objects.select_related('transaction__gateway').get(pk=refund_id).transaction.gateway
+
+    semaphore = metrics = None
+    token = f'{refund_id}:{self.request.id}'
+    try:
+        redis_client = get_redis()
+        semaphore = GatewaySemaphore(redis_client, config)
+        metrics = RefundMetrics(redis_client, config)
+        acquired = semaphore.acquire(gateway.name, token)
+    except Exception:
+        logger.warning('Refund concurrency limiter unavailable, calling %s unthrottled', gateway.name, exc_info=True)
+        acquired = True
+        semaphore = None
+    if not acquired:
+        # Waiting for a slot does not count against the gateway attempt budget
+        raise self.retry(countdown=config['SLOT_RETRY_DELAY'] * (1 + self.request.retries % 5))
+
+    try:
+        client = get_gateway_client(gateway)
+        dedupes = client.idempotency_header is not None
+        refund = start_refund(refund_id, resume=dedupes)
+        if refund is None:
+            return
+        started = time.perf_counter()
+        try:
+            result = client.refund(refund, refund.transaction)
+        except GatewayError as exc:
+            record(metrics, gateway.name, 'error', started)
+            if exc.sent and not dedupes:
+                # The refund may have gone through and this gateway cannot dedupe a repeat
+                logger.error(
+                    'Refund %s failed on %s after it was sent; left in processing for reconciliation: %s',
+                    refund_id, gateway.name, exc
+                )
+                return
+            if not exc.sent:
+                requeue_refund(refund_id)
+            if attempt + 1 >= config['MAX_GATEWAY_ATTEMPTS']:
+                # Left for a person: a refund still in processing may have gone through
+                logger.error('Refund %s gave up after %s gateway attempts: %s', refund_id, attempt + 1, exc)
+                return
+            raise self.retry(
+                exc=exc, args=[refund_id], kwargs={'attempt': attempt + 1}, countdown=min(300, 2 ** min(attempt, 8))
+            )
+        record(metrics, gateway.name, 'completed' if result['success'] else 'rejected', started)
+        try:
+            finish_refund(refund_id, result)
+        except DatabaseError as exc:
+            if not dedupes:
+                # Replaying the call would refund twice; keep the result for whoever reconciles it
+                logger.error(
+                    'Refund %s was sent to %s but could not be saved; left in processing for reconciliation: %s',
+                    refund_id, gateway.name, result, exc_info=True
+                )
+                return
+            # The gateway dedupes on the refund id, so replaying the call is safe
+            raise self.retry(exc=exc, countdown=5)
+    finally:
+        if semaphore is not None:
+            semaphore.release(gateway.name, token)
+
+
+def record(metrics, gateway_name, outcome, started):
+    if metrics is None:
+        return
+    try:
+        metrics.record(gateway_name, outcome, (time.perf_counter() - started) * 1000)
+    except Exception:
+        logger.warning('Could not record refund metrics', exc_info=True)
+
+
+@shared_task(autoretry_for=(DatabaseError,), retry_backoff=True, retry_jitter=True, max_retries=10)
+def drain_webhook_events(partition):
+    """Apply received webhook events of one partition in arrival order"""
+    return drain_partition(partition)
@@ -0,0 +1,365 @@
+import os
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+import httpx
+from django.db import DatabaseError
+from django.test import SimpleTestCase, override_settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from core.testing import redis_or_skip
+from .gateways.adapters import PayPalClient
+from .gateways.base import CircuitBreaker, CircuitOpenError, GatewayClient, GatewayError, GatewayTimeout
+from .idempotency import REPLAY_HEADER, IdempotencyConflict, IdempotencyStore, idempotent
+from .refunds import GatewaySemaphore, get_refund_settings, start_refund
+from .tasks import process_refund
+from .webhooks import REFUNDED, BatchApplier, PaystackWebhookParser, StripeWebhookParser
+
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'payments-tests'}}
+
+
+class StubClient(GatewayClient):
+    name = 'stub'
+
+    def __init__(self, handler, **kwargs):
+        super().__init__('https://gateway.test', **kwargs)
+        self._pid = None
+        self.handler = handler
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.Client(base_url=self.base_url, transport=httpx.MockTransport(self.handler))
+        return self._client
+
+
+def request():
+    return 'POST', '/charge', {'json': {}}
+
+
+def parse(response):
+    return response.json()
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('payments.gateways.base.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_allows_limited_trial_calls(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, half_open_max_calls=1)
+        breaker.record_failure()
+        self.now += 30
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_client_recovers_open_to_half_open_to_closed(self):
+        responses = iter([httpx.Response(503), httpx.Response(200, json={'ok': True})])
+        client = StubClient(
+            lambda _: next(responses),
+            retry={'max_attempts': 1},
+            breaker={'failure_threshold': 1, 'reset_timeout': 30, 'half_open_max_calls': 1},
+        )
+
+        with self.assertRaises(GatewayError):
+            client.execute(request(), 'ref-1', parse)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            client.execute(request(), 'ref-2', parse)
+
+        self.now += 30
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(client.execute(request(), 'ref-3', parse), {'ok': True})
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retries_take_one_breaker_check_per_attempt(self):
+        responses = iter([httpx.Response(429), httpx.Response(200, json={'ok': True})])
+        client = StubClient(lambda _: next(responses), retry={'max_attempts': 2, 'backoff_base': 0})
+
+        with mock.patch.object(client.breaker, 'allow', wraps=client.breaker.allow) as allow:
+            self.assertEqual(client.execute(request(), 'ref-1', parse), {'ok': True})
+        self.assertEqual(allow.call_count, 2)
+
+
+class RetryTests(SimpleTestCase):
+    def gateway(self, *outcomes, idempotency_header=None):
+        outcomes = iter(outcomes)
+
+        def handler(request):
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        client = StubClient(handler, retry={'max_attempts': 3, 'backoff_base': 0})
+        client.idempotency_header = idempotency_header
+        return client
+
+    def test_server_error_is_not_retried_without_idempotency(self):
+        client = self.gateway(httpx.Response(502), httpx.Response(200, json={'ok': True}))
+        with self.assertRaises(GatewayError) as raised:
+            client.execute(request(), 'ref-1', parse)
+        self.assertEqual(raised.exception.status_code, 502)
+
+    def test_server_error_is_retried_with_idempotency(self):
+        client = self.gateway(
+            httpx.Response(502), httpx.Response(200, json={'ok': True}), idempotency_header='Idempotency-Key'
+        )
+        self.assertEqual(client.execute(request(), 'ref-1', parse), {'ok': True})
+
+    def test_unsent_requests_are_retried_on_every_gateway(self):
+        client = self.gateway(
+            httpx.ConnectError('refused'), httpx.Response(429), httpx.Response(200, json={'ok': True})
+        )
+        self.assertEqual(client.execute(request(), 'ref-1', parse), {'ok': True})
+
+
+class PayPalClientTests(SimpleTestCase):
+    def setUp(self):
+        self.gateway = PayPalClient('https://paypal.test')
+
+    def order(self, status):
+        return httpx.Response(200, json={
+            'id': 'ORDER-1',
+            'status': status,
+            'purchase_units': [{'payments': {'captures': [{'id': 'CAPTURE-1'}]}}],
+        })
+
+    def test_approved_order_is_captured(self):
+        calls = []
+
+        def handler(request):
+            calls.append((request.url.path, request.headers.get('PayPal-Request-Id')))
+            if request.url.path == '/v1/oauth2/token':
+                return httpx.Response(200, json={'access_token': 'token', 'expires_in': 3600})
+            if request.url.path == '/v2/checkout/orders':
+                return httpx.Response(201, json={'id': 'ORDER-1', 'status': 'APPROVED'})
+            return self.order('COMPLETED')
+
+        self.gateway._client = httpx.Client(base_url='https://paypal.test', transport=httpx.MockTransport(handler))
+        self.gateway._pid = os.getpid()
+        transaction = mock.Mock(reference='TXN-1', description='Order', amount='25.00')
+
+        result = self.gateway.charge(transaction, {'card_token': 'VAULT-1'})
+        self.assertTrue(result['success'])
+        self.assertEqual(result['response']['capture_id'], 'CAPTURE-1')
+        self.assertEqual(calls[1:], [
+            ('/v2/checkout/orders', 'TXN-1'),
+            ('/v2/checkout/orders/ORDER-1/capture', 'TXN-1:capture'),
+        ])
+
+    def test_approved_order_is_not_a_payment(self):
+        self.assertFalse(self.gateway.parse_charge(self.order('APPROVED'))['success'])
+
+    def test_completed_order_records_the_capture(self):
+        result = self.gateway.parse_charge(self.order('COMPLETED'))
+        self.assertTrue(result['success'])
+        self.assertEqual(result['response']['capture_id'], 'CAPTURE-1')
+
+        transaction = mock.Mock(gateway_response=result['response'])
+        refund = mock.Mock(requested_amount='5.00', reason='damaged')
+        _, path, _ = self.gateway.build_refund(refund, transaction)
+        self.assertEqual(path, '/v2/payments/captures/CAPTURE-1/refund')
+
+
+class ProcessRefundTests(SimpleTestCase):
+    def setUp(self):
+        self.gateway = mock.Mock(idempotency_header=None)
+        self.finish = mock.Mock()
+        self.requeue = mock.Mock()
+        refund = mock.Mock()
+        refund.transaction.gateway.name = 'paystack'
+        for target, value in (
+            ('payments.tasks.Refund.objects', mock.Mock(**{'select_related.return_value.get.return_value': refund})),
+            ('payments.tasks.get_redis', mock.Mock(side_effect=ConnectionError)),
+            ('payments.tasks.start_refund', mock.Mock(return_value=refund)),
+            ('payments.tasks.get_gateway_client', mock.Mock(return_value=self.gateway)),
+            ('payments.tasks.finish_refund', self.finish),
+            ('payments.tasks.requeue_refund', self.requeue),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_timeout_without_idempotency_is_not_retried(self):
+        self.gateway.refund.side_effect = GatewayTimeout('paystack did not respond in time')
+        with self.assertLogs('payments.tasks', 'ERROR'):
+            process_refund(1)
+        self.gateway.refund.assert_called_once()
+        self.finish.assert_not_called()
+
+    def test_server_error_without_idempotency_is_not_retried(self):
+        self.gateway.refund.side_effect = GatewayError('paystack returned HTTP 502', status_code=502)
+        with self.assertLogs('payments.tasks', 'ERROR'):
+            process_refund(1)
+        self.requeue.assert_not_called()
+
+    def test_unsent_refund_is_requeued_and_retried(self):
+        self.gateway.refund.side_effect = GatewayError('paystack unreachable: ConnectError', sent=False)
+        with self.assertRaises(GatewayError), self.assertLogs('payments.tasks', 'WARNING'):
+            process_refund(1)
+        self.requeue.assert_called_once_with(1)
+
+    def test_failed_save_without_idempotency_is_not_retried(self):
+        self.gateway.refund.return_value = {'success': True, 'refund_id': 'RF-1'}
+        self.finish.side_effect = DatabaseError
+        with self.assertLogs('payments.tasks', 'ERROR'):
+            process_refund(1)
+        self.gateway.refund.assert_called_once()
+
+    def test_timeout_with_idempotency_is_retried(self):
+        self.gateway.idempotency_header = 'Idempotency-Key'
+        self.gateway.refund.side_effect = GatewayTimeout('stripe did not respond in time')
+        with self.assertRaises(GatewayTimeout), self.assertLogs('payments.tasks', 'WARNING'):
+            process_refund(1)
+
+
+class StartRefundTests(SimpleTestCase):
+    def start(self, status, **kwargs):
+        refund = mock.Mock(status=status, processed_at=None)
+        objects = mock.Mock(**{'select_for_update.return_value.select_related.return_value.get.return_value': refund})
+        with mock.patch('payments.refunds.Refund.objects', objects), \
+                mock.patch('payments.refunds.db_transaction.atomic'):
+            return start_refund(1, **kwargs)
+
+    def test_processing_refund_is_not_sent_again(self):
+        with self.assertLogs('payments.refunds', 'ERROR'):
+            self.assertIsNone(self.start('processing'))
+
+    def test_processing_refund_resumes_when_the_gateway_dedupes(self):
+        self.assertEqual(self.start('processing', resume=True).status, 'processing')
+
+    def test_approved_refund_starts(self):
+        self.assertEqual(self.start('approved').status, 'processing')
+
+
+@override_settings(CACHES=LOCMEM)
+class IdempotencyStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = IdempotencyStore()
+        self.key = self.store.cache_key('tests', uuid.uuid4().hex)
+
+    def test_completed_response_is_replayed(self):
+        self.assertIsNone(self.store.begin(self.key, 'body-a'))
+        self.store.complete(self.key, 'body-a', 201, {'id': 1})
+        self.assertEqual(self.store.begin(self.key, 'body-a'), (201, {'id': 1}))
+
+    def test_reused_key_with_another_body_is_rejected(self):
+        self.store.begin(self.key, 'body-a')
+        self.store.complete(self.key, 'body-a', 201, {'id': 1})
+        with self.assertRaises(IdempotencyConflict) as raised:
+            self.store.begin(self.key, 'body-b')
+        self.assertEqual(raised.exception.status_code, 422)
+
+    def test_duplicate_of_a_request_in_progress_times_out(self):
+        self.store.config['WAIT_TIMEOUT'] = 0
+        self.store.begin(self.key, 'body-a')
+        with self.assertRaises(IdempotencyConflict) as raised:
+            self.store.begin(self.key, 'body-a')
+        self.assertEqual(raised.exception.status_code, 409)
+
+    def test_gateway_unavailable_response_is_not_kept(self):
+        self.store.begin(self.key, 'body-a')
+        self.store.complete(self.key, 'body-a', 503, {'error': 'unavailable'})
+        self.assertIsNone(self.store.begin(self.key, 'body-a'))
+
+    def test_view_runs_once_per_key(self):
+        calls = []
+
+        @api_view(['POST'])
+        @permission_classes([AllowAny])
+        @idempotent('tests')
+        def view(request):
+            calls.append(request.data)
+            return Response({'call': len(calls)}, status=201)
+
+        factory = APIRequestFactory()
+        key = uuid.uuid4().hex
+        first = view(factory.post('/', {'amount': '10.00'}, format='json', HTTP_IDEMPOTENCY_KEY=key))
+        second = view(factory.post('/', {'amount': '10.00'}, format='json', HTTP_IDEMPOTENCY_KEY=key))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second[REPLAY_HEADER], 'true')
+
+
+class GatewaySemaphoreTests(SimpleTestCase):
+    def setUp(self):
+        client = redis_or_skip()
+        config = get_refund_settings()
+        config.update({'KEY_PREFIX': f'tests:{uuid.uuid4().hex}', 'CONCURRENCY': {'DEFAULT': 2}})
+        self.semaphore = GatewaySemaphore(client, config)
+        self.addCleanup(client.delete, self.semaphore.key('stripe'))
+
+    def test_limits_calls_in_flight_per_gateway(self):
+        self.assertTrue(self.semaphore.acquire('stripe', 'a'))
+        self.assertTrue(self.semaphore.acquire('stripe', 'b'))
+        self.assertFalse(self.semaphore.acquire('stripe', 'c'))
+        self.assertEqual(self.semaphore.in_flight('stripe'), 2)
+
+        self.semaphore.release('stripe', 'a')
+        self.assertTrue(self.semaphore.acquire('stripe', 'c'))
+
+    def test_holder_can_renew_its_slot_when_full(self):
+        self.semaphore.acquire('stripe', 'a')
+        self.semaphore.acquire('stripe', 'b')
+        self.assertTrue(self.semaphore.acquire('stripe', 'b'))
+
+
+class RefundWebhookTests(SimpleTestCase):
+    def setUp(self):
+        self.payment = mock.Mock(
+            status='completed', amount=Decimal('100.00'), order_id=1, gateway_response={},
+            gateway_data={'webhook_confirmed': 'evt-paid'},
+        )
+        self.payment.gateway.name = 'stripe'
+        self.applier = BatchApplier()
+        self.applier.transactions['TXN-1'] = self.payment
+
+    def apply(self, event_id, parser, payload):
+        event = mock.Mock(event_id=event_id, event_type='refund', reference='TXN-1')
+        return self.applier.apply(event, REFUNDED, parser.refunded_amount(payload), parser.cumulative_refunds)
+
+    def stripe_refund(self, event_id, amount_refunded):
+        return self.apply(event_id, StripeWebhookParser(), {'data': {'object': {'amount_refunded': amount_refunded}}})
+
+    def revenue(self):
+        return sum(columns['total_revenue'] for columns in self.applier.revenue.values())
+
+    def test_partial_refund_subtracts_only_what_was_refunded(self):
+        self.stripe_refund('evt-1', 3000)
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.applier.order_status, {})
+        self.assertEqual(self.revenue(), Decimal('-30.00'))
+
+    def test_cumulative_refunds_complete_the_refund_once(self):
+        self.stripe_refund('evt-1', 3000)
+        self.stripe_refund('evt-2', 10000)
+        self.stripe_refund('evt-2', 10000)  # redelivered
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(self.applier.order_status, {1: 'refunded'})
+        self.assertEqual(self.revenue(), Decimal('-100.00'))
+
+    def test_per_refund_amounts_add_up(self):
+        parser = PaystackWebhookParser()
+        self.apply('refund.processed:1', parser, {'data': {'amount': 4000}})
+        self.assertEqual(self.payment.status, 'completed')
+        self.apply('refund.processed:2', parser, {'data': {'amount': 6000}})
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(self.revenue(), Decimal('-100.00'))
@@ -1,11 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# I/O-bound endpoints switch to their async versions when served over ASGI
+io_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('gateways/', views.list_payment_gateways, name='list-payment-gateways'),
+    path('gateways/', io_views.list_payment_gateways, name='list-payment-gateways'),
     path('transactions/', views.list_transactions, name='list-transactions'),
     path('transactions/<uuid:transaction_id>/', views.get_transaction, name='get-transaction'),
-    path('process/', views.process_payment, name='process-payment'),
+    path('process/', io_views.process_payment, name='process-payment'),
     path('refund/', views.request_refund, name='request-refund'),
+    path('refunds/bulk/', views.bulk_refund, name='bulk-refund'),
+    path('refunds/metrics/', views.refund_metrics, name='refund-metrics'),
+    path('webhooks/<slug:gateway_name>/', views.gateway_webhook, name='gateway-webhook'),
     path('stats/', views.get_payment_stats, name='payment-stats'),
 ]
\ No newline at end of file
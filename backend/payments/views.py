@@ -1,24 +1,29 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from decimal import Decimal
 import uuid
-from .models import PaymentGateway, Transaction, Refund
+from .models import Transaction
 from .serializers import (
-    PaymentGatewaySerializer, TransactionSerializer, RefundSerializer,
-    ProcessPaymentSerializer, RefundRequestSerializer
+    TransactionSerializer, RefundSerializer,
+    ProcessPaymentSerializer, RefundRequestSerializer, BulkRefundSerializer
 )
 from orders.models import Order
+from promotions.models import FlashSale
+from . import refunds, webhooks
+from .gateways import CircuitOpenError, GatewayError, GatewayTimeout, gateway_registry, get_gateway_client
+from .idempotency import idempotent
 
 
 @api_view(['GET'])
 def list_payment_gateways(request):
     """Get all active payment gateways"""
-    gateways = PaymentGateway.objects.filter(is_active=True)
-    serializer = PaymentGatewaySerializer(gateways, many=True)
-    return Response(serializer.data)
+    return Response(gateway_registry.listing())
 
 
 @api_view(['GET'])
@@ -41,6 +46,7 @@ def get_transaction(request, transaction_id):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('process_payment')
 def process_payment(request):
     """Process a payment using a specific gateway"""
     serializer = ProcessPaymentSerializer(data=request.data)
@@ -56,10 +62,10 @@ def process_payment(request):
             return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Validate gateway
-        try:
-            gateway = PaymentGateway.objects.get(name=gateway_name, is_active=True)
-        except PaymentGateway.DoesNotExist:
+        entry = gateway_registry.get(gateway_name)
+        if entry is None:
             return Response({'error': 'Payment gateway not supported'}, status=status.HTTP_400_BAD_REQUEST)
+        gateway = entry.gateway
         
         # Validate amount matches order total
         if amount != order.total_amount:
@@ -76,13 +82,9 @@ def process_payment(request):
             status='pending'
         )
         
-        # Here we would integrate with the actual payment gateway
-        # For now, we'll simulate a successful payment
-        # In a real implementation, this would involve calling the gateway's API
         try:
-            # Simulate payment processing
-            # This is where you'd integrate with Stripe, PayPal, etc.
-            payment_result = simulate_payment_processing(gateway_name, serializer.validated_data)
+            client = get_gateway_client(gateway)
+            payment_result = client.charge(transaction, serializer.validated_data)
             
             if payment_result['success']:
                 transaction.status = 'completed'
@@ -110,6 +112,9 @@ def process_payment(request):
                     'transaction': TransactionSerializer(transaction).data
                 }, status=status.HTTP_400_BAD_REQUEST)
                 
+        except GatewayError as e:
+            body, response_status = record_gateway_error(transaction, e)
+            return Response(body, status=response_status)
         except Exception as e:
             transaction.status = 'failed'
             transaction.gateway_response = {'error': str(e)}
@@ -124,133 +129,95 @@ def process_payment(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-def simulate_payment_processing(gateway_name, payment_data):
-    """
-    Simulate payment processing for different gateways
-    In a real implementation, this would integrate with actual payment APIs
-    """
-    # In a real app, this would make actual API calls to payment gateways
-    import datetime
-    from django.utils import timezone
-    
-    # Simulate different gateway responses
-    if gateway_name == 'stripe':
-        # Simulate Stripe processing
-        return {
-            'success': True,
-            'response': {
-                'gateway': 'stripe',
-                'status': 'succeeded',
-                'payment_intent_id': f"pi_{uuid.uuid4().hex[:16]}",
-                'client_secret': f"pi_{uuid.uuid4().hex}_secret_{uuid.uuid4().hex[:8]}"
-            },
-            'completed_at': timezone.now()
-        }
-    elif gateway_name == 'paypal':
-        # Simulate PayPal processing
-        return {
-            'success': True,
-            'response': {
-                'gateway': 'paypal',
-                'status': 'completed',
-                'transaction_id': f"PAY-{uuid.uuid4().hex[:16].upper()}",
-                'payer_id': f"PAYER-{uuid.uuid4().hex[:10].upper()}"
-            },
-            'completed_at': timezone.now()
-        }
-    elif gateway_name == 'paystack':
-        # Simulate Paystack processing
-        return {
-            'success': True,
-            'response': {
-                'gateway': 'paystack',
-                'status': 'success',
-                'reference': f"ref_{uuid.uuid4().hex}",
-                'authorization_url': 'https://checkout.paystack.com/mock'
-            },
-            'completed_at': timezone.now()
-        }
-    elif gateway_name == 'flutterwave':
-        # Simulate Flutterwave processing
-        return {
-            'success': True,
-            'response': {
-                'gateway': 'flutterwave',
-                'status': 'successful',
-                'transaction_id': f"flw_tx_{uuid.uuid4().hex[:12]}",
-                'flw_ref': f"flw_{uuid.uuid4().hex[:10]}"
-            },
-            'completed_at': timezone.now()
-        }
+def record_gateway_error(transaction, error):
+    """Record a gateway failure on the transaction; returns the response body and status"""
+    if isinstance(error, GatewayTimeout):
+        # The gateway may still complete the charge; leave it for reconciliation
+        transaction.status = 'processing'
+        response_status = status.HTTP_504_GATEWAY_TIMEOUT
     else:
-        # Simulate other gateways (mobile money, etc.)
-        return {
-            'success': True,
-            'response': {
-                'gateway': gateway_name,
-                'status': 'successful',
-                'reference': f"REF-{uuid.uuid4().hex[:12].upper()}",
-                'message': f'Payment processed via {gateway_name}'
-            },
-            'completed_at': timezone.now()
-        }
+        transaction.status = 'failed'
+        if isinstance(error, CircuitOpenError):
+            response_status = status.HTTP_503_SERVICE_UNAVAILABLE
+        else:
+            response_status = status.HTTP_502_BAD_GATEWAY
+    transaction.gateway_response = {'error': str(error), **error.response}
+    transaction.save()
+    
+    return {
+        'success': False,
+        'error': 'Payment gateway unavailable' if transaction.status == 'failed' else 'Payment gateway timed out',
+        'details': str(error),
+        'transaction': TransactionSerializer(transaction).data
+    }, response_status
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def request_refund(request):
-    """Request a refund for a transaction"""
+    """Request a refund for a transaction; the gateway call happens on a worker"""
     serializer = RefundRequestSerializer(data=request.data)
     if serializer.is_valid():
-        transaction_id = serializer.validated_data['transaction_id']
-        reason = serializer.validated_data['reason']
-        amount = serializer.validated_data['amount']
-        
-        # Validate transaction belongs to user
         try:
-            transaction = Transaction.objects.get(
-                id=transaction_id, 
+            refund = refunds.request_refund(
+                transaction_id=serializer.validated_data['transaction_id'],
                 user=request.user,
-                status='completed'  # Only completed transactions can be refunded
+                amount=serializer.validated_data['amount'],
+                reason=serializer.validated_data['reason'],
             )
-        except Transaction.DoesNotExist:
-            return Response({'error': 'Transaction not found or not eligible for refund'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Validate refund amount
-        if amount > transaction.amount:
-            return Response({'error': 'Refund amount exceeds transaction amount'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create refund record
-        refund = Refund.objects.create(
-            transaction=transaction,
-            order=transaction.order,
-            user=request.user,
-            reason=reason,
-            requested_amount=amount
-        )
-        
-        # In a real implementation, this would process the refund with the payment gateway
-        # For now, we'll set it to approved for simulation
-        refund.status = 'approved'
-        refund.refunded_amount = amount
-        refund.processed_at = refund.requested_at
-        refund.completed_at = refund.requested_at
-        refund.save()
-        
-        # Update transaction status to refunded if fully refunded
-        if amount >= transaction.amount:
-            transaction.status = 'refunded'
-            transaction.save()
+        except refunds.RefundError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
             'refund': RefundSerializer(refund).data,
-            'message': 'Refund request processed successfully'
-        })
+            'message': 'Refund request queued for processing'
+        }, status=status.HTTP_202_ACCEPTED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_refund(request):
+    """Queue refunds for many transactions at once, e.g. every order of a cancelled flash sale"""
+    serializer = BulkRefundSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    
+    if data.get('flash_sale_id'):
+        try:
+            flash_sale = FlashSale.objects.get(id=data['flash_sale_id'])
+        except FlashSale.DoesNotExist:
+            return Response({'error': 'Flash sale not found'}, status=status.HTTP_404_NOT_FOUND)
+        plans = refunds.flash_sale_refund_plans(flash_sale)
+        notes = f'Bulk refund for cancelled flash sale "{flash_sale.name}" by {request.user.email}'
+    else:
+        plans = [(transaction_id, data.get('amount')) for transaction_id in data['transaction_ids']]
+        notes = f'Bulk refund by {request.user.email}'
+    
+    limit = refunds.get_refund_settings()['BULK_MAX_REFUNDS']
+    if len(plans) > limit:
+        return Response({'error': f'At most {limit} refunds can be queued per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    created, skipped = refunds.bulk_request_refunds(plans, data['reason'], notes)
+    return Response({
+        'success': True,
+        'queued': len(created),
+        'queued_amount': sum((refund.requested_amount for refund in created), Decimal('0')),
+        'skipped': skipped,
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def refund_metrics(request):
+    """Refund throughput, outcomes and backlog per gateway"""
+    return Response(refunds.refund_metrics())
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_payment_stats(request):
@@ -265,4 +232,15 @@ def get_payment_stats(request):
         'pending_payments': transactions.filter(status='pending').count(),
     }
     
-    return Response(stats)
\ No newline at end of file
+    return Response(stats)
+
+
+@csrf_exempt
+@require_POST
+def gateway_webhook(request, gateway_name):
+    """Receive a gateway callback: verify, store and acknowledge; workers apply it later"""
+    try:
+        webhooks.ingest(gateway_name, request.body, request.META)
+    except webhooks.InvalidSignature as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'received': True})
@@ -0,0 +1,407 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from analytics.models import RevenueSnapshot
+from orders.models import Order
+from .models import Transaction, WebhookEvent
+
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED, FAILED, REFUNDED = 'succeeded', 'failed', 'refunded'
+
+
+def get_webhook_settings():
+    config = {
+        'SECRETS': {},
+        'PARTITIONS': 8,
+        'BATCH_SIZE': 500,
+        'SIGNATURE_TOLERANCE': 300,  # seconds; rejects replayed Stripe signatures
+        'DRAIN_DEBOUNCE': 1.0,
+    }
+    config.update(getattr(settings, 'PAYMENT_WEBHOOKS', {}))
+    return config
+
+
+class InvalidSignature(Exception):
+    pass
+
+
+def _hmac_hex(secret, message, digestmod):
+    return hmac.new(secret.encode(), message, digestmod).hexdigest()
+
+
+class WebhookParser:
+    """Signature check and event extraction for one gateway's callbacks
+
+    ``parse`` returns ``(event_id, event_type, reference, outcome)`` where
+    outcome is one of SUCCEEDED, FAILED, REFUNDED or None for events we ignore.
+    ``refunded_amount`` reads how much a REFUNDED event gave back.
+    """
+
+    signature_header = 'HTTP_X_WEBHOOK_SIGNATURE'
+    # True when refund events carry the total refunded so far rather than this refund alone
+    cumulative_refunds = False
+
+    def verify(self, body, headers, secret):
+        signature = headers.get(self.signature_header, '')
+        if not hmac.compare_digest(_hmac_hex(secret, body, hashlib.sha256), signature):
+            raise InvalidSignature('signature mismatch')
+
+    def parse(self, payload):
+        outcome = {
+            'success': SUCCEEDED, 'successful': SUCCEEDED, 'completed': SUCCEEDED,
+            'failed': FAILED, 'refunded': REFUNDED,
+        }.get(str(payload.get('status', '')).lower())
+        return str(payload['id']), payload.get('type', ''), payload.get('reference', ''), outcome
+
+    def refunded_amount(self, payload):
+        """Amount a REFUNDED event gave back, or None when the event does not say"""
+        return _decimal(payload.get('amount'))
+
+
+def _decimal(value, minor_units=False):
+    if value in (None, ''):
+        return None
+    amount = Decimal(str(value))
+    return amount / 100 if minor_units else amount
+
+
+class StripeWebhookParser(WebhookParser):
+    signature_header = 'HTTP_STRIPE_SIGNATURE'
+    cumulative_refunds = True
+    OUTCOMES = {
+        'payment_intent.succeeded': SUCCEEDED,
+        'payment_intent.payment_failed': FAILED,
+        'charge.refunded': REFUNDED,
+    }
+
+    def __init__(self, tolerance=300):
+        self.tolerance = tolerance
+
+    def verify(self, body, headers, secret):
+        parts = defaultdict(list)
+        for item in headers.get(self.signature_header, '').split(','):
+            key, _, value = item.strip().partition('=')
+            parts[key].append(value)
+        try:
+            timestamp = int(parts['t'][0])
+        except (IndexError, ValueError):
+            raise InvalidSignature('missing timestamp')
+        if abs(time.time() - timestamp) > self.tolerance:
+            raise InvalidSignature('timestamp outside tolerance')
+        expected = _hmac_hex(secret, f'{timestamp}.'.encode() + body, hashlib.sha256)
+        if not any(hmac.compare_digest(expected, candidate) for candidate in parts['v1']):
+            raise InvalidSignature('signature mismatch')
+
+    def parse(self, payload):
+        obj = payload.get('data', {}).get('object', {})
+        reference = (obj.get('metadata') or {}).get('reference', '')
+        return payload['id'], payload.get('type', ''), reference, self.OUTCOMES.get(payload.get('type'))
+
+    def refunded_amount(self, payload):
+        # charge.refunded carries the charge, whose amount_refunded covers every refund so far
+        return _decimal(payload.get('data', {}).get('object', {}).get('amount_refunded'), minor_units=True)
+
+
+class PaystackWebhookParser(WebhookParser):
+    signature_header = 'HTTP_X_PAYSTACK_SIGNATURE'
+    OUTCOMES = {'charge.success': SUCCEEDED, 'charge.failed': FAILED, 'refund.processed': REFUNDED}
+
+    def verify(self, body, headers, secret):
+        if not hmac.compare_digest(_hmac_hex(secret, body, hashlib.sha512), headers.get(self.signature_header, '')):
+            raise InvalidSignature('signature mismatch')
+
+    def parse(self, payload):
+        data = payload.get('data', {})
+        event = payload.get('event', '')
+        # Paystack sends no event id; the data id and event name identify a delivery
+        event_id = f"{event}:{data.get('id', data.get('reference', ''))}"
+        reference = data.get('reference', '') if not event.startswith('refund') else data.get('transaction_reference', '')
+        return event_id, event, reference, self.OUTCOMES.get(event)
+
+    def refunded_amount(self, payload):
+        return _decimal(payload.get('data', {}).get('amount'), minor_units=True)
+
+
+class FlutterwaveWebhookParser(WebhookParser):
+    signature_header = 'HTTP_VERIF_HASH'
+
+    def verify(self, body, headers, secret):
+        # Flutterwave echoes a shared secret hash rather than signing the body
+        if not hmac.compare_digest(secret, headers.get(self.signature_header, '')):
+            raise InvalidSignature('signature mismatch')
+
+    def parse(self, payload):
+        data = payload.get('data', {})
+        event = payload.get('event', payload.get('event.type', ''))
+        status = str(data.get('status', '')).lower()
+        if event == 'charge.completed':
+            outcome = SUCCEEDED if status == 'successful' else FAILED if status == 'failed' else None
+        else:
+            outcome = REFUNDED if 'refund' in event.lower() and status in ('completed', 'successful') else None
+        return f"{event}:{data.get('id', '')}", event, data.get('tx_ref', ''), outcome
+
+    def refunded_amount(self, payload):
+        data = payload.get('data', {})
+        return _decimal(data.get('amount_refunded', data.get('amount')))
+
+
+class PayPalWebhookParser(WebhookParser):
+    OUTCOMES = {
+        'PAYMENT.CAPTURE.COMPLETED': SUCCEEDED,
+        'PAYMENT.CAPTURE.DENIED': FAILED,
+        'PAYMENT.CAPTURE.REFUNDED': REFUNDED,
+    }
+
+    def parse(self, payload):
+        resource = payload.get('resource', {})
+        reference = resource.get('custom_id') or resource.get('invoice_id') or ''
+        if not reference and resource.get('purchase_units'):
+            reference = resource['purchase_units'][0].get('reference_id', '')
+        event = payload.get('event_type', '')
+        return payload['id'], event, reference, self.OUTCOMES.get(event)
+
+    def refunded_amount(self, payload):
+        return _decimal((payload.get('resource', {}).get('amount') or {}).get('value'))
+
+
+def get_parser(gateway_name, config):
+    parsers = {
+        'stripe': lambda: StripeWebhookParser(config['SIGNATURE_TOLERANCE']),
+        'paystack': PaystackWebhookParser,
+        'flutterwave': FlutterwaveWebhookParser,
+        'paypal': PayPalWebhookParser,
+    }
+    return parsers.get(gateway_name, WebhookParser)()
+
+
+def partition_for(reference, partitions):
+    return zlib.crc32(reference.encode()) % partitions
+
+
+def ingest(gateway_name, body, headers):
+    """Verify and append one callback with a single insert; duplicates are dropped by the unique key"""
+    config = get_webhook_settings()
+    secret = config['SECRETS'].get(gateway_name)
+    if not secret:
+        raise InvalidSignature(f'no webhook secret configured for {gateway_name}')
+    parser = get_parser(gateway_name, config)
+    parser.verify(body, headers, secret)
+
+    try:
+        payload = json.loads(body)
+        event_id, event_type, reference, _ = parser.parse(payload)
+    except (ValueError, KeyError, AttributeError, TypeError) as exc:
+        raise InvalidSignature(f'unparseable payload: {exc}')
+
+    event = WebhookEvent(
+        gateway=gateway_name,
+        event_id=str(event_id)[:255],
+        event_type=str(event_type)[:100],
+        reference=str(reference)[:100],
+        partition=partition_for(str(reference), config['PARTITIONS']),
+        payload=payload,
+    )
+    WebhookEvent.objects.bulk_create([event], ignore_conflicts=True)
+    schedule_drain(event.partition, config)
+    return event
+
+
+def drain_key(partition):
+    return f'webhooks:drain:{partition}'
+
+
+def schedule_drain(partition, config=None):
+    from .tasks import drain_webhook_events
+
+    config = config or get_webhook_settings()
+    # One queued drain per partition per debounce window, however many events arrive
+    try:
+        scheduled = cache.add(drain_key(partition), 1, config['DRAIN_DEBOUNCE'] + 60)
+    except Exception:
+        scheduled = True
+    if scheduled:
+        drain_webhook_events.apply_async(args=[partition], countdown=config['DRAIN_DEBOUNCE'])
+
+
+PAYMENT_BUCKETS = {'stripe': 'card_payments', 'paypal': 'card_payments', 'paystack': 'card_payments',
+                   'flutterwave': 'card_payments'}
+
+
+def payment_bucket(gateway_name):
+    if gateway_name in PAYMENT_BUCKETS:
+        return PAYMENT_BUCKETS[gateway_name]
+    if 'cash' in gateway_name or 'cod' in gateway_name:
+        return 'cash_on_delivery'
+    if 'momo' in gateway_name or 'mobile' in gateway_name:
+        return 'mobile_money'
+    return 'other_payments'
+
+
+class BatchApplier:
+    """Applies a batch of events to transactions, orders and revenue rollups with bulk writes"""
+
+    def __init__(self):
+        self.transactions = {}
+        self.changed = set()
+        self.order_status = {}
+        self.revenue = defaultdict(lambda: defaultdict(Decimal))  # date -> column -> amount
+        self.order_counts = defaultdict(int)
+
+    def load(self, references):
+        for payment in (
+            Transaction.objects.select_for_update()
+            .select_related('gateway')
+            .filter(reference__in=references)
+        ):
+            self.transactions[payment.reference] = payment
+
+    def apply(self, event, outcome, refunded=None, cumulative=False):
+        """Return the event's final status after applying it
+
+        ``refunded`` is the amount a REFUNDED event reports, the running total
+        when ``cumulative``; None means the event does not say and the whole
+        remaining balance is taken as refunded.
+        """
+        payment = self.transactions.get(event.reference)
+        if payment is None:
+            return 'failed', f'no transaction with reference {event.reference!r}'
+        if outcome is None:
+            return 'ignored', ''
+
+        flags = payment.gateway_data
+        now = timezone.now()
+        if outcome == SUCCEEDED:
+            if payment.status in ('pending', 'processing', 'failed'):
+                payment.status = 'completed'
+                payment.completed_at = payment.completed_at or now
+            if payment.status == 'completed':
+                self.order_status[payment.order_id] = 'paid'
+            if not flags.get('webhook_confirmed'):
+                # Count revenue once per payment, whichever path marked it completed
+                flags['webhook_confirmed'] = event.event_id
+                day = (payment.completed_at or now).date()
+                self.revenue[day]['total_revenue'] += payment.amount
+                self.revenue[day][payment_bucket(payment.gateway.name)] += payment.amount
+                self.order_counts[day] += 1
+        elif outcome == FAILED:
+            if payment.status in ('pending', 'processing'):
+                payment.status = 'failed'
+                self.order_status.setdefault(payment.order_id, 'failed')
+        elif outcome == REFUNDED:
+            # Amount applied per refund event, so replays and redeliveries count once
+            refunds = flags.setdefault('webhook_refunds', {})
+            already = sum((Decimal(amount) for amount in refunds.values()), Decimal('0'))
+            if event.event_id not in refunds:
+                if refunded is None:
+                    amount = payment.amount - already
+                else:
+                    amount = refunded - already if cumulative else refunded
+                amount = min(max(amount, Decimal('0')), payment.amount - already)
+                refunds[event.event_id] = str(amount)
+                already += amount
+                if flags.get('webhook_confirmed') and amount:
+                    day = now.date()
+                    self.revenue[day]['total_revenue'] -= amount
+                    self.revenue[day][payment_bucket(payment.gateway.name)] -= amount
+            # Partial refunds leave the payment completed, as finish_refund does
+            if already >= payment.amount and payment.status == 'completed':
+                payment.status = 'refunded'
+                self.order_status[payment.order_id] = 'refunded'
+
+        payment.gateway_response = {**payment.gateway_response, 'last_webhook': event.event_type}
+        self.changed.add(payment.reference)
+        return 'processed', ''
+
+    def flush(self):
+        if self.changed:
+            Transaction.objects.bulk_update(
+                [self.transactions[ref] for ref in self.changed],
+                ['status', 'completed_at', 'gateway_response', 'gateway_data', 'updated_at'],
+            )
+        by_status = defaultdict(list)
+        for order_id, payment_status in self.order_status.items():
+            by_status[payment_status].append(order_id)
+        now = timezone.now()
+        for payment_status, order_ids in by_status.items():
+            orders = Order.objects.filter(pk__in=order_ids)
+            if payment_status == 'failed':
+                # A late failure for one attempt must not undo a successful retry
+                orders = orders.exclude(payment_status__in=('paid', 'refunded'))
+            orders.update(payment_status=payment_status, updated_at=now)
+        self.flush_rollups()
+
+    def flush_rollups(self):
+        for day, columns in self.revenue.items():
+            RevenueSnapshot.objects.get_or_create(date=day)
+            RevenueSnapshot.objects.filter(date=day).update(
+                total_orders=F('total_orders') + self.order_counts.get(day, 0),
+                **{column: F(column) + amount for column, amount in columns.items()},
+            )
+            RevenueSnapshot.objects.filter(date=day).update(avg_order_value=Case(
+                When(total_orders__gt=0, then=F('total_revenue') / F('total_orders')),
+                default=Decimal('0'),
+            ))
+
+
+def drain_partition(partition, batch_size=None):
+    """Process received events of one partition in id order; returns how many were handled"""
+    config = get_webhook_settings()
+    # Cleared before reading, so any event committed after this point schedules another drain
+    try:
+        cache.delete(drain_key(partition))
+    except Exception:
+        logger.warning('Could not clear webhook drain marker', exc_info=True)
+    batch_size = batch_size or config['BATCH_SIZE']
+    handled = 0
+    while True:
+        with db_transaction.atomic():
+            # Plain row locks (not skip_locked): a concurrent drain of the same partition
+            # waits for this batch, which keeps events of a reference in id order
+            events = list(
+                WebhookEvent.objects.select_for_update()
+                .filter(partition=partition, status='received')
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                return handled
+
+            applier = BatchApplier()
+            applier.load({event.reference for event in events if event.reference})
+            now = timezone.now()
+            for event in events:
+                event.attempts += 1
+                try:
+                    parser = get_parser(event.gateway, config)
+                    _, _, _, outcome = parser.parse(event.payload)
+                    refunded = parser.refunded_amount(event.payload) if outcome == REFUNDED else None
+                    event.status, event.error = applier.apply(event, outcome, refunded, parser.cumulative_refunds)
+                except Exception as exc:
+                    logger.exception('Webhook event %s failed', event.pk)
+                    event.status, event.error = 'failed', str(exc)
+                event.processed_at = now
+            applier.flush()
+            WebhookEvent.objects.bulk_update(events, ['status', 'error', 'attempts', 'processed_at'])
+        handled += len(events)
+        if len(events) < batch_size:
+            return handled
+
+
+def replay(queryset):
+    """Reset stored events so the drain reprocesses them; application is idempotent"""
+    partitions = set(queryset.values_list('partition', flat=True).distinct())
+    count = queryset.update(status='received', error='', processed_at=None)
+    return count, sorted(partitions)
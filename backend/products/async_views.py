@@ -0,0 +1,52 @@
+"""Async views for the products app, served when ``settings.ASYNC_VIEWS`` is on."""
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException
+
+from core.asyncviews import api_response, authenticate
+from .models import Product, ProductView
+from .serializers import ProductSerializer
+from .views import ProductDetailView
+
+
+_sync_product_detail = sync_to_async(ProductDetailView.as_view())
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+async def product_detail(request, pk):
+    """Retrieve a product and record the view; writes go through the DRF view."""
+    if request.method != 'GET':
+        return await _sync_product_detail(request, pk=pk)
+
+    try:
+        user, _ = await authenticate(request)
+    except APIException as exc:
+        return api_response({'detail': str(exc.detail)}, status=exc.status_code)
+    queryset = (
+        Product.objects.filter(is_active=True, is_deleted=False)
+        .select_related('category', 'brand')
+        .prefetch_related('images', 'reviews')
+    )
+    try:
+        product = await queryset.aget(pk=pk)
+    except Product.DoesNotExist:
+        return api_response({'detail': 'Not found.'}, status=404)
+
+    await ProductView.objects.acreate(
+        product=product,
+        user=user if user.is_authenticated else None,
+        session_key=request.session.session_key or '',
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')
+    )
+
+    data = await sync_to_async(lambda: ProductSerializer(product, context={'request': request}).data)()
+    return api_response(data)
+
+
+product_detail.csrf_exempt = True
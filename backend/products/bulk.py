@@ -0,0 +1,345 @@
+"""Bulk product import and export for the products app.
+
+Supplier feeds are read in chunks, rows are cleaned without going through
+a serializer per row, categories and brands are resolved from an in-memory
+lookup and each chunk is upserted by ``sku`` with a single
+``bulk_create(update_conflicts=True)``.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+from .facets import bump_facet_version
+from .models import Brand, Category, Product, percent_off
+from .search import bump_search_generation
+
+
+DECIMAL_FIELDS = ('price', 'discount_price', 'tax_rate', 'weight', 'shipping_cost')
+INTEGER_FIELDS = ('stock_quantity', 'min_stock_level', 'warranty_period')
+BOOLEAN_FIELDS = ('is_active', 'is_featured', 'is_trending', 'is_new')
+TEXT_FIELDS = (
+    'name', 'description', 'short_description', 'barcode', 'dimensions', 'color', 'size', 'material',
+)
+RELATED_FIELDS = ('category', 'brand')
+IMPORT_FIELDS = ('sku',) + TEXT_FIELDS + DECIMAL_FIELDS + INTEGER_FIELDS + BOOLEAN_FIELDS + RELATED_FIELDS
+REQUIRED_FOR_CREATE = ('name', 'category', 'price')
+
+EXPORT_FIELDS = (
+    'sku', 'name', 'slug', 'description', 'short_description', 'barcode', 'category__name', 'brand__name',
+    'price', 'discount_price', 'discount_percent', 'tax_rate', 'stock_quantity', 'min_stock_level',
+    'is_active', 'is_featured', 'is_trending', 'is_new', 'weight', 'dimensions', 'color', 'size',
+    'material', 'warranty_period', 'shipping_cost', 'rating', 'num_reviews', 'updated_at',
+)
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+def iter_csv(stream):
+    for row in csv.DictReader(stream):
+        yield {k.strip(): v for k, v in row.items() if k}
+
+
+def iter_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None  # reported as a row error instead of aborting the stream
+
+
+READERS = {'csv': iter_csv, 'jsonl': iter_jsonl}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RelatedLookup:
+    """Name/slug to instance cache for categories and brands, loaded once per import."""
+
+    def __init__(self, create_brands=True, dry_run=False):
+        self.create_brands = create_brands
+        self.dry_run = dry_run
+        self.categories = {}
+        for category in Category.objects.filter(is_deleted=False).only('id', 'name', 'slug'):
+            self.categories[category.name.lower()] = category
+            self.categories[category.slug] = category
+        self.brands = {brand.name.lower(): brand for brand in Brand.objects.only('id', 'name')}
+
+    def category(self, value):
+        return self.categories.get(str(value).strip().lower())
+
+    def brand(self, value):
+        key = str(value).strip().lower()
+        brand = self.brands.get(key)
+        if brand is None and self.create_brands:
+            if self.dry_run:
+                # Resolve to an unsaved brand so a dry run reports the row without writing anything
+                brand = Brand(name=str(value).strip())
+            else:
+                brand, _ = Brand.objects.get_or_create(name=str(value).strip())
+            self.brands[key] = brand
+        return brand
+
+
+class SlugAllocator:
+    """Hands out unique slugs using the set of slugs already in the table."""
+
+    def __init__(self):
+        self.taken = set(Product.objects.values_list('slug', flat=True).iterator(chunk_size=5000))
+
+    def allocate(self, name):
+        base = slugify(name)[:240] or 'product'
+        slug = base
+        suffix = 2
+        while slug in self.taken:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        self.taken.add(slug)
+        return slug
+
+
+def clean_row(row, lookup):
+    """Convert a raw feed row into model field values, collecting per-field errors."""
+    values = {}
+    errors = {}
+    for field, raw in row.items():
+        if field not in IMPORT_FIELDS:
+            continue
+        value = raw.strip() if isinstance(raw, str) else raw
+        try:
+            if field in DECIMAL_FIELDS:
+                values[field] = None if value in ('', None) else Decimal(str(value))
+                if values[field] is not None and values[field] < 0:
+                    raise ValueError('must not be negative')
+            elif field in INTEGER_FIELDS:
+                values[field] = None if value in ('', None) else int(value)
+                if values[field] is not None and values[field] < 0:
+                    raise ValueError('must not be negative')
+            elif field in BOOLEAN_FIELDS:
+                if isinstance(value, bool):
+                    values[field] = value
+                elif str(value).lower() in TRUE_VALUES:
+                    values[field] = True
+                elif str(value).lower() in FALSE_VALUES:
+                    values[field] = False
+                else:
+                    raise ValueError('expected a boolean')
+            elif field == 'category':
+                values[field] = lookup.category(value)
+                if values[field] is None:
+                    raise ValueError(f"unknown category '{value}'")
+            elif field == 'brand':
+                values[field] = lookup.brand(value) if value else None
+            elif field == 'barcode':
+                values[field] = value or None
+            else:
+                values[field] = '' if value is None else str(value)
+        except (InvalidOperation, ValueError, TypeError) as exc:
+            errors[field] = str(exc) or 'invalid value'
+
+    if not values.get('sku'):
+        errors['sku'] = 'required'
+    for field in ('price', 'tax_rate', 'shipping_cost'):
+        if field in values and values[field] is None:
+            errors[field] = 'required'
+    if values.get('tax_rate') is not None and values['tax_rate'] > 100:
+        errors['tax_rate'] = 'must be between 0 and 100'
+    return values, errors
+
+
+class ProductImporter:
+    """Streams rows from a feed and upserts them by SKU in chunks."""
+
+    def __init__(self, chunk_size=1000, dry_run=False, create_brands=True, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+        self.lookup = RelatedLookup(create_brands=create_brands, dry_run=dry_run)
+        self.slugs = SlugAllocator()
+        self.report = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def run(self, stream, file_format='csv'):
+        rows = READERS[file_format](stream)
+        row_number = 0
+        for chunk in chunked(rows, self.chunk_size):
+            numbered = []
+            for row in chunk:
+                row_number += 1
+                numbered.append((row_number, row))
+            self.import_chunk(numbered)
+        if not self.dry_run and (self.report['created'] or self.report['updated']):
+            # bulk_create and bulk_update send no signals
+            bump_facet_version()
+            bump_search_generation()
+        return self.report
+
+    def add_error(self, row_number, sku, errors):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < self.max_errors:
+            self.report['errors'].append({'row': row_number, 'sku': sku, 'errors': errors})
+
+    def import_chunk(self, numbered_rows):
+        self.report['rows'] += len(numbered_rows)
+        cleaned = []
+        for row_number, row in numbered_rows:
+            if not isinstance(row, dict):
+                self.add_error(row_number, None, {'row': 'invalid JSON object'})
+                continue
+            values, errors = clean_row(row, self.lookup)
+            if errors:
+                self.add_error(row_number, row.get('sku'), errors)
+            else:
+                cleaned.append((row_number, values))
+
+        # Last occurrence of a SKU within a chunk wins
+        by_sku = {values['sku']: (row_number, values) for row_number, values in cleaned}
+        existing = {
+            row['sku']: row
+            for row in Product.objects.filter(sku__in=by_sku).values('sku', 'slug', 'name', 'category_id', 'price', 'discount_price')
+        }
+
+        # Rows are upserted in groups sharing the same columns so absent columns are never overwritten
+        groups = {}
+        for sku, (row_number, values) in by_sku.items():
+            if sku not in existing:
+                missing = [f for f in REQUIRED_FOR_CREATE if values.get(f) in (None, '')]
+                if missing:
+                    self.add_error(row_number, sku, {f: 'required for new products' for f in missing})
+                    continue
+            groups.setdefault(frozenset(values), []).append((row_number, values))
+
+        for columns, group in groups.items():
+            self.upsert(columns, group, existing)
+
+    def build_product(self, values, existing):
+        product = Product(**values)
+        current = existing.get(values['sku'])
+        if current is not None:
+            # The INSERT half of the upsert still has to satisfy NOT NULL columns
+            product.slug = current['slug']
+            if 'name' not in values:
+                product.name = current['name']
+            if 'category' not in values:
+                product.category_id = current['category_id']
+            if 'price' not in values:
+                product.price = current['price']
+            if 'discount_price' not in values:
+                product.discount_price = current['discount_price']
+        else:
+            product.slug = self.slugs.allocate(values['name'])
+        # bulk_create skips Product.save(), so mirror its derived fields here
+        product.discount_percent = percent_off(product.price, product.discount_price)
+        return product
+
+    def update_fields(self, columns):
+        fields = [f for f in columns if f != 'sku']
+        if 'price' in columns or 'discount_price' in columns:
+            fields.append('discount_percent')
+        return fields + ['updated_at']
+
+    def upsert(self, columns, group, existing):
+        products = [self.build_product(values, existing) for _, values in group]
+        update_fields = self.update_fields(columns)
+        created = sum(1 for _, values in group if values['sku'] not in existing)
+
+        if self.dry_run:
+            self.report['created'] += created
+            self.report['updated'] += len(group) - created
+            return
+
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=update_fields,
+                )
+        except IntegrityError:
+            # Another unique column (barcode, slug) clashed; retry row by row to find the culprits
+            self.upsert_rows(group, products, update_fields, existing)
+            return
+
+        self.report['created'] += created
+        self.report['updated'] += len(group) - created
+
+    def upsert_rows(self, group, products, update_fields, existing):
+        for (row_number, values), product in zip(group, products):
+            try:
+                with transaction.atomic():
+                    Product.objects.bulk_create(
+                        [product],
+                        update_conflicts=True,
+                        unique_fields=['sku'],
+                        update_fields=update_fields,
+                    )
+            except IntegrityError as exc:
+                self.add_error(row_number, values['sku'], {'row': str(exc).splitlines()[0]})
+                continue
+            if values['sku'] in existing:
+                self.report['updated'] += 1
+            else:
+                self.report['created'] += 1
+
+
+def export_queryset(queryset=None):
+    queryset = queryset if queryset is not None else Product.objects.filter(is_deleted=False)
+    return queryset.order_by('sku').values_list(*EXPORT_FIELDS).iterator(chunk_size=2000)
+
+
+def _export_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_header():
+    return [f.replace('__name', '') for f in EXPORT_FIELDS]
+
+
+def iter_export_csv(queryset=None):
+    """Yield the catalog as CSV text chunks without loading the table into memory."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_header())
+    for index, row in enumerate(export_queryset(queryset), start=1):
+        writer.writerow([_export_value(v) for v in row])
+        if index % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def iter_export_jsonl(queryset=None):
+    """Yield the catalog as JSON Lines chunks without loading the table into memory."""
+    header = export_header()
+    lines = []
+    for row in export_queryset(queryset):
+        lines.append(json.dumps(dict(zip(header, (_export_value(v) for v in row)))))
+        if len(lines) == 500:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+EXPORTERS = {'csv': iter_export_csv, 'jsonl': iter_export_jsonl}
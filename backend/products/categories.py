@@ -0,0 +1,174 @@
+"""Category tree for the products app.
+
+``Category.parent`` is an adjacency list, so every process keeps the whole
+tree in memory, loaded with one query. Nodes are numbered in pre-order, which
+makes a category's descendants one contiguous slice. Product filters become a
+single ``category_id IN (...)`` lookup on the indexed foreign key, and the
+nested tree payload is rendered once per rebuild. Saving or deleting a
+category bumps a shared version key and every process reloads on its next
+check.
+"""
+import json
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.caching import VersionedProcessCache
+from .models import Category
+
+
+DEFAULTS = {
+    'VERSION_KEY': 'products:categories:version',
+    'CHECK_INTERVAL': 1.0,  # seconds between version checks against the shared cache
+}
+
+
+def get_category_tree_settings():
+    """Return category tree settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'CATEGORY_TREE', {}))
+    return config
+
+
+class CategoryNode:
+    """One visible category with its place in the tree."""
+
+    __slots__ = ('id', 'parent_id', 'name', 'slug', 'description', 'depth', 'children', 'start', 'end')
+
+    def __init__(self, id, parent_id, name, slug, description):
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.slug = slug
+        self.description = description
+        self.depth = 0
+        self.children = []
+        self.start = self.end = 0  # pre-order slice of the subtree, this node included
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'slug': self.slug,
+            'description': self.description,
+            'parent': self.parent_id,
+            'depth': self.depth,
+            'children': [child.as_dict() for child in self.children],
+        }
+
+
+class CategoryTree:
+    """Active categories arranged as a tree, numbered in pre-order.
+
+    Inactive or deleted categories hide their whole subtree, as do
+    categories whose parent chain never reaches a root (broken or cyclic
+    parent links).
+    """
+
+    def __init__(self, rows):
+        nodes = {row[0]: CategoryNode(*row) for row in rows}
+        self.roots = []
+        for node in nodes.values():
+            parent = nodes.get(node.parent_id) if node.parent_id is not None else None
+            if node.parent_id is None:
+                self.roots.append(node)
+            elif parent is not None:
+                parent.children.append(node)
+
+        self.order = []
+        self.nodes = {}
+        self.by_slug = {}
+        stack = [(root, 0) for root in reversed(self.roots)]
+        while stack:
+            node, depth = stack.pop()
+            if node.id in self.nodes:
+                continue
+            node.depth = depth
+            node.start = len(self.order)
+            self.order.append(node.id)
+            self.nodes[node.id] = node
+            self.by_slug[node.slug] = node
+            # Children were appended in name order; reversed so they pop in that order
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+        self._close_ranges()
+        self.payload = json.dumps([root.as_dict() for root in self.roots], cls=DjangoJSONEncoder).encode()
+
+    def _close_ranges(self):
+        # A subtree ends where the next node at the same or a shallower depth starts
+        open_nodes = []
+        for position, node_id in enumerate(self.order):
+            node = self.nodes[node_id]
+            while open_nodes and open_nodes[-1].depth >= node.depth:
+                open_nodes.pop().end = position
+            open_nodes.append(node)
+        for node in open_nodes:
+            node.end = len(self.order)
+
+    @classmethod
+    def load(cls):
+        rows = Category.objects.filter(is_active=True, is_deleted=False).order_by('name').values_list(
+            'id', 'parent_id', 'name', 'slug', 'description'
+        )
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def resolve(self, value):
+        """Find a category node by id or slug."""
+        if isinstance(value, uuid.UUID):
+            return self.nodes.get(value)
+        try:
+            return self.nodes.get(uuid.UUID(str(value)))
+        except ValueError:
+            return self.by_slug.get(value)
+
+    def descendant_ids(self, category_id, include_self=True):
+        """Ids of a category and everything below it, in pre-order."""
+        node = self.nodes.get(category_id)
+        if node is None:
+            return []
+        return self.order[node.start if include_self else node.start + 1:node.end]
+
+    def ancestors(self, category_id):
+        """Nodes from the root down to the category's parent."""
+        chain = []
+        node = self.nodes.get(category_id)
+        while node is not None and node.parent_id is not None:
+            node = self.nodes.get(node.parent_id)
+            if node is not None:
+                chain.append(node)
+        return chain[::-1]
+
+
+class CategoryTreeCache(VersionedProcessCache):
+    """Process-wide CategoryTree, reloaded when the shared version key changes."""
+
+    def __init__(self):
+        super().__init__(
+            CategoryTree.load,
+            lambda: get_category_tree_settings()['VERSION_KEY'],
+            lambda: get_category_tree_settings()['CHECK_INTERVAL'],
+            'Category tree',
+        )
+
+    def tree(self):
+        return self.get()
+
+
+category_tree = CategoryTreeCache()
+
+
+def bump_category_tree_version():
+    """Tell every process to rebuild its category tree."""
+    category_tree.bump()
+
+
+def filter_by_category(queryset, value, field='category_id'):
+    """Restrict products to a category (id or slug) and all of its subcategories."""
+    tree = category_tree.tree()
+    node = tree.resolve(value)
+    if node is None:
+        return queryset.none()
+    return queryset.filter(**{f'{field}__in': tree.descendant_ids(node.id)})
@@ -0,0 +1,193 @@
+"""Facet counts for product listings.
+
+Every facet is counted by its own GROUP BY over the filtered queryset, and
+the per-facet groupings are combined with UNION ALL so all of them come
+back in one round trip. Results are cached per normalized filter signature
+and dropped whenever a product, brand or category changes.
+"""
+import hashlib
+import json
+import logging
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, IntegerField, Value, When
+from django.db.models.functions import Cast
+
+from .categories import category_tree
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'KEY_PREFIX': 'products:facets',
+    'VERSION_KEY': 'products:facets:version',
+    'CACHE_TTL': 300,  # seconds
+    'PRICE_BANDS': [25, 50, 100, 250, 500, 1000],  # upper bounds; the last band is open-ended
+    'RATING_THRESHOLDS': [4, 3, 2, 1],  # "N stars and up"
+    'MAX_VALUES': 50,  # per attribute facet, most common first
+    'IGNORED_PARAMS': ['page', 'page_size', 'ordering', 'facets'],  # do not change the result set
+}
+
+ATTRIBUTE_FACETS = ('color', 'size', 'material')
+
+
+def get_facet_settings():
+    """Return facet settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PRODUCT_FACETS', {}))
+    return config
+
+
+def band_case(field, bounds):
+    """Index of the band a value falls in, computed by the database."""
+    return Case(
+        *[When(**{f'{field}__lt': bound}, then=Value(i)) for i, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+
+
+def facet_groups(queryset, name, value, label=None):
+    """(facet, value, label, count) rows of one facet, grouped by the database."""
+    return queryset.annotate(
+        facet_name=Value(name, output_field=CharField()),
+        facet_value=Cast(value, CharField()),
+        facet_label=label if label is not None else Value(None, output_field=CharField()),
+    ).values('facet_name', 'facet_value', 'facet_label').annotate(count=Count('id'))
+
+
+def group_counts(queryset, config):
+    """Product counts per value of every facet, from one UNION ALL of per-facet groupings."""
+    queryset = queryset.order_by().prefetch_related(None)
+    groupings = [
+        facet_groups(queryset, 'category', F('category_id')),
+        facet_groups(queryset, 'brand', F('brand_id'), F('brand__name')),
+        facet_groups(queryset, 'price', band_case('price', config['PRICE_BANDS'])),
+        facet_groups(queryset, 'rating', band_case('rating', [1, 2, 3, 4, 5])),
+        *[facet_groups(queryset, name, F(name)) for name in ATTRIBUTE_FACETS],
+    ]
+    return list(groupings[0].union(*groupings[1:], all=True))
+
+
+def build_facets(groups, config):
+    counts = {name: Counter() for name in ('category', 'brand', 'price', 'rating', *ATTRIBUTE_FACETS)}
+    brand_names = {}
+    for group in groups:
+        name, value = group['facet_name'], group['facet_value']
+        if value is None or value == '':
+            continue
+        if name in ('category', 'brand'):
+            value = uuid.UUID(value)
+            if name == 'brand':
+                brand_names[value] = group['facet_label']
+        elif name in ('price', 'rating'):
+            value = int(value)
+        counts[name][value] += group['count']
+
+    brands = counts['brand']
+    ratings = counts['rating']
+    facets = {
+        # Every product falls in exactly one price band
+        'total': sum(counts['price'].values()),
+        'category': category_facet(counts['category']),
+        'brand': [
+            {'id': brand_id, 'name': brand_names[brand_id], 'count': count}
+            for brand_id, count in sorted(brands.items(), key=lambda item: (-item[1], brand_names[item[0]]))
+        ],
+        'price': price_facet(counts['price'], config['PRICE_BANDS']),
+        'rating': [
+            {'min_rating': threshold, 'count': sum(n for floor, n in ratings.items() if floor >= threshold)}
+            for threshold in config['RATING_THRESHOLDS']
+        ],
+    }
+    for name in ATTRIBUTE_FACETS:
+        facets[name] = [
+            {'value': value, 'count': count} for value, count in counts[name].most_common(config['MAX_VALUES'])
+        ]
+    return facets
+
+
+def category_facet(counts):
+    """Counts per category, each including its subcategories, in tree order."""
+    tree = category_tree.tree()
+    rolled_up = Counter()
+    for category_id, count in counts.items():
+        if category_id not in tree.nodes:
+            continue
+        rolled_up[category_id] += count
+        for ancestor in tree.ancestors(category_id):
+            rolled_up[ancestor.id] += count
+    return [
+        {
+            'id': category_id,
+            'name': tree.nodes[category_id].name,
+            'slug': tree.nodes[category_id].slug,
+            'parent': tree.nodes[category_id].parent_id,
+            'depth': tree.nodes[category_id].depth,
+            'count': rolled_up[category_id],
+        }
+        for category_id in tree.order
+        if rolled_up[category_id]
+    ]
+
+
+def price_facet(counts, bounds):
+    lower = [0, *bounds]
+    upper = [*bounds, None]
+    return [
+        {'min_price': lower[band], 'max_price': upper[band], 'count': counts[band]}
+        for band in range(len(lower))
+        if counts[band]
+    ]
+
+
+def filter_signature(params, config):
+    """Stable digest of the query parameters that affect the result set."""
+    normalized = {}
+    for key in sorted(params.keys()):
+        if key in config['IGNORED_PARAMS']:
+            continue
+        values = sorted(value.strip() for value in params.getlist(key) if value.strip())
+        if key == 'search':
+            values = [' '.join(value.lower().split()) for value in values]
+        if values:
+            normalized[key] = values
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def facet_version(config):
+    try:
+        version = cache.get(config['VERSION_KEY'])
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(config['VERSION_KEY'], version, None)
+            version = cache.get(config['VERSION_KEY'], version)
+        return version
+    except Exception:
+        logger.warning('Facet cache version unavailable', exc_info=True)
+        return None
+
+
+def bump_facet_version():
+    """Drop every cached facet result."""
+    try:
+        cache.set(get_facet_settings()['VERSION_KEY'], uuid.uuid4().hex, None)
+    except Exception:
+        logger.warning('Could not publish facet cache version', exc_info=True)
+
+
+def facet_counts(queryset, params):
+    """Facet counts for a filtered product queryset, cached per filter signature."""
+    config = get_facet_settings()
+    version = facet_version(config)
+    if version is None:
+        return build_facets(group_counts(queryset, config), config)
+    key = f"{config['KEY_PREFIX']}:{version}:{filter_signature(params, config)}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = build_facets(group_counts(queryset, config), config)
+        cache.set(key, facets, config['CACHE_TTL'])
+    return facets
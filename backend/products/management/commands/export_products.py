@@ -0,0 +1,24 @@
+"""Export the product catalog."""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.bulk import EXPORTERS
+
+
+class Command(BaseCommand):
+    help = 'Stream the product catalog to a CSV or JSON Lines file without loading it into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORTERS), default='csv')
+        parser.add_argument('--output', help='defaults to stdout')
+
+    def handle(self, *args, **options):
+        chunks = EXPORTERS[options['format']]()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,43 @@
+"""Import products from a supplier feed."""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import READERS, ProductImporter
+
+
+class Command(BaseCommand):
+    help = 'Upsert products by SKU from a CSV or JSON Lines file, streaming it in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="feed file, or '-' for stdin")
+        parser.add_argument('--format', choices=sorted(READERS), help='defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='validate and report without writing')
+        parser.add_argument('--no-create-brands', action='store_true', help='treat unknown brands as errors')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        importer = ProductImporter(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            create_brands=not options['no_create_brands'],
+        )
+
+        if path == '-':
+            report = importer.run(sys.stdin, file_format)
+        else:
+            try:
+                with open(path, encoding='utf-8-sig', newline='') as stream:
+                    report = importer.run(stream, file_format)
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        self.stdout.write(json.dumps(report, indent=2))
+        style = self.style.SUCCESS if not report['failed'] else self.style.WARNING
+        self.stderr.write(style(
+            f"{report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed"
+        ))
@@ -4,9 +4,17 @@ from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from accounts.models import User
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 
 
+def percent_off(price, reduced):
+    """Percentage ``reduced`` is below ``price``, to two decimal places."""
+    if not price or reduced is None or reduced >= price:
+        return Decimal('0.00')
+    return ((price - reduced) / price * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
 class Category(models.Model):
     """Product category model."""
     
@@ -112,19 +120,22 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        if self.discount_price and self.price:
-            self.discount_percent = ((self.price - self.discount_price) / self.price) * 100
+        self.discount_percent = percent_off(self.price, self.discount_price)
         super().save(*args, **kwargs)
     
     def __str__(self):
         return self.name
     
+    @property
+    def price_quote(self):
+        """Effective price from the promotions pricing engine, including live flash sales."""
+        from promotions.pricing import quote_product
+        return quote_product(self)
+    
     @property
     def final_price(self):
-        """Return the final price after discount."""
-        if self.discount_price:
-            return self.discount_price
-        return self.price
+        """Return the final price after discount and any live flash sale."""
+        return self.price_quote.unit_price
     
     @property
     def is_in_stock(self):
@@ -138,10 +149,8 @@ class Product(models.Model):
     
     @property
     def discount_percentage(self):
-        """Calculate discount percentage."""
-        if self.price and self.discount_price:
-            return ((self.price - self.discount_price) / self.price) * 100
-        return 0
+        """Calculate discount percentage off the list price."""
+        return self.price_quote.discount_percentage
 
 
 class ProductImage(models.Model):
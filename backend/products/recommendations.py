@@ -0,0 +1,218 @@
+"""Item-to-item recommendations from purchases and product views.
+
+A batch job (``products.tasks.build_product_recommendations``) builds two
+sparse basket-by-product matrices: orders by the products in them, and
+visitor-days (a user or session on one day) by the products viewed.
+Multiplying each by its transpose gives item-item co-occurrence counts,
+which are scored by cosine similarity damped for pairs seen only a few
+times. The top neighbours of every product, and the most purchased
+products overall, are written to the shared cache, so serving
+"frequently bought together" or "customers also viewed" is a single cache
+lookup followed by one query for the products themselves.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from scipy import sparse
+
+from orders.models import OrderItem
+from .models import ProductView
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'KEY_PREFIX': 'products:recommendations',
+    'TOP_K': 20,  # neighbours stored per product
+    'POPULAR_SIZE': 50,  # most purchased products stored for the frequently-purchased list
+    'PURCHASE_WINDOW_DAYS': 365,
+    'VIEW_WINDOW_DAYS': 90,
+    'EXCLUDED_ORDER_STATUSES': ['cancelled', 'refunded'],
+    'MIN_COPURCHASES': 1,
+    'MIN_COVIEWS': 2,
+    'SHRINKAGE': 5.0,  # a pair seen n times keeps n / (n + SHRINKAGE) of its cosine score
+    'MAX_BASKET_SIZE': 50,  # larger orders and visitor-days are bulk buys or crawlers, not affinity
+    'REBUILD_LOCK_TTL': 600,  # seconds between rebuilds triggered by a request finding nothing built
+}
+
+BOUGHT_TOGETHER = 'bought_together'
+ALSO_VIEWED = 'also_viewed'
+KINDS = (BOUGHT_TOGETHER, ALSO_VIEWED)
+
+
+def get_recommendation_settings():
+    """Return recommendation settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PRODUCT_RECOMMENDATIONS', {}))
+    return config
+
+
+def neighbours_key(config, kind, product_id):
+    return f"{config['KEY_PREFIX']}:{kind}:{product_id}"
+
+
+def members_key(config, kind):
+    return f"{config['KEY_PREFIX']}:{kind}:products"
+
+
+def popular_key(config):
+    return f"{config['KEY_PREFIX']}:popular"
+
+
+def basket_matrix(pairs, max_basket_size):
+    """Binary baskets-by-products CSR matrix from (basket, product id) pairs, and its product ids."""
+    baskets = {}
+    products = {}
+    rows = []
+    columns = []
+    for basket, product_id in pairs:
+        rows.append(baskets.setdefault(basket, len(baskets)))
+        columns.append(products.setdefault(product_id, len(products)))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))),
+        shape=(len(baskets), len(products)),
+    )
+    # The same product twice in one basket counts once
+    matrix.data[:] = 1
+    sizes = np.diff(matrix.indptr)
+    if len(sizes) and sizes.max() > max_basket_size:
+        matrix = matrix[sizes <= max_basket_size]
+    return matrix, list(products)
+
+
+def purchase_pairs(config, now):
+    since = now - timedelta(days=config['PURCHASE_WINDOW_DAYS'])
+    return (
+        OrderItem.objects.filter(order__created_at__gte=since)
+        .exclude(order__status__in=config['EXCLUDED_ORDER_STATUSES'])
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=10000)
+    )
+
+
+def view_pairs(config, now):
+    since = now - timedelta(days=config['VIEW_WINDOW_DAYS'])
+    rows = (
+        ProductView.objects.filter(timestamp__gte=since)
+        .annotate(day=TruncDate('timestamp'))
+        .values_list('user_id', 'session_key', 'day', 'product_id')
+        .iterator(chunk_size=10000)
+    )
+    for user_id, session_key, day, product_id in rows:
+        if user_id is not None:
+            yield ('user', user_id, day), product_id
+        elif session_key:
+            yield ('session', session_key, day), product_id
+
+
+def cooccurrence(matrix):
+    """Item-item co-occurrence counts (diagonal removed) and per-item basket counts."""
+    counts = (matrix.T @ matrix).tocsr()
+    totals = counts.diagonal()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    return counts, totals
+
+
+def top_neighbours(counts, totals, product_ids, config, min_count):
+    """Best-scoring neighbours of every product that has any, as product id lists."""
+    counts = counts.copy()
+    counts.data[counts.data < min_count] = 0
+    counts.eliminate_zeros()
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    together = counts.data.astype(np.float64)
+    scores = together / np.sqrt(totals[rows].astype(np.float64) * totals[counts.indices])
+    scores *= together / (together + config['SHRINKAGE'])
+
+    k = config['TOP_K']
+    neighbours = {}
+    for row in np.flatnonzero(np.diff(counts.indptr)):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        row_scores = scores[start:end]
+        if end - start > k:
+            candidates = np.argpartition(-row_scores, k - 1)[:k]
+        else:
+            candidates = np.arange(end - start)
+        # Highest score first, more co-occurrences breaking ties
+        order = candidates[np.lexsort((-together[start:end][candidates], -row_scores[candidates]))]
+        neighbours[product_ids[row]] = [product_ids[column] for column in counts.indices[start + order].tolist()]
+    return neighbours
+
+
+def build_recommendations(config=None, now=None):
+    """Neighbour lists per kind and the most purchased products, computed from the database."""
+    config = config or get_recommendation_settings()
+    now = now or timezone.now()
+    purchases, purchased_ids = basket_matrix(purchase_pairs(config, now), config['MAX_BASKET_SIZE'])
+    views, viewed_ids = basket_matrix(view_pairs(config, now), config['MAX_BASKET_SIZE'])
+
+    bought, purchase_totals = cooccurrence(purchases)
+    viewed, view_totals = cooccurrence(views)
+    popular = np.argsort(-purchase_totals, kind='stable')[:config['POPULAR_SIZE']]
+    return {
+        BOUGHT_TOGETHER: top_neighbours(bought, purchase_totals, purchased_ids, config, config['MIN_COPURCHASES']),
+        ALSO_VIEWED: top_neighbours(viewed, view_totals, viewed_ids, config, config['MIN_COVIEWS']),
+        'popular': [purchased_ids[i] for i in popular.tolist() if purchase_totals[i]],
+    }
+
+
+def store_recommendations(recommendations, config=None):
+    """Publish freshly built recommendations, dropping products that no longer have any."""
+    config = config or get_recommendation_settings()
+    for kind in KINDS:
+        neighbours = recommendations[kind]
+        previous = cache.get(members_key(config, kind)) or []
+        stale = [neighbours_key(config, kind, product_id) for product_id in previous if product_id not in neighbours]
+        items = list(neighbours.items())
+        for start in range(0, len(items), 1000):
+            cache.set_many({
+                neighbours_key(config, kind, product_id): [str(neighbour) for neighbour in ids]
+                for product_id, ids in items[start:start + 1000]
+            }, None)
+        if stale:
+            cache.delete_many(stale)
+        cache.set(members_key(config, kind), list(neighbours), None)
+    cache.set(popular_key(config), [str(product_id) for product_id in recommendations['popular']], None)
+
+
+def rebuild_recommendations():
+    config = get_recommendation_settings()
+    recommendations = build_recommendations(config)
+    store_recommendations(recommendations, config)
+    return {kind: len(recommendations[kind]) for kind in KINDS}
+
+
+def neighbours(product_id, kind):
+    """Stored neighbour ids of a product, best first."""
+    try:
+        return cache.get(neighbours_key(get_recommendation_settings(), kind, product_id)) or []
+    except Exception:
+        logger.warning('Product recommendations unavailable', exc_info=True)
+        return []
+
+
+def popular_products():
+    """Most purchased product ids, or None until the first build has been published."""
+    config = get_recommendation_settings()
+    try:
+        return cache.get(popular_key(config))
+    except Exception:
+        logger.warning('Product recommendations unavailable', exc_info=True)
+        return []
+
+
+def request_rebuild():
+    """Queue a rebuild unless one was queued recently."""
+    config = get_recommendation_settings()
+    try:
+        if not cache.add(f"{config['KEY_PREFIX']}:rebuild-lock", 1, config['REBUILD_LOCK_TTL']):
+            return
+    except Exception:
+        return
+    from .tasks import build_product_recommendations
+    build_product_recommendations.delay()
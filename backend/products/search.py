@@ -0,0 +1,576 @@
+"""In-process full-text search over the product catalog.
+
+The catalog fits in memory, so every process can answer searches from an
+inverted index instead of ``ILIKE`` scans. Products are tokenized from their
+name, short description, SKU, brand and category (each field weighted), and
+ranked with BM25. The last query token can be matched as a prefix for
+search-as-you-type.
+
+The bulk of the index is a compact segment: a sorted vocabulary and, per
+term, a slice of one ``uint32`` array of document numbers with a parallel
+``float32`` array of weighted term frequencies. The segment can be saved to
+a single file and memory-mapped, so new workers start from the snapshot
+without querying the database and share its pages with their siblings.
+
+Product changes are recorded in a shared change log (a sequence counter and
+one cache key per change). Each process replays new entries into a small
+pending segment layered over the compact one, and rebuilds from the
+database when the log has a gap, grows too long, or the shared generation
+key is bumped (bulk imports, brand or category changes).
+"""
+import bisect
+import heapq
+import itertools
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import filters
+
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SNAPSHOT_PATH': None,  # file the compact segment is saved to and mapped from; None keeps it in memory
+    'GENERATION_KEY': 'products:search:generation',
+    'SEQUENCE_KEY': 'products:search:sequence',
+    'CHANGE_KEY_PREFIX': 'products:search:change',
+    'CHANGE_TTL': 86400,  # seconds a change log entry is kept for lagging processes
+    'CHECK_INTERVAL': 1.0,  # seconds between checks of the shared generation and sequence
+    'MAX_CATCH_UP': 500,  # more unseen changes than this and the index is rebuilt instead
+    'COMPACT_AFTER': 2000,  # documents in the pending segment before the index is rebuilt
+    'FIELD_WEIGHTS': {'name': 3.0, 'sku': 2.0, 'brand': 2.0, 'category': 1.5, 'short_description': 1.0},
+    'K1': 1.2,
+    'B': 0.75,
+    'MIN_PREFIX_LENGTH': 2,
+    'PREFIX_EXPANSIONS': 50,  # most frequent completions of a prefix token that are searched
+    'MAX_RESULTS': 1000,
+}
+
+# Index field -> Product value it is read from
+FIELD_SOURCES = {
+    'name': 'name',
+    'short_description': 'short_description',
+    'sku': 'sku',
+    'brand': 'brand__name',
+    'category': 'category__name',
+}
+# Saving a product with update_fields outside these leaves its document unchanged
+INDEXED_FIELDS = frozenset({'name', 'short_description', 'sku', 'brand', 'category', 'is_deleted'})
+
+TOKEN_RE = re.compile(r'\w+')
+MAGIC = b'PSRCH001'
+ALIGNMENT = 8
+
+
+def get_search_settings():
+    """Return product search settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PRODUCT_SEARCH', {}))
+    return config
+
+
+def tokenize(text):
+    """Lowercased word tokens of a piece of text."""
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def document_terms(row, weights):
+    """Weighted term frequencies of one product row."""
+    terms = {}
+    for field, source in FIELD_SOURCES.items():
+        weight = weights.get(field, 0)
+        if weight:
+            for token in tokenize(row[source]):
+                terms[token] = terms.get(token, 0.0) + weight
+    return terms
+
+
+def indexed_products(ids=None):
+    """Rows for every searchable product (or the given ones), newest first."""
+    queryset = Product.objects.filter(is_deleted=False)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset.order_by('-created_at').values('id', *FIELD_SOURCES.values()).iterator(chunk_size=2000)
+
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class CompactSegment:
+    """Immutable postings in flat arrays, optionally backed by a mapped file.
+
+    Document ``n`` is the product whose UUID is ``doc_ids[16 * n:16 * n + 16]``;
+    term ``terms[i]`` occurs in ``postings[offsets[i]:offsets[i + 1]]`` with the
+    matching ``frequencies``.
+    """
+
+    def __init__(self, terms, offsets, postings, frequencies, lengths, doc_ids, generation, sequence,
+                 built_at, buffer=None):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.doc_ids = doc_ids
+        self.generation = generation
+        self.sequence = sequence
+        self.built_at = built_at
+        self._buffer = buffer  # keeps the mapping open for as long as the arrays are in use
+        self._numbers = None
+
+    @classmethod
+    def build(cls, rows, weights, generation=None, sequence=0):
+        doc_ids = bytearray()
+        lengths = []
+        by_term = {}
+        for number, row in enumerate(rows):
+            terms = document_terms(row, weights)
+            doc_ids += row['id'].bytes
+            lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                entry = by_term.get(term)
+                if entry is None:
+                    entry = by_term[term] = ([], [])
+                entry[0].append(number)
+                entry[1].append(frequency)
+
+        terms = sorted(by_term)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(by_term[term][0]) for term in terms], out=offsets[1:])
+        size = int(offsets[-1])
+        postings = np.fromiter(
+            itertools.chain.from_iterable(by_term[term][0] for term in terms), dtype=np.uint32, count=size
+        )
+        frequencies = np.fromiter(
+            itertools.chain.from_iterable(by_term[term][1] for term in terms), dtype=np.float32, count=size
+        )
+        return cls(
+            terms, offsets, postings, frequencies, np.array(lengths, dtype=np.float32),
+            np.frombuffer(bytes(doc_ids), dtype=np.uint8), generation, sequence, timezone.now().isoformat(),
+        )
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def doc_id(self, number):
+        return uuid.UUID(bytes=self.doc_ids[16 * number:16 * number + 16].tobytes())
+
+    def numbers(self):
+        """Product id -> document number, built on first use."""
+        if self._numbers is None:
+            self._numbers = {self.doc_id(number): number for number in range(len(self))}
+        return self._numbers
+
+    def term_postings(self, term):
+        i = self.term_ids.get(term)
+        if i is None:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.postings[start:end], self.frequencies[start:end]
+
+    def completions(self, prefix):
+        """Terms starting with ``prefix`` and their document frequencies."""
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + '\U0010ffff', start)
+        return [(term, int(self.offsets[i + 1] - self.offsets[i])) for i, term in
+                zip(range(start, end), self.terms[start:end])]
+
+    def save(self, path):
+        """Write the segment to ``path`` atomically."""
+        arrays = {
+            'offsets': self.offsets,
+            'postings': self.postings,
+            'frequencies': self.frequencies,
+            'lengths': self.lengths,
+            'doc_ids': self.doc_ids,
+            'vocabulary': np.frombuffer('\n'.join(self.terms).encode(), dtype=np.uint8),
+        }
+        layout = {}
+        position = 0
+        for name, array in arrays.items():
+            layout[name] = [array.dtype.str, len(array), position]
+            position = aligned(position + array.nbytes)
+        header = json.dumps({
+            'generation': self.generation,
+            'sequence': self.sequence,
+            'built_at': self.built_at,
+            'arrays': layout,
+        }).encode()
+        data_start = aligned(len(MAGIC) + 8 + len(header))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+            for name, array in arrays.items():
+                handle.seek(data_start + layout[name][2])
+                handle.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temporary, path)
+
+    @classmethod
+    def open(cls, path):
+        """Map a saved segment; the arrays are views over the file, not copies."""
+        with open(path, 'rb') as handle:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a product search snapshot')
+        header_length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], 'little')
+        header_start = len(MAGIC) + 8
+        header = json.loads(buffer[header_start:header_start + header_length])
+        data_start = aligned(header_start + header_length)
+        arrays = {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=data_start + position)
+            for name, (dtype, count, position) in header['arrays'].items()
+        }
+        vocabulary = arrays['vocabulary'].tobytes().decode()
+        return cls(
+            vocabulary.split('\n') if vocabulary else [], arrays['offsets'], arrays['postings'],
+            arrays['frequencies'], arrays['lengths'], arrays['doc_ids'], header['generation'],
+            header['sequence'], header['built_at'], buffer,
+        )
+
+
+class PendingSegment:
+    """Documents added or replaced since the compact segment was built.
+
+    Numbered after the compact documents. Never modified in place: applying
+    changes returns a new segment, so searches running concurrently keep a
+    consistent view.
+    """
+
+    def __init__(self, base_count, doc_ids=(), lengths=(), postings=None, numbers=None, removed=frozenset()):
+        self.base_count = base_count
+        self.doc_ids = list(doc_ids)
+        self.lengths = list(lengths)
+        self.postings = postings or {}  # term -> {document number: frequency}
+        self.numbers = numbers or {}  # product id -> document number, pending documents only
+        self.removed = removed  # replaced or deleted document numbers, compact or pending
+        self.terms = sorted(self.postings)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def apply(self, base, product_ids, rows, weights):
+        doc_ids = list(self.doc_ids)
+        lengths = list(self.lengths)
+        postings = {term: dict(entries) for term, entries in self.postings.items()}
+        numbers = dict(self.numbers)
+        removed = set(self.removed)
+        base_numbers = base.numbers()
+        for product_id in product_ids:
+            for previous in (base_numbers.get(product_id), numbers.pop(product_id, None)):
+                if previous is not None:
+                    removed.add(previous)
+        for row in rows:
+            number = self.base_count + len(doc_ids)
+            terms = document_terms(row, weights)
+            doc_ids.append(row['id'])
+            lengths.append(sum(terms.values()))
+            numbers[row['id']] = number
+            for term, frequency in terms.items():
+                postings.setdefault(term, {})[number] = frequency
+        return PendingSegment(self.base_count, doc_ids, lengths, postings, numbers, frozenset(removed))
+
+    def term_postings(self, term):
+        entries = self.postings.get(term)
+        if not entries:
+            return None
+        return (np.fromiter(entries.keys(), dtype=np.uint32, count=len(entries)),
+                np.fromiter(entries.values(), dtype=np.float32, count=len(entries)))
+
+    def completions(self, prefix):
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + '\U0010ffff', start)
+        return [(term, len(self.postings[term])) for term in self.terms[start:end]]
+
+
+class SearchIndex:
+    """A compact segment, the pending changes over it and their BM25 statistics."""
+
+    def __init__(self, base, pending=None, sequence=None, config=None):
+        config = config or get_search_settings()
+        self.base = base
+        self.pending = pending if pending is not None else PendingSegment(len(base))
+        self.generation = base.generation
+        self.sequence = base.sequence if sequence is None else sequence
+        self.k1 = config['K1']
+        self.min_prefix_length = config['MIN_PREFIX_LENGTH']
+        self.prefix_expansions = config['PREFIX_EXPANSIONS']
+
+        lengths = base.lengths
+        if len(self.pending):
+            lengths = np.concatenate([lengths, np.array(self.pending.lengths, dtype=np.float32)])
+        self.live = np.ones(len(lengths), dtype=bool)
+        if self.pending.removed:
+            self.live[list(self.pending.removed)] = False
+        self.count = int(self.live.sum())
+        average = float(lengths[self.live].mean()) if self.count else 1.0
+        # The length part of the BM25 denominator, per document
+        self.norms = (self.k1 * (1 - config['B'] + config['B'] * lengths / (average or 1.0))).astype(np.float32)
+
+    def __len__(self):
+        return self.count
+
+    def apply(self, product_ids, rows, sequence, config):
+        pending = self.pending.apply(self.base, product_ids, rows, config['FIELD_WEIGHTS'])
+        return SearchIndex(self.base, pending, sequence, config)
+
+    def doc_id(self, number):
+        if number < len(self.base):
+            return self.base.doc_id(number)
+        return self.pending.doc_ids[number - len(self.base)]
+
+    def term_postings(self, term):
+        found = [p for p in (self.base.term_postings(term), self.pending.term_postings(term)) if p is not None]
+        if len(found) < 2:
+            return found[0] if found else None
+        return np.concatenate([found[0][0], found[1][0]]), np.concatenate([found[0][1], found[1][1]])
+
+    def expand(self, token, prefix):
+        """Terms a query token matches: itself, plus its most frequent completions for a prefix."""
+        if not prefix or len(token) < self.min_prefix_length:
+            return [token]
+        frequencies = {}
+        for segment in (self.base, self.pending):
+            for term, count in segment.completions(token):
+                frequencies[term] = frequencies.get(term, 0) + count
+        frequencies.pop(token, None)
+        return [token] + heapq.nlargest(self.prefix_expansions, frequencies, key=frequencies.get)
+
+    def search(self, query, limit=None, prefix=False):
+        """Ranked (product id, score) pairs for products matching every query token.
+
+        With ``prefix`` the last token also matches terms it is the start of.
+        """
+        tokens = tokenize(query)
+        if not tokens or not self.count:
+            return []
+        size = len(self.live)
+        scores = np.zeros(size, dtype=np.float32)
+        matched = np.zeros(size, dtype=np.int32)
+        for position, token in enumerate(tokens):
+            hit = np.zeros(size, dtype=bool)
+            for term in self.expand(token, prefix and position == len(tokens) - 1):
+                found = self.term_postings(term)
+                if found is None:
+                    continue
+                documents, frequencies = found
+                frequency = len(documents)
+                idf = math.log(1 + (self.count - frequency + 0.5) / (frequency + 0.5))
+                # A term lists each document once, so fancy-index addition is safe
+                scores[documents] += idf * frequencies * (self.k1 + 1) / (frequencies + self.norms[documents])
+                hit[documents] = True
+            matched += hit
+        candidates = np.flatnonzero((matched == len(tokens)) & self.live)
+        if limit is not None and len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Best score first; ties keep document order, i.e. newest product first
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.doc_id(int(number)), float(scores[number])) for number in candidates]
+
+
+def build_index(config, generation=None, sequence=0):
+    """Index every searchable product from the database."""
+    base = CompactSegment.build(indexed_products(), config['FIELD_WEIGHTS'], generation, sequence)
+    return SearchIndex(base, config=config)
+
+
+def change_key(config, sequence):
+    return f"{config['CHANGE_KEY_PREFIX']}:{sequence}"
+
+
+def shared_state(config):
+    """The shared (generation, sequence) every process's index is compared with."""
+    cache.add(config['GENERATION_KEY'], uuid.uuid4().hex, None)
+    state = cache.get_many([config['GENERATION_KEY'], config['SEQUENCE_KEY']])
+    return state.get(config['GENERATION_KEY']), state.get(config['SEQUENCE_KEY'], 0)
+
+
+class SearchEngine:
+    """Process-wide SearchIndex kept in step with the shared generation and change log."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._next_check = 0.0
+        self._gap = None
+
+    def is_fresh(self):
+        return self._index is not None and time.monotonic() < self._next_check
+
+    def index(self):
+        if self.is_fresh():
+            return self._index
+        with self._lock:
+            if not self.is_fresh():
+                config = get_search_settings()
+                self._sync(config)
+                self._next_check = time.monotonic() + config['CHECK_INTERVAL']
+            return self._index
+
+    def invalidate(self):
+        self._next_check = 0.0
+
+    def _shared_state(self, config):
+        try:
+            return shared_state(config)
+        except Exception:
+            logger.warning('Product search index version check failed', exc_info=True)
+            if self._index is not None:
+                return self._index.generation, self._index.sequence
+            return None, 0
+
+    def _sync(self, config):
+        generation, sequence = self._shared_state(config)
+        if self._index is None or self._index.generation != generation:
+            self._index = self._load(config, generation, sequence)
+        if sequence > self._index.sequence:
+            self._catch_up(config, sequence)
+
+    def _load(self, config, generation, sequence):
+        path = config['SNAPSHOT_PATH']
+        if path and os.path.exists(path):
+            try:
+                base = CompactSegment.open(path)
+            except (OSError, ValueError):
+                logger.warning('Product search snapshot %s unreadable, rebuilding', path, exc_info=True)
+            else:
+                if base.generation == generation and base.sequence <= sequence:
+                    return SearchIndex(base, config=config)
+        return self._rebuild(config, generation, sequence)
+
+    def _rebuild(self, config, generation, sequence):
+        # Changes logged while the rows are read are replayed afterwards; replaying is idempotent
+        index = build_index(config, generation, sequence)
+        self._gap = None
+        if config['SNAPSHOT_PATH']:
+            try:
+                index.base.save(config['SNAPSHOT_PATH'])
+            except OSError:
+                logger.warning('Could not save the product search snapshot', exc_info=True)
+        return index
+
+    def _catch_up(self, config, sequence):
+        index = self._index
+        if sequence - index.sequence > config['MAX_CATCH_UP']:
+            self._index = self._rebuild(config, index.generation, sequence)
+            return
+        keys = [change_key(config, n) for n in range(index.sequence + 1, sequence + 1)]
+        try:
+            logged = cache.get_many(keys)
+        except Exception:
+            logger.warning('Product search change log unavailable', exc_info=True)
+            return
+        changes = []
+        for n, key in enumerate(keys, start=index.sequence + 1):
+            if key not in logged:
+                # The writer may not have stored this entry yet; if it is still missing at the
+                # next check it has expired or been evicted and the index cannot catch up
+                if self._gap == n:
+                    self._index = self._rebuild(config, index.generation, sequence)
+                    return
+                self._gap = n
+                sequence = n - 1
+                break
+            changes.append(uuid.UUID(logged[key]))
+        if not changes:
+            return
+        product_ids = set(changes)
+        index = index.apply(product_ids, list(indexed_products(product_ids)), sequence, config)
+        if len(index.pending) > config['COMPACT_AFTER']:
+            index = self._rebuild(config, index.generation, sequence)
+        self._index = index
+
+
+search_engine = SearchEngine()
+
+
+def search_enabled():
+    return get_search_settings()['ENABLED']
+
+
+def search_products(query, limit=None, prefix=False):
+    """Ranked (product id, score) pairs from the in-process index."""
+    return search_engine.index().search(query, limit, prefix)
+
+
+def record_product_changes(product_ids):
+    """Append products to the shared change log so every process reindexes them."""
+    config = get_search_settings()
+    if not config['ENABLED']:
+        return
+    product_ids = [str(product_id) for product_id in product_ids]
+    if not product_ids:
+        return
+    try:
+        cache.add(config['SEQUENCE_KEY'], 0, None)
+        last = cache.incr(config['SEQUENCE_KEY'], len(product_ids))
+        first = last - len(product_ids) + 1
+        cache.set_many(
+            {change_key(config, first + i): product_id for i, product_id in enumerate(product_ids)},
+            config['CHANGE_TTL'],
+        )
+    except Exception:
+        logger.warning('Could not log product search changes', exc_info=True)
+    search_engine.invalidate()
+
+
+def bump_search_generation():
+    """Tell every process to rebuild its search index from the database."""
+    try:
+        cache.set(get_search_settings()['GENERATION_KEY'], uuid.uuid4().hex, None)
+    except Exception:
+        logger.warning('Could not publish product search generation', exc_info=True)
+    search_engine.invalidate()
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """SearchFilter answered from the in-process index when it is enabled.
+
+    Matching products are annotated with ``search_rank`` (0 is the best
+    match); the database is only asked to apply the remaining filters.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not search_enabled() or not tokenize(query):
+            return super().filter_queryset(request, queryset, view)
+        try:
+            results = search_products(query, get_search_settings()['MAX_RESULTS'], prefix=True)
+        except Exception:
+            logger.warning('Product search index unavailable, searching the database', exc_info=True)
+            return super().filter_queryset(request, queryset, view)
+        if not results:
+            return queryset.none()
+        ids = [product_id for product_id, _ in results]
+        return queryset.filter(pk__in=ids).annotate(search_rank=Case(
+            *[When(pk=product_id, then=Value(rank)) for rank, product_id in enumerate(ids)],
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        ))
+
+
+class SearchRankOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that keeps search relevance order unless an ordering is requested."""
+
+    def filter_queryset(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return queryset.order_by('search_rank')
+        return super().filter_queryset(request, queryset, view)
@@ -45,37 +45,47 @@ class ProductReviewSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class PricedProductMixin:
+    """Adds effective prices from the promotions pricing engine, one quote per product per response."""
+    
+    def get_price_quote(self, obj):
+        prices = self.context.setdefault('prices', {})
+        if obj.pk not in prices:
+            prices[obj.pk] = obj.price_quote
+        return prices[obj.pk]
+    
+    def get_final_price(self, obj):
+        return self.get_price_quote(obj).unit_price
+    
+    def get_discount_percentage(self, obj):
+        return self.get_price_quote(obj).discount_percentage
+
+
+class ProductSerializer(PricedProductMixin, serializers.ModelSerializer):
     """Serializer for product model."""
     
     category = CategorySerializer(read_only=True)
     brand = BrandSerializer(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     reviews = ProductReviewSerializer(many=True, read_only=True)
+    final_price = serializers.SerializerMethodField()
+    discount_percentage = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = '__all__'
         read_only_fields = ('id', 'slug', 'created_at', 'updated_at', 'num_reviews', 
                            'rating', 'is_deleted', 'is_new')
-    
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        # Calculate discount percentage if applicable
-        if instance.discount_price and instance.price:
-            discount_percent = ((instance.price - instance.discount_price) / instance.price) * 100
-            data['discount_percentage'] = round(discount_percent, 2)
-        else:
-            data['discount_percentage'] = 0
-        return data
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(PricedProductMixin, serializers.ModelSerializer):
     """Serializer for product list view (lighter version)."""
     
     category = CategorySerializer(read_only=True)
     brand = BrandSerializer(read_only=True)
     primary_image = serializers.SerializerMethodField()
+    final_price = serializers.SerializerMethodField()
+    discount_percentage = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
@@ -88,7 +98,12 @@ class ProductListSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'slug', 'created_at', 'updated_at')
     
     def get_primary_image(self, obj):
-        primary_img = obj.images.filter(is_primary=True).first()
+        primary_images = getattr(obj, 'primary_images', None)
+        if primary_images is not None:
+            # Filled by Prefetch(to_attr='primary_images') in listing querysets
+            primary_img = primary_images[0] if primary_images else None
+        else:
+            primary_img = obj.images.filter(is_primary=True).first()
         if primary_img:
             return ProductImageSerializer(primary_img).data
         return None
@@ -1,8 +1,61 @@
 """Signals for the products app."""
-from django.db.models.signals import post_save, pre_save
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.db.models import Avg
-from .models import Product, ProductReview
+from .categories import bump_category_tree_version
+from .facets import bump_facet_version
+from .models import Brand, Category, Product, ProductReview
+from .search import INDEXED_FIELDS, bump_search_generation, record_product_changes
+
+
+# Saves of these alone change no facet value or search document
+STOCK_FIELDS = frozenset({'stock_quantity', 'updated_at'})
+
+
+def is_stock_update(update_fields):
+    return update_fields is not None and STOCK_FIELDS.issuperset(update_fields)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Rebuild category trees once the change is committed."""
+    transaction.on_commit(bump_category_tree_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_facets(sender, **kwargs):
+    """Drop cached facet counts once the change is committed."""
+    if is_stock_update(kwargs.get('update_fields')):
+        return
+    transaction.on_commit(bump_facet_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    """Queue the product for search reindexing once the change is committed."""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(partial(record_product_changes, [instance.pk]))
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def rebuild_search_index(sender, **kwargs):
+    """Brand and category names are part of every product document they cover."""
+    transaction.on_commit(bump_search_generation)
 
 
 @receiver(post_save, sender=ProductReview)
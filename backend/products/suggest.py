@@ -0,0 +1,246 @@
+"""Search suggestions for as-you-type search boxes.
+
+Suggestions are popular past queries (from ``ProductSearch`` and the
+analytics ``UserSearch`` log) and product names. A periodic task weights
+each query by how often it was searched recently, skipping searches that
+found nothing, and builds a sorted-array index: every entry is stored under
+its full text and under each later word, so ``head`` suggests "wireless
+headphones". The best entries for one- and two-character prefixes are
+precomputed; longer prefixes select a narrow slice of the sorted keys.
+
+The built index is stored in the shared cache and every process keeps its
+own copy, reloaded when the version key changes, so a keystroke is answered
+from memory without touching the database.
+"""
+import bisect
+import logging
+import math
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from analytics.models import UserSearch
+from core.caching import VersionedProcessCache
+from .models import Product, ProductSearch
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CACHE_KEY': 'products:suggest:index',
+    'VERSION_KEY': 'products:suggest:version',
+    'CHECK_INTERVAL': 5.0,  # seconds between version checks against the shared cache
+    'WINDOW_DAYS': 30,  # searches older than this are ignored
+    'HALF_LIFE_DAYS': 7,  # a search this old counts half as much as one today
+    'MIN_SEARCHES': 2,  # queries searched fewer times in the window are never suggested
+    'MAX_QUERIES': 50000,
+    'PRODUCT_WEIGHT': 1.0,  # weight of a product name with no reviews; grows with log(reviews)
+    'INNER_WORD_WEIGHT': 0.5,  # factor for matches on a later word rather than the start
+    'MAX_TEXT_LENGTH': 100,
+    'PRECOMPUTED_PREFIX_LENGTH': 2,
+    'DEFAULT_LIMIT': 8,
+    'MAX_LIMIT': 20,
+    'REBUILD_LOCK_TTL': 600,  # seconds between rebuilds triggered by a request finding nothing built
+}
+
+QUERY = 'query'
+PRODUCT = 'product'
+
+
+def get_suggest_settings():
+    """Return search suggestion settings merged with defaults."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PRODUCT_SUGGEST', {}))
+    return config
+
+
+def normalize(text, max_length=None):
+    """Lowercased text with runs of whitespace collapsed."""
+    text = ' '.join(text.lower().split())
+    return text[:max_length] if max_length else text
+
+
+def query_weights(config, now=None):
+    """Recency-weighted search counts per normalized query, from both search logs."""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    since = now - timedelta(days=config['WINDOW_DAYS'])
+    weights = {}
+    searches = {}
+    for model, field in ((ProductSearch, 'timestamp'), (UserSearch, 'searched_at')):
+        rows = (
+            model.objects.filter(**{f'{field}__gte': since}, results_count__gt=0)
+            .annotate(day=TruncDate(field))
+            .values('query', 'day')
+            .annotate(searches=Count('pk'))
+            .order_by()
+        )
+        for row in rows.iterator(chunk_size=5000):
+            query = normalize(row['query'], config['MAX_TEXT_LENGTH'])
+            if not query:
+                continue
+            age = max((today - row['day']).days, 0)
+            weights[query] = weights.get(query, 0.0) + row['searches'] * 0.5 ** (age / config['HALF_LIFE_DAYS'])
+            searches[query] = searches.get(query, 0) + row['searches']
+    popular = [query for query, count in searches.items() if count >= config['MIN_SEARCHES']]
+    popular.sort(key=lambda query: -weights[query])
+    return {query: weights[query] for query in popular[:config['MAX_QUERIES']]}
+
+
+def suggestion_entries(config, now=None):
+    """(text, payload, weight) for every query and product name worth suggesting."""
+    entries = [
+        (query, {'text': query, 'type': QUERY}, weight)
+        for query, weight in query_weights(config, now).items()
+    ]
+    products = Product.objects.filter(is_active=True, is_deleted=False).values_list(
+        'id', 'name', 'slug', 'num_reviews'
+    )
+    for product_id, name, slug, num_reviews in products.iterator(chunk_size=5000):
+        entries.append((
+            normalize(name, config['MAX_TEXT_LENGTH']),
+            {'text': name, 'type': PRODUCT, 'id': str(product_id), 'slug': slug},
+            config['PRODUCT_WEIGHT'] * (1 + math.log1p(num_reviews)),
+        ))
+    return entries
+
+
+class SuggestionIndex:
+    """Entries under sorted keys, with the best matches for short prefixes precomputed.
+
+    ``keys[i]`` is the text of entry ``numbers[i]`` from one of its word starts,
+    ranked by ``scores[i]``.
+    """
+
+    def __init__(self, entries, config):
+        self.payloads = [payload for _, payload, _ in entries]
+        weights = [weight for _, _, weight in entries]
+        keyed = []
+        for number, (text, _, weight) in enumerate(entries):
+            words = text.split(' ')
+            for start in range(len(words)):
+                score = weight if start == 0 else weight * config['INNER_WORD_WEIGHT']
+                keyed.append((' '.join(words[start:]), -score, number))
+        keyed.sort()
+        self.keys = [key for key, _, _ in keyed]
+        self.numbers = np.array([number for _, _, number in keyed], dtype=np.int32)
+        self.scores = np.array([-score for _, score, _ in keyed], dtype=np.float64)
+        self.max_limit = config['MAX_LIMIT']
+        self.precomputed = {}
+        self.built_at = timezone.now()
+        self.size = len(weights)
+        for length in range(1, config['PRECOMPUTED_PREFIX_LENGTH'] + 1):
+            for prefix in {key[:length] for key in self.keys if len(key) >= length}:
+                self.precomputed[prefix] = self._rank(prefix, self.max_limit)
+
+    def __len__(self):
+        return self.size
+
+    def _rank(self, prefix, limit):
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+        if start == end:
+            return []
+        scores = self.scores[start:end]
+        # An entry can match under several of its words; over-fetch so duplicates can be dropped
+        wanted = min(len(scores), limit * 3)
+        if wanted < len(scores):
+            positions = np.argpartition(-scores, wanted - 1)[:wanted]
+        else:
+            positions = np.arange(len(scores))
+        positions = positions[np.argsort(-scores[positions], kind='stable')]
+        ranked = []
+        seen = set()
+        for number in self.numbers[start + positions].tolist():
+            if number not in seen:
+                seen.add(number)
+                ranked.append(number)
+                if len(ranked) == limit:
+                    break
+        return ranked
+
+    def suggest(self, prefix, limit):
+        """The best entries whose text, or one of its later words, starts with ``prefix``."""
+        limit = min(limit, self.max_limit)
+        numbers = self.precomputed.get(prefix)
+        if numbers is None:
+            numbers = self._rank(prefix, limit)
+        return [self.payloads[number] for number in numbers[:limit]]
+
+
+def build_suggestions(config=None, now=None):
+    config = config or get_suggest_settings()
+    return SuggestionIndex(suggestion_entries(config, now), config)
+
+
+def rebuild_suggestions():
+    """Rebuild the suggestion index from the search logs and publish it to every process."""
+    config = get_suggest_settings()
+    index = build_suggestions(config)
+    try:
+        cache.set(config['CACHE_KEY'], index, None)
+        cache.set(config['VERSION_KEY'], uuid.uuid4().hex, None)
+    except Exception:
+        logger.warning('Could not publish the suggestion index', exc_info=True)
+    suggestion_cache.invalidate()
+    return index
+
+
+def request_rebuild():
+    """Queue a rebuild unless one was queued recently."""
+    config = get_suggest_settings()
+    try:
+        if not cache.add(f"{config['CACHE_KEY']}:rebuild-lock", 1, config['REBUILD_LOCK_TTL']):
+            return
+    except Exception:
+        return
+    from .tasks import rebuild_search_suggestions
+    rebuild_search_suggestions.delay()
+
+
+def load_suggestions():
+    """The index published to the shared cache; empty, with a rebuild queued, when there is none."""
+    config = get_suggest_settings()
+    try:
+        index = cache.get(config['CACHE_KEY'])
+    except Exception:
+        logger.warning('Suggestion index unavailable from the shared cache', exc_info=True)
+        return suggestion_cache.current or SuggestionIndex([], config)
+    if index is None:
+        # Never built, or evicted: a worker builds it and the new version reloads every process
+        request_rebuild()
+        index = SuggestionIndex([], config)
+    return index
+
+
+class SuggestionCache(VersionedProcessCache):
+    """Process-wide SuggestionIndex, reloaded from the shared cache when its version changes."""
+
+    def __init__(self):
+        super().__init__(
+            load_suggestions,
+            lambda: get_suggest_settings()['VERSION_KEY'],
+            lambda: get_suggest_settings()['CHECK_INTERVAL'],
+            'Suggestion index',
+        )
+
+    def index(self):
+        return self.get()
+
+
+suggestion_cache = SuggestionCache()
+
+
+def suggest(prefix, limit=None):
+    """Suggestions for what has been typed so far."""
+    config = get_suggest_settings()
+    prefix = normalize(prefix, config['MAX_TEXT_LENGTH'])
+    if not prefix:
+        return []
+    return suggestion_cache.index().suggest(prefix, limit or config['DEFAULT_LIMIT'])
@@ -0,0 +1,17 @@
+"""Celery tasks for the products app."""
+from celery import shared_task
+
+from .recommendations import rebuild_recommendations
+from .suggest import rebuild_suggestions
+
+
+@shared_task
+def rebuild_search_suggestions():
+    """Beat task: rebuild search suggestions from the recent search logs."""
+    return len(rebuild_suggestions())
+
+
+@shared_task
+def build_product_recommendations():
+    """Beat task: recompute item-to-item recommendations from orders and product views."""
+    return rebuild_recommendations()
@@ -0,0 +1,55 @@
+"""Tests for the products app."""
+import io
+import json
+import uuid
+from decimal import Decimal
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, TestCase
+
+from .async_views import product_detail
+from .bulk import ProductImporter
+from .models import Category, Product
+
+
+class DiscountPercentTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Tools')
+
+    def test_clearing_the_discount_clears_the_percentage(self):
+        product = Product.objects.create(
+            name='Hammer', sku='HAM-1', category=self.category, price=Decimal('100.00'), discount_price=Decimal('80.00')
+        )
+        self.assertEqual(product.discount_percent, Decimal('20.00'))
+
+        product.discount_price = None
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.discount_percent, Decimal('0.00'))
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        Category.objects.create(name='Tools')
+
+    def load(self, text):
+        report = ProductImporter().run(io.StringIO(text))
+        self.assertEqual(report['errors'], [])
+        return Product.objects.get(sku='HAM-1')
+
+    def test_price_only_reimport_recomputes_the_discount_percentage(self):
+        product = self.load('sku,name,category,price,discount_price\nHAM-1,Hammer,Tools,100,80\n')
+        self.assertEqual(product.discount_percent, Decimal('20.00'))
+
+        product = self.load('sku,price\nHAM-1,200\n')
+        self.assertEqual(product.discount_price, Decimal('80.00'))
+        self.assertEqual(product.discount_percent, Decimal('60.00'))
+
+
+class AsyncProductDetailTests(TestCase):
+    async def test_missing_product_is_a_json_404(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        response = await product_detail(request, pk=uuid.uuid4())
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), {'detail': 'Not found.'})
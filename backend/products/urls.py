@@ -1,14 +1,23 @@
 """URLs for the products app."""
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+product_detail = async_views.product_detail if settings.ASYNC_VIEWS else views.ProductDetailView.as_view()
 
 urlpatterns = [
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
+    path('categories/tree/', views.category_tree_view, name='category-tree'),
     path('categories/<uuid:pk>/', views.CategoryDetailView.as_view(), name='category-detail'),
     path('brands/', views.BrandListView.as_view(), name='brand-list'),
     path('brands/<uuid:pk>/', views.BrandDetailView.as_view(), name='brand-detail'),
     path('products/', views.ProductListView.as_view(), name='product-list'),
-    path('products/<uuid:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('suggest/', views.search_suggestions, name='search-suggestions'),
+    path('products/import/', views.import_products, name='product-import'),
+    path('products/export/', views.export_products, name='product-export'),
+    path('products/<uuid:pk>/', product_detail, name='product-detail'),
+    path('products/<uuid:pk>/bought-together/', views.bought_together_products, name='product-bought-together'),
+    path('products/<uuid:pk>/also-viewed/', views.also_viewed_products, name='product-also-viewed'),
     path('products/<uuid:product_id>/reviews/', views.ProductReviewListView.as_view(), name='product-review-list'),
     path('products/<uuid:product_id>/reviews/<uuid:pk>/', views.ProductReviewDetailView.as_view(), name='product-review-detail'),
     path('featured/', views.featured_products, name='featured-products'),
@@ -7,7 +7,7 @@ def track_product_view(product, user=None, session_key=None, ip_address=None, us
     ProductView.objects.create(
         product=product,
         user=user,
-        session_key=session_key,
+        session_key=session_key or '',
         ip_address=ip_address,
         user_agent=user_agent
     )
@@ -18,7 +18,7 @@ def track_search(query, user=None, session_key=None, ip_address=None, results_co
     ProductSearch.objects.create(
         query=query,
         user=user,
-        session_key=session_key,
+        session_key=session_key or '',
         ip_address=ip_address,
         results_count=results_count
     )
\ No newline at end of file
@@ -1,12 +1,15 @@
 """Views for the products app."""
 from rest_framework import generics, filters, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Avg, Prefetch
 from django.utils import timezone
 from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+import io
 from .models import Category, Brand, Product, ProductImage, ProductReview, ProductView, ProductSearch
 from .serializers import (
     CategorySerializer, BrandSerializer, ProductSerializer, 
@@ -14,6 +17,19 @@ from .serializers import (
 )
 from .permissions import IsAdminOrReadOnly
 from .utils import track_product_view, track_search
+from .bulk import EXPORTERS, READERS, ProductImporter
+from .categories import category_tree, filter_by_category
+from .facets import facet_counts
+from .search import IndexedSearchFilter, SearchRankOrderingFilter
+from .suggest import suggest
+from .recommendations import ALSO_VIEWED, BOUGHT_TOGETHER, neighbours, popular_products, request_rebuild
+
+
+def with_listing_relations(queryset):
+    """Load what ProductListSerializer reads up front, so a page costs a fixed number of queries."""
+    return queryset.select_related('category', 'brand').prefetch_related(
+        Prefetch('images', queryset=ProductImage.objects.filter(is_primary=True), to_attr='primary_images')
+    )
 
 
 class CategoryListView(generics.ListCreateAPIView):
@@ -34,6 +50,13 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminOrReadOnly]
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def category_tree_view(request):
+    """Get active categories as a nested tree, rendered once per category change."""
+    return HttpResponse(category_tree.tree().payload, content_type='application/json')
+
+
 class BrandListView(generics.ListCreateAPIView):
     """View for listing and creating brands."""
     
@@ -57,8 +80,8 @@ class ProductListView(generics.ListCreateAPIView):
     
     serializer_class = ProductListSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'brand', 'is_active', 'is_featured', 'is_trending']
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, SearchRankOrderingFilter]
+    filterset_fields = ['brand', 'is_active', 'is_featured', 'is_trending', 'color', 'size', 'material']
     search_fields = ['name', 'description', 'sku', 'barcode']
     ordering_fields = ['price', 'created_at', 'rating', 'discount_percent']
     ordering = ['-created_at']
@@ -66,6 +89,11 @@ class ProductListView(generics.ListCreateAPIView):
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True, is_deleted=False)
         
+        # Category filter (id or slug), including every subcategory
+        category = self.request.query_params.get('category', None)
+        if category:
+            queryset = filter_by_category(queryset, category)
+        
         # Price range filter
         min_price = self.request.query_params.get('min_price', None)
         max_price = self.request.query_params.get('max_price', None)
@@ -80,9 +108,16 @@ class ProductListView(generics.ListCreateAPIView):
         if min_rating:
             queryset = queryset.filter(rating__gte=min_rating)
         
-        return queryset
+        return with_listing_relations(queryset)
     
     def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        # Facet counts for the whole result set, skipped with ?facets=false
+        facets = None
+        if request.query_params.get('facets', 'true').lower() not in ('false', '0'):
+            facets = facet_counts(queryset, request.query_params)
+        
         # Track search if query params exist
         search_query = request.query_params.get('search', '')
         if search_query:
@@ -91,10 +126,17 @@ class ProductListView(generics.ListCreateAPIView):
                 user=request.user if request.user.is_authenticated else None,
                 session_key=request.session.session_key,
                 ip_address=self.get_client_ip(request),
-                results_count=self.get_queryset().count()
+                results_count=facets['total'] if facets is not None else queryset.count()
             )
         
-        return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = Response({'results': self.get_serializer(queryset, many=True).data})
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
     
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -253,18 +295,94 @@ def top_rated_products(request):
     return Response(products)
 
 
+def ranked_products(product_ids, limit=10):
+    """Active products for a ranked list of ids, in that order."""
+    product_ids = product_ids[:limit]
+    products = with_listing_relations(Product.objects.filter(id__in=product_ids, is_active=True, is_deleted=False))
+    rank = {product_id: i for i, product_id in enumerate(product_ids)}
+    return sorted(products, key=lambda product: rank[str(product.id)])
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def frequently_purchased_products(request):
-    """Get frequently purchased products."""
-    # This would typically come from order data
-    # For now, we'll return products with the most reviews as a proxy
-    products = Product.objects.filter(
-        is_active=True,
-        is_deleted=False
-    ).annotate(
-        review_count=Count('reviews')
-    ).order_by('-review_count')[:10]
+    """Get the most purchased products, from the precomputed recommendations."""
+    product_ids = popular_products()
+    if product_ids is None:
+        # Nothing published yet; queue the batch job rather than aggregating here
+        request_rebuild()
+        return Response([])
+    serializer = ProductListSerializer(ranked_products(product_ids), many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def bought_together_products(request, pk):
+    """Get products frequently bought together with a product."""
+    serializer = ProductListSerializer(ranked_products(neighbours(pk, BOUGHT_TOGETHER)), many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def also_viewed_products(request, pk):
+    """Get products that viewers of a product also viewed."""
+    serializer = ProductListSerializer(ranked_products(neighbours(pk, ALSO_VIEWED)), many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_suggestions(request):
+    """Suggest popular searches and product names for a partly typed query."""
+    query = request.query_params.get('q', '')
+    try:
+        limit = int(request.query_params.get('limit', 0))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'query': query, 'suggestions': suggest(query, max(limit, 0))})
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def import_products(request):
+    """Admin: Upsert products by SKU from an uploaded CSV or JSON Lines feed."""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
     
-    serializer = ProductListSerializer(products, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    file_format = request.data.get('format') or ('jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if file_format not in READERS:
+        return Response({'error': f'Unsupported format: {file_format}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        chunk_size = int(request.data.get('chunk_size', 1000))
+    except (TypeError, ValueError):
+        chunk_size = 0
+    if chunk_size < 1:
+        return Response({'error': 'chunk_size must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    importer = ProductImporter(
+        chunk_size=chunk_size,
+        dry_run=str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes'),
+    )
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    report = importer.run(stream, file_format)
+    
+    return Response(report, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_products(request):
+    """Admin: Stream the product catalog as CSV or JSON Lines."""
+    file_format = request.query_params.get('export_format', 'csv')
+    if file_format not in EXPORTERS:
+        return Response({'error': f'Unsupported format: {file_format}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(EXPORTERS[file_format](), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+    return response
\ No newline at end of file
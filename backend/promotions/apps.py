@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class PromotionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'promotions'
\ No newline at end of file
+    name = 'promotions'
+
+    def ready(self):
+        import promotions.signals
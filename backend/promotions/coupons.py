@@ -0,0 +1,289 @@
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core.caching import VersionedProcessCache
+from .models import Coupon, CouponRedemption
+
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def get_coupon_settings():
+    config = {
+        'VERSION_KEY': 'promotions:coupons:version',
+        'CHECK_INTERVAL': 1.0,  # seconds between version checks against the shared cache
+        'MAX_ELIGIBLE': 20,  # coupons returned by the eligible-coupons endpoint
+    }
+    config.update(getattr(settings, 'PROMOTION_COUPONS', {}))
+    return config
+
+
+class CouponRejected(Exception):
+    def __init__(self, message, code='invalid'):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+CartLine = namedtuple('CartLine', ['product_id', 'category_id', 'quantity', 'unit_price'])
+
+
+def line_total(line):
+    return line.unit_price * line.quantity
+
+
+class CouponRule:
+    """Immutable, evaluation-ready form of a Coupon row"""
+
+    __slots__ = (
+        'id', 'code', 'name', 'discount_type', 'discount_value', 'minimum_order_amount',
+        'valid_from', 'valid_until', 'usage_limit', 'usage_limit_per_user', 'product_ids', 'category_ids',
+    )
+
+    def __init__(self, coupon, product_ids=(), category_ids=()):
+        self.id = coupon.id
+        self.code = coupon.code
+        self.name = coupon.name
+        self.discount_type = coupon.discount_type
+        self.discount_value = coupon.discount_value
+        self.minimum_order_amount = coupon.minimum_order_amount
+        self.valid_from = coupon.valid_from
+        self.valid_until = coupon.valid_until
+        self.usage_limit = coupon.usage_limit
+        self.usage_limit_per_user = coupon.usage_limit_per_user
+        self.product_ids = frozenset(product_ids)
+        self.category_ids = frozenset(category_ids)
+
+    @property
+    def restricted(self):
+        return bool(self.product_ids or self.category_ids)
+
+    @property
+    def limited(self):
+        return self.usage_limit is not None or bool(self.usage_limit_per_user)
+
+    def is_open(self, now):
+        return self.valid_from <= now <= self.valid_until
+
+    def applies_to(self, line):
+        if not self.restricted:
+            return True
+        return line.product_id in self.product_ids or line.category_id in self.category_ids
+
+    def discount_for(self, amount):
+        if self.discount_type == 'percentage':
+            discount = amount * self.discount_value / 100
+        else:
+            discount = self.discount_value
+        return min(discount, amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class CouponEvaluation:
+    def __init__(self, rule, cart_total, eligible_total):
+        self.rule = rule
+        self.cart_total = cart_total
+        self.eligible_total = eligible_total
+        self.discount = rule.discount_for(eligible_total)
+
+    @property
+    def new_total(self):
+        return self.cart_total - self.discount
+
+    def as_dict(self):
+        return {
+            'code': self.rule.code,
+            'name': self.rule.name,
+            'discount_type': self.rule.discount_type,
+            'discount_value': self.rule.discount_value,
+            'eligible_total': self.eligible_total,
+            'discount_amount': self.discount,
+            'new_total': self.new_total,
+        }
+
+
+class CouponIndex:
+    """Active coupons keyed by code, product and category
+
+    Coupons that have not started yet are indexed too and filtered by their
+    validity window at evaluation time, so the index only changes when a
+    coupon row does.
+    """
+
+    def __init__(self, rules):
+        self.by_code = {}
+        self.by_product = {}
+        self.by_category = {}
+        self.unrestricted = []
+        for rule in rules:
+            self.by_code[rule.code] = rule
+            if not rule.restricted:
+                self.unrestricted.append(rule)
+            for product_id in rule.product_ids:
+                self.by_product.setdefault(product_id, []).append(rule)
+            for category_id in rule.category_ids:
+                self.by_category.setdefault(category_id, []).append(rule)
+
+    @classmethod
+    def load(cls, now=None):
+        now = now or timezone.now()
+        coupons = list(Coupon.objects.filter(is_active=True, valid_until__gte=now))
+        ids = [coupon.id for coupon in coupons]
+        products = {}
+        for coupon_id, product_id in Coupon.products.through.objects.filter(coupon_id__in=ids).values_list(
+            'coupon_id', 'product_id'
+        ):
+            products.setdefault(coupon_id, []).append(product_id)
+        categories = {}
+        for coupon_id, category_id in Coupon.categories.through.objects.filter(coupon_id__in=ids).values_list(
+            'coupon_id', 'category_id'
+        ):
+            categories.setdefault(coupon_id, []).append(category_id)
+        return cls(
+            CouponRule(coupon, products.get(coupon.id, ()), categories.get(coupon.id, ()))
+            for coupon in coupons
+        )
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def get(self, code):
+        return self.by_code.get(code)
+
+    def evaluate(self, rule, lines):
+        """Cart total and the part of it the coupon applies to, in one pass"""
+        cart_total = ZERO
+        eligible_total = ZERO
+        for line in lines:
+            amount = line_total(line)
+            cart_total += amount
+            if rule.applies_to(line):
+                eligible_total += amount
+        return CouponEvaluation(rule, cart_total, eligible_total)
+
+    def eligible(self, lines, now=None):
+        """Every open coupon the cart qualifies for, best discount first
+
+        Each line is matched against the product and category postings, so
+        the cost grows with the cart and the coupons touching it rather than
+        with the total number of coupons.
+        """
+        now = now or timezone.now()
+        cart_total = ZERO
+        eligible_totals = {}
+        for line in lines:
+            amount = line_total(line)
+            cart_total += amount
+            matched = set()
+            for rule in self.by_product.get(line.product_id, ()):
+                matched.add(rule)
+            for rule in self.by_category.get(line.category_id, ()):
+                matched.add(rule)
+            for rule in matched:
+                eligible_totals[rule] = eligible_totals.get(rule, ZERO) + amount
+        for rule in self.unrestricted:
+            eligible_totals[rule] = cart_total
+
+        evaluations = [
+            CouponEvaluation(rule, cart_total, eligible_total)
+            for rule, eligible_total in eligible_totals.items()
+            if eligible_total > 0 and rule.is_open(now) and cart_total >= rule.minimum_order_amount
+        ]
+        evaluations.sort(key=lambda evaluation: evaluation.discount, reverse=True)
+        return evaluations
+
+
+class CouponEngine(VersionedProcessCache):
+    """Process-wide CouponIndex, reloaded when the shared version key changes"""
+
+    def __init__(self):
+        super().__init__(
+            CouponIndex.load,
+            lambda: get_coupon_settings()['VERSION_KEY'],
+            lambda: get_coupon_settings()['CHECK_INTERVAL'],
+            'Coupon index',
+        )
+
+    def index(self):
+        return self.get()
+
+    async def aindex(self):
+        return await self.aget()
+
+
+coupon_engine = CouponEngine()
+
+
+def bump_coupon_version():
+    """Tell every process to rebuild its coupon index"""
+    coupon_engine.bump()
+
+
+def check_usage(rule, user):
+    """Reject a coupon whose total or per-user usage is already spent"""
+    if not rule.limited:
+        return
+    queryset = Coupon.objects.filter(pk=rule.id)
+    fields = ['used_count']
+    if rule.usage_limit_per_user and user is not None and user.is_authenticated:
+        queryset = queryset.annotate(mine=Count('redemptions', filter=Q(redemptions__user=user)))
+        fields.append('mine')
+    row = queryset.values(*fields).first()
+    if row is None:
+        raise CouponRejected('Invalid coupon code')
+    if rule.usage_limit is not None and row['used_count'] >= rule.usage_limit:
+        raise CouponRejected('Coupon usage limit has been reached', 'exhausted')
+    if 'mine' in row and row['mine'] >= rule.usage_limit_per_user:
+        raise CouponRejected('You have already used this coupon the maximum number of times', 'user_limit')
+
+
+def evaluate_coupon(code, lines, user=None, now=None):
+    """Validate a coupon against a whole cart and return its evaluation"""
+    now = now or timezone.now()
+    index = coupon_engine.index()
+    rule = index.get(code)
+    if rule is None:
+        raise CouponRejected('Invalid coupon code')
+    if not rule.is_open(now):
+        raise CouponRejected('Coupon is not valid')
+
+    evaluation = index.evaluate(rule, lines)
+    if evaluation.cart_total < rule.minimum_order_amount:
+        raise CouponRejected(f'Minimum order amount of {rule.minimum_order_amount} not met', 'minimum')
+    if evaluation.eligible_total <= 0:
+        raise CouponRejected('Coupon does not apply to any item in your cart', 'not_applicable')
+    check_usage(rule, user)
+    return evaluation
+
+
+def redeem_coupon(code, user, lines, order=None):
+    """Evaluate and consume one use of a coupon atomically
+
+    The conditional UPDATE is the total usage counter and also takes the
+    coupon's row lock, so concurrent redemptions of the same coupon count the
+    user's previous redemptions one at a time.
+    """
+    evaluation = evaluate_coupon(code, lines, user)
+    rule = evaluation.rule
+    now = timezone.now()
+    with transaction.atomic():
+        updated = (
+            Coupon.objects.filter(pk=rule.id, is_active=True, valid_from__lte=now, valid_until__gte=now)
+            .filter(Q(usage_limit__isnull=True) | Q(used_count__lt=F('usage_limit')))
+            .update(used_count=F('used_count') + 1)
+        )
+        if not updated:
+            raise CouponRejected('Coupon usage limit has been reached', 'exhausted')
+        if rule.usage_limit_per_user:
+            used = CouponRedemption.objects.filter(coupon_id=rule.id, user=user).count()
+            if used >= rule.usage_limit_per_user:
+                raise CouponRejected('You have already used this coupon the maximum number of times', 'user_limit')
+        CouponRedemption.objects.create(
+            coupon_id=rule.id, user=user, order=order, discount_amount=evaluation.discount
+        )
+    return evaluation
@@ -0,0 +1,453 @@
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import FlashSale
+
+
+logger = logging.getLogger(__name__)
+
+CLAIMED = 1
+NOT_LOADED = -1
+NOT_LIVE = -2
+USER_LIMIT = -3
+SOLD_OUT = -4
+
+# Returns a user's reserved units to the sale. Shared by the claim script, which
+# drops an expired reservation before checking anything, and the expiry script.
+DROP_RESERVATION = """
+local function drop_reservation(sale, users, reserved, holds, user)
+    local units = tonumber(redis.call('HGET', reserved, user) or '0')
+    redis.call('HDEL', reserved, user)
+    redis.call('ZREM', holds, user)
+    if units <= 0 then
+        return 0
+    end
+    redis.call('HINCRBY', sale, 'reserved', -units)
+    units = math.min(units, tonumber(redis.call('HGET', users, user) or '0'))
+    if units <= 0 then
+        return 0
+    end
+    redis.call('HINCRBY', users, user, -units)
+    redis.call('HINCRBY', sale, 'remaining', units)
+    redis.call('HINCRBY', sale, 'sold', -units)
+    return units
+end
+"""
+
+# Sale state lives in one hash so availability, the live window and the
+# per-user cap are all checked and updated in a single round trip
+CLAIM_SCRIPT = DROP_RESERVATION + """
+local sale = KEYS[1]
+local users = KEYS[2]
+local dirty = KEYS[3]
+local reserved = KEYS[4]
+local holds = KEYS[5]
+local user = ARGV[1]
+local quantity = tonumber(ARGV[2])
+local mode = ARGV[4]
+local state = redis.call('HMGET', sale, 'remaining', 'start', 'end', 'cap', 'active', 'expire')
+if not state[1] then
+    return {-1, 0, 0}
+end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local expiry = redis.call('ZSCORE', holds, user)
+if expiry and tonumber(expiry) <= now and drop_reservation(sale, users, reserved, holds, user) > 0 then
+    redis.call('SADD', dirty, ARGV[3])
+end
+local remaining = tonumber(redis.call('HGET', sale, 'remaining'))
+if state[5] ~= '1' or now < tonumber(state[2]) or now > tonumber(state[3]) then
+    return {-2, remaining, 0}
+end
+local from_reserved = 0
+if mode == 'checkout' then
+    from_reserved = math.min(quantity, tonumber(redis.call('HGET', reserved, user) or '0'))
+end
+local needed = quantity - from_reserved
+local cap = tonumber(state[4])
+if mode == 'reserve' and cap <= 0 then
+    cap = tonumber(ARGV[5])
+end
+local held = tonumber(redis.call('HGET', users, user) or '0')
+if cap > 0 and held + needed > cap then
+    return {-3, math.max(0, cap - held), 0}
+end
+if remaining < needed then
+    return {-4, remaining, 0}
+end
+if needed > 0 then
+    redis.call('HINCRBY', sale, 'remaining', -needed)
+    redis.call('HINCRBY', sale, 'sold', needed)
+    redis.call('HINCRBY', users, user, needed)
+    redis.call('PEXPIREAT', users, state[6])
+    redis.call('SADD', dirty, ARGV[3])
+end
+if from_reserved > 0 then
+    redis.call('HINCRBY', sale, 'reserved', -from_reserved)
+    if redis.call('HINCRBY', reserved, user, -from_reserved) <= 0 then
+        redis.call('HDEL', reserved, user)
+        redis.call('ZREM', holds, user)
+    end
+elseif mode == 'reserve' then
+    redis.call('HINCRBY', sale, 'reserved', quantity)
+    redis.call('HINCRBY', reserved, user, quantity)
+    redis.call('PEXPIREAT', reserved, state[6])
+    redis.call('ZADD', holds, now + tonumber(ARGV[6]), user)
+    redis.call('PEXPIREAT', holds, state[6])
+end
+return {1, remaining - needed, from_reserved}
+"""
+
+RELEASE_SCRIPT = """
+local sale = KEYS[1]
+local users = KEYS[2]
+local dirty = KEYS[3]
+local reserved = KEYS[4]
+local holds = KEYS[5]
+local user = ARGV[1]
+local restore = tonumber(ARGV[4])
+if redis.call('EXISTS', sale) == 0 then
+    return 0
+end
+if restore > 0 then
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+    redis.call('HINCRBY', sale, 'reserved', restore)
+    redis.call('HINCRBY', reserved, user, restore)
+    redis.call('ZADD', holds, 'NX', now + tonumber(ARGV[5]), user)
+end
+local held = tonumber(redis.call('HGET', users, user) or '0')
+local quantity = math.min(tonumber(ARGV[2]) - restore, held)
+if quantity <= 0 then
+    return 0
+end
+redis.call('HINCRBY', users, user, -quantity)
+redis.call('HINCRBY', sale, 'remaining', quantity)
+redis.call('HINCRBY', sale, 'sold', -quantity)
+redis.call('SADD', dirty, ARGV[3])
+return quantity
+"""
+
+# Drops one user's reservation (ARGV[2]), or every reservation that has expired
+EXPIRE_SCRIPT = DROP_RESERVATION + """
+local sale = KEYS[1]
+local users = KEYS[2]
+local dirty = KEYS[3]
+local reserved = KEYS[4]
+local holds = KEYS[5]
+if redis.call('EXISTS', sale) == 0 then
+    return 0
+end
+local released = 0
+if ARGV[2] ~= '' then
+    released = drop_reservation(sale, users, reserved, holds, ARGV[2])
+else
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+    for _, user in ipairs(redis.call('ZRANGEBYSCORE', holds, '-inf', now)) do
+        released = released + drop_reservation(sale, users, reserved, holds, user)
+    end
+end
+if released > 0 then
+    redis.call('SADD', dirty, ARGV[1])
+end
+return released
+"""
+
+# Loads a sale, or refreshes its settings after an admin edit; the sold count
+# already in Redis wins over the database copy, which may lag behind it.
+# Reservations left over from a sale hash that was lost are dropped with it.
+SYNC_SCRIPT = """
+local sale = KEYS[1]
+local users = KEYS[2]
+local max = tonumber(ARGV[1])
+local sold = redis.call('HGET', sale, 'sold')
+if sold then
+    sold = tonumber(sold)
+else
+    sold = tonumber(ARGV[2])
+    redis.call('DEL', KEYS[3], KEYS[4])
+    redis.call('HSET', sale, 'reserved', 0)
+end
+redis.call('HSET', sale, 'max', max, 'sold', sold, 'remaining', math.max(0, max - sold),
+    'start', ARGV[3], 'end', ARGV[4], 'cap', ARGV[5], 'active', ARGV[6], 'expire', ARGV[7])
+redis.call('PEXPIREAT', sale, ARGV[7])
+redis.call('PEXPIREAT', users, ARGV[7])
+return {sold, math.max(0, max - sold)}
+"""
+
+
+def get_flash_sale_settings():
+    config = {
+        'KEY_PREFIX': 'flash',
+        'DEFAULT_PER_USER_LIMIT': 0,  # 0 means no cap unless FlashSale.max_per_user is set
+        'RESERVATION_LIMIT': 5,  # units a user may reserve of a sale with no per-user cap
+        'RESERVATION_TTL': 600,  # seconds reserved units are held before they return to the sale
+        'WRITE_BACK_DEBOUNCE': 2.0,  # seconds; claims within this window share one write-back
+        'RETENTION': 24 * 3600,  # keep counters this long after a sale ends for reconciliation
+        'RECONCILE_LOOKBACK': 24 * 3600,  # reconcile sales that ended within this many seconds
+    }
+    config.update(getattr(settings, 'PROMOTION_FLASH_SALES', {}))
+    return config
+
+
+class FlashSaleError(Exception):
+    def __init__(self, message, code, remaining=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.remaining = remaining
+
+
+# ``reserved`` is how many of the units came from the user's earlier reservation
+Claim = namedtuple('Claim', ['quantity', 'remaining', 'reserved'])
+
+# ``sold`` counts units bought at checkout; units only reserved are in ``reserved``
+SaleCounts = namedtuple('SaleCounts', ['sold', 'maximum', 'remaining', 'reserved'])
+
+RESERVE = 'reserve'
+CHECKOUT = 'checkout'
+
+
+def epoch_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+class FlashSaleInventory:
+    """Flash sale stock and per-user claims held in Redis
+
+    Buyers only ever touch Redis; ``quantity_sold`` is copied to the
+    FlashSale row afterwards by ``write_back`` and checked by ``reconcile``.
+    Reserved units are held for ``RESERVATION_TTL`` seconds and then go back
+    to the sale, either when the user next claims or when
+    ``expire_reservations`` sweeps them.
+    """
+
+    def __init__(self, client, config=None):
+        self.client = client
+        self.config = config or get_flash_sale_settings()
+        self.prefix = self.config['KEY_PREFIX']
+        self.claim_script = client.register_script(CLAIM_SCRIPT)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        self.sync_script = client.register_script(SYNC_SCRIPT)
+        self.expire_script = client.register_script(EXPIRE_SCRIPT)
+
+    def key(self, sale_id):
+        return f'{self.prefix}:{sale_id}'
+
+    def users_key(self, sale_id):
+        return f'{self.prefix}:{sale_id}:users'
+
+    def reserved_key(self, sale_id):
+        return f'{self.prefix}:{sale_id}:reserved'
+
+    def holds_key(self, sale_id):
+        return f'{self.prefix}:{sale_id}:holds'
+
+    def user_keys(self, sale_id):
+        return [
+            self.key(sale_id), self.users_key(sale_id), self.dirty_key,
+            self.reserved_key(sale_id), self.holds_key(sale_id),
+        ]
+
+    @property
+    def reservation_ttl_ms(self):
+        return int(self.config['RESERVATION_TTL'] * 1000)
+
+    @property
+    def dirty_key(self):
+        return f'{self.prefix}:dirty'
+
+    def per_user_limit(self, sale):
+        return sale.max_per_user or self.config['DEFAULT_PER_USER_LIMIT'] or 0
+
+    def sync(self, sale):
+        """Load a sale into Redis or refresh its window, cap and max_quantity"""
+        expire_at = epoch_ms(sale.end_time) + int(self.config['RETENTION'] * 1000)
+        sold, remaining = self.sync_script(
+            keys=[self.key(sale.pk), self.users_key(sale.pk), self.reserved_key(sale.pk), self.holds_key(sale.pk)],
+            args=[
+                sale.max_quantity, sale.quantity_sold, epoch_ms(sale.start_time), epoch_ms(sale.end_time),
+                self.per_user_limit(sale), int(sale.is_active), expire_at,
+            ],
+        )
+        return int(sold), int(remaining)
+
+    def claim(self, sale_id, user_id, quantity=1, mode=''):
+        """Take ``quantity`` units for a user, or raise FlashSaleError without taking any
+
+        ``mode`` RESERVE also records the units as reserved, for a later
+        checkout, and caps them at ``RESERVATION_LIMIT`` when the sale has no
+        per-user cap; CHECKOUT uses up the user's reserved units first and
+        only takes the rest from the sale.
+        """
+        keys = self.user_keys(sale_id)
+        args = [str(user_id), quantity, sale_id, mode, self.config['RESERVATION_LIMIT'], self.reservation_ttl_ms]
+        status, value, reserved = self.claim_script(keys=keys, args=args)
+        if status == NOT_LOADED:
+            try:
+                self.sync(FlashSale.objects.get(pk=sale_id))
+            except FlashSale.DoesNotExist:
+                raise FlashSaleError('Flash sale not found', 'not_found')
+            status, value, reserved = self.claim_script(keys=keys, args=args)
+
+        if status == CLAIMED:
+            return Claim(quantity, int(value), int(reserved))
+        if status == NOT_LIVE:
+            raise FlashSaleError('Flash sale is not active', 'not_live')
+        if status == USER_LIMIT:
+            message = (
+                f'You can buy {int(value)} more of this flash sale item' if value
+                else 'You have reached the limit for this flash sale'
+            )
+            raise FlashSaleError(message, 'user_limit', remaining=int(value))
+        if int(value) == 0:
+            raise FlashSaleError('Flash sale is sold out', 'sold_out', remaining=0)
+        raise FlashSaleError(f'Only {int(value)} left in this flash sale', 'insufficient', remaining=int(value))
+
+    def release(self, sale_id, user_id, quantity, reserved=0):
+        """Return up to ``quantity`` of a user's claimed units to the sale, e.g. on cancellation
+
+        ``reserved`` of them go back to the user's reservation instead, undoing
+        a CHECKOUT claim that used them.
+        """
+        args = [str(user_id), quantity, sale_id, reserved, self.reservation_ttl_ms]
+        return int(self.release_script(keys=self.user_keys(sale_id), args=args))
+
+    def cancel_reservation(self, sale_id, user_id):
+        """Return all of a user's reserved units to the sale; returns how many went back"""
+        return int(self.expire_script(keys=self.user_keys(sale_id), args=[sale_id, str(user_id)]))
+
+    def expire_reservations(self, now=None):
+        """Return reservations past their hold time to their sales; returns how many units went back"""
+        now = now or timezone.now()
+        since = now - timedelta(seconds=self.config['RECONCILE_LOOKBACK'])
+        sale_ids = list(FlashSale.objects.filter(start_time__lte=now, end_time__gte=since).values_list('pk', flat=True))
+        if not sale_ids:
+            return 0
+        pipeline = self.client.pipeline(transaction=False)
+        for sale_id in sale_ids:
+            self.expire_script(keys=self.user_keys(sale_id), args=[sale_id, ''], client=pipeline)
+        return sum(int(released) for released in pipeline.execute())
+
+    def remaining(self, sale_id):
+        value = self.client.hget(self.key(sale_id), 'remaining')
+        return None if value is None else int(value)
+
+    def remaining_counts(self, sale_ids):
+        """Live remaining units of many sales in one round trip; None for sales not loaded"""
+        return {
+            sale_id: None if state is None else state.remaining for sale_id, state in self.sold_counts(sale_ids).items()
+        }
+
+    def held_by(self, sale_id, user_id):
+        return int(self.client.hget(self.users_key(sale_id), str(user_id)) or 0)
+
+    def reserved_by(self, sale_id, user_id):
+        return int(self.client.hget(self.reserved_key(sale_id), str(user_id)) or 0)
+
+    def sold_counts(self, sale_ids):
+        """SaleCounts per sale, None for sales not loaded"""
+        pipeline = self.client.pipeline(transaction=False)
+        for sale_id in sale_ids:
+            pipeline.hmget(self.key(sale_id), 'sold', 'max', 'remaining', 'reserved')
+        return {
+            int(sale_id): None if sold is None else SaleCounts(
+                int(sold) - int(reserved or 0), int(maximum), int(remaining), int(reserved or 0)
+            )
+            for sale_id, (sold, maximum, remaining, reserved) in zip(sale_ids, pipeline.execute())
+        }
+
+    def write_back(self, batch_size=500):
+        """Copy sold counts of recently claimed sales to FlashSale.quantity_sold"""
+        written = 0
+        while True:
+            sale_ids = self.client.spop(self.dirty_key, batch_size)
+            if not sale_ids:
+                return written
+            sale_ids = [int(sale_id) for sale_id in sale_ids]
+            counts = self.sold_counts(sale_ids)
+            sales = [
+                FlashSale(pk=sale_id, quantity_sold=max(0, state.sold))
+                for sale_id, state in counts.items()
+                if state is not None
+            ]
+            try:
+                FlashSale.objects.bulk_update(sales, ['quantity_sold'])
+            except Exception:
+                # Leave them for the next write-back or reconciliation run
+                self.client.sadd(self.dirty_key, *sale_ids)
+                raise
+            written += len(sales)
+
+    def reconcile(self, now=None):
+        """Bring Redis counters and FlashSale rows back in line
+
+        Running sales missing from Redis are reloaded from the database.
+        Otherwise Redis holds the sold count, so the row is corrected to
+        match, and ``remaining`` is recomputed from ``max - sold - reserved``.
+        """
+        now = now or timezone.now()
+        since = now - timedelta(seconds=self.config['RECONCILE_LOOKBACK'])
+        sales = list(FlashSale.objects.filter(start_time__lte=now, end_time__gte=since))
+        counts = self.sold_counts([sale.pk for sale in sales])
+        report = {'checked': len(sales), 'loaded': 0, 'rows_fixed': 0, 'counters_fixed': 0}
+        stale_rows = []
+        for sale in sales:
+            state = counts[sale.pk]
+            if state is None:
+                if sale.end_time >= now:
+                    self.sync(sale)
+                    report['loaded'] += 1
+                continue
+            sold, maximum, remaining, reserved = state
+            if maximum != sale.max_quantity or remaining != max(0, maximum - sold - reserved):
+                self.sync(sale)
+                report['counters_fixed'] += 1
+            if sold != sale.quantity_sold:
+                sale.quantity_sold = max(0, sold)
+                stale_rows.append(sale)
+        if stale_rows:
+            FlashSale.objects.bulk_update(stale_rows, ['quantity_sold'])
+            report['rows_fixed'] = len(stale_rows)
+        return report
+
+
+def get_inventory():
+    from django_redis import get_redis_connection
+    return FlashSaleInventory(get_redis_connection('default'))
+
+
+def load_remaining(sales, inventory=None):
+    """Fill ``items_remaining`` of a list of sales from one Redis pipeline"""
+    sales = list(sales)
+    try:
+        counts = (inventory or get_inventory()).remaining_counts([sale.pk for sale in sales])
+    except Exception:
+        logger.warning('Flash sale counters unavailable, using database counts', exc_info=True)
+        counts = {}
+    for sale in sales:
+        sale.live_remaining = counts.get(sale.pk)
+    return sales
+
+
+def write_back_key():
+    return f"{get_flash_sale_settings()['KEY_PREFIX']}:write-back"
+
+
+def schedule_write_back(config=None):
+    from .tasks import write_back_flash_sales
+
+    config = config or get_flash_sale_settings()
+    # One queued write-back per debounce window, however many buyers claim
+    try:
+        scheduled = cache.add(write_back_key(), 1, config['WRITE_BACK_DEBOUNCE'] + 60)
+    except Exception:
+        scheduled = True
+    if scheduled:
+        write_back_flash_sales.apply_async(countdown=config['WRITE_BACK_DEBOUNCE'])
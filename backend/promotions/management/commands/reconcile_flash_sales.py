@@ -0,0 +1,22 @@
+"""Repair drift between Redis flash sale counters and FlashSale rows."""
+import json
+
+from django.core.management.base import BaseCommand
+
+from promotions.inventory import get_inventory
+
+
+class Command(BaseCommand):
+    help = ('Write pending flash sale sold counts back to the database, then reload running sales '
+            'missing from Redis and correct counters or rows that disagree.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-write-back', action='store_true')
+
+    def handle(self, *args, **options):
+        inventory = get_inventory()
+        if not options['skip_write_back']:
+            written = inventory.write_back()
+            self.stdout.write(f'Wrote back {written} flash sale(s)')
+        report = inventory.reconcile()
+        self.stdout.write(json.dumps(report))
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from products.models import Product, Category
 from decimal import Decimal
@@ -26,6 +27,7 @@ class Coupon(models.Model):
     valid_from = models.DateTimeField()
     valid_until = models.DateTimeField()
     is_active = models.BooleanField(default=True)
+    is_live = models.BooleanField(default=False)  # Maintained by promotions.scheduler at each boundary
     
     # Minimum order amount
     minimum_order_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -55,10 +57,8 @@ class Coupon(models.Model):
             return False
         
         # Check if user has exceeded usage limit
-        if self.usage_limit_per_user:
-            from accounts.models import User
-            # In a real app, we'd track user-specific usage
-            pass  # Simplified for now
+        if self.usage_limit_per_user and user is not None and user.is_authenticated:
+            return self.redemptions.filter(user=user).count() < self.usage_limit_per_user
         
         return True
 
@@ -78,11 +78,33 @@ class Coupon(models.Model):
         indexes = [
             models.Index(fields=['code']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['is_live']),
             models.Index(fields=['valid_from']),
             models.Index(fields=['valid_until']),
         ]
 
 
+class CouponRedemption(models.Model):
+    """One use of a coupon, counted against usage_limit_per_user"""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    order = models.ForeignKey(
+        'orders.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='coupon_redemptions'
+    )
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.coupon.code} used by {self.user_id}"
+
+    class Meta:
+        db_table = 'coupon_redemptions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['coupon', 'user']),
+        ]
+
+
 class FlashSale(models.Model):
     """Time-bound flash sales"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='flash_sales')
@@ -94,10 +116,12 @@ class FlashSale(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     is_active = models.BooleanField(default=True)
+    is_live = models.BooleanField(default=False)  # Maintained by promotions.scheduler at each boundary
     
     # Limitations
     max_quantity = models.PositiveIntegerField()  # Total quantity available for sale
-    quantity_sold = models.PositiveIntegerField(default=0)  # Track how many sold
+    quantity_sold = models.PositiveIntegerField(default=0)  # Written back from the Redis counter
+    max_per_user = models.PositiveIntegerField(null=True, blank=True)  # Per buyer cap
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -111,7 +135,7 @@ class FlashSale(models.Model):
         now = timezone.now()
         return (self.is_active and 
                 self.start_time <= now <= self.end_time and
-                self.quantity_sold < self.max_quantity)
+                self.items_remaining > 0)
 
     @property
     def time_remaining(self):
@@ -124,13 +148,23 @@ class FlashSale(models.Model):
 
     @property
     def items_remaining(self):
-        """Get number of items remaining in the flash sale"""
-        return max(0, self.max_quantity - self.quantity_sold)
+        """Get number of items remaining, from the live counter when it is loaded"""
+        # Read once per instance; listings fill it for every sale at once with inventory.load_remaining
+        if not hasattr(self, 'live_remaining'):
+            from .inventory import get_inventory
+            try:
+                self.live_remaining = get_inventory().remaining(self.pk)
+            except Exception:
+                self.live_remaining = None
+        remaining = self.live_remaining
+        if remaining is None:
+            return max(0, self.max_quantity - self.quantity_sold)
+        return remaining
 
     @property
     def is_sold_out(self):
         """Check if flash sale is sold out"""
-        return self.quantity_sold >= self.max_quantity
+        return self.items_remaining <= 0
 
     class Meta:
         db_table = 'flash_sales'
@@ -138,6 +172,7 @@ class FlashSale(models.Model):
         indexes = [
             models.Index(fields=['product']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['is_live']),
             models.Index(fields=['start_time']),
             models.Index(fields=['end_time']),
         ]
@@ -168,6 +203,7 @@ class Banner(models.Model):
     
     # Targeting
     is_active = models.BooleanField(default=True)
+    is_live = models.BooleanField(default=False)  # Maintained by promotions.scheduler at each boundary
     start_date = models.DateTimeField(default=timezone.now)
     end_date = models.DateTimeField(null=True, blank=True)
     
@@ -198,6 +234,7 @@ class Banner(models.Model):
         ordering = ['order', '-created_at']
         indexes = [
             models.Index(fields=['is_active']),
+            models.Index(fields=['is_live', 'position']),
             models.Index(fields=['position']),
             models.Index(fields=['start_date']),
             models.Index(fields=['end_date']),
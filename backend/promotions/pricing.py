@@ -0,0 +1,226 @@
+import logging
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from core.caching import VersionedProcessCache
+from products.models import percent_off
+from .coupons import CartLine
+from .inventory import CHECKOUT, FlashSaleError
+from .models import FlashSale
+
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+LIST = 'list'
+DISCOUNT = 'discount'
+FLASH_SALE = 'flash_sale'
+
+
+def get_pricing_settings():
+    config = {
+        'VERSION_KEY': 'promotions:pricing:version',
+        'CHECK_INTERVAL': 1.0,  # seconds between version checks against the shared cache
+    }
+    config.update(getattr(settings, 'PROMOTION_PRICING', {}))
+    return config
+
+
+class PriceQuote(namedtuple('PriceQuote', ['product_id', 'list_price', 'unit_price', 'source', 'flash_sale_id',
+                                           'regular_price'])):
+    """Effective unit price of one product and where it came from
+
+    ``regular_price`` is the price without the flash sale, charged when the
+    sale's stock cannot be claimed at checkout.
+    """
+
+    __slots__ = ()
+
+    @property
+    def discount_percentage(self):
+        return percent_off(self.list_price, self.unit_price)
+
+    def without_flash_sale(self):
+        source = DISCOUNT if self.regular_price < self.list_price else LIST
+        return self._replace(unit_price=self.regular_price, source=source, flash_sale_id=None)
+
+
+FlashSalePrice = namedtuple('FlashSalePrice', ['sale_id', 'sale_price', 'start_time', 'end_time'])
+
+
+class FlashSaleIndex:
+    """Flash sales with stock left, keyed by product and cheapest first
+
+    Sales that have not started are indexed too and filtered by their window
+    when a price is resolved, so the index only changes when a sale row or
+    its sold count does.
+    """
+
+    def __init__(self, sales):
+        self.by_product = {}
+        for sale in sales:
+            self.by_product.setdefault(sale.product_id, []).append(
+                FlashSalePrice(sale.pk, sale.sale_price, sale.start_time, sale.end_time)
+            )
+        for entries in self.by_product.values():
+            entries.sort(key=lambda entry: entry.sale_price)
+
+    @classmethod
+    def load(cls, now=None):
+        now = now or timezone.now()
+        return cls(
+            FlashSale.objects.filter(is_active=True, end_time__gte=now, quantity_sold__lt=F('max_quantity'))
+            .only('id', 'product_id', 'sale_price', 'start_time', 'end_time')
+        )
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.by_product.values())
+
+    def best(self, product_id, now):
+        for entry in self.by_product.get(product_id, ()):
+            if entry.start_time <= now <= entry.end_time:
+                return entry
+        return None
+
+    def quote(self, product, now):
+        list_price = product.price
+        regular_price = list_price
+        if product.discount_price and product.discount_price < list_price:
+            regular_price = product.discount_price
+        quote = PriceQuote(product.pk, list_price, regular_price, LIST, None, regular_price)
+        sale = self.best(product.pk, now)
+        if sale is not None and sale.sale_price < regular_price:
+            return quote._replace(unit_price=sale.sale_price, source=FLASH_SALE, flash_sale_id=sale.sale_id)
+        return quote if regular_price == list_price else quote._replace(source=DISCOUNT)
+
+
+class PricingEngine(VersionedProcessCache):
+    """Process-wide FlashSaleIndex, reloaded when the shared version key changes"""
+
+    def __init__(self):
+        super().__init__(
+            FlashSaleIndex.load,
+            lambda: get_pricing_settings()['VERSION_KEY'],
+            lambda: get_pricing_settings()['CHECK_INTERVAL'],
+            'Flash sale price index',
+        )
+
+    def index(self):
+        return self.get()
+
+
+pricing_engine = PricingEngine()
+
+
+def bump_pricing_version():
+    """Tell every process to rebuild its flash sale price index"""
+    pricing_engine.bump()
+
+
+def quote_product(product, now=None):
+    return pricing_engine.index().quote(product, now or timezone.now())
+
+
+def price_products(products, now=None):
+    """Effective prices for a batch of loaded products, keyed by product id
+
+    Only the product's own fields and the in-process flash sale index are
+    read, so no queries are made however many products are priced.
+    """
+    index = pricing_engine.index()
+    now = now or timezone.now()
+    return {product.pk: index.quote(product, now) for product in products}
+
+
+class PricedLine:
+    __slots__ = ('item', 'product', 'quantity', 'quote')
+
+    def __init__(self, item, product, quantity, quote):
+        self.item = item
+        self.product = product
+        self.quantity = quantity
+        self.quote = quote
+
+    @property
+    def unit_price(self):
+        return self.quote.unit_price
+
+    @property
+    def total(self):
+        return self.quote.unit_price * self.quantity
+
+    def as_cart_line(self):
+        return CartLine(self.product.pk, self.product.category_id, self.quantity, self.quote.unit_price)
+
+
+class PricedCart:
+    def __init__(self, lines):
+        self.lines = lines
+
+    @property
+    def subtotal(self):
+        return sum((line.total for line in self.lines), ZERO)
+
+    def cart_lines(self):
+        """Lines priced for coupon evaluation"""
+        return [line.as_cart_line() for line in self.lines]
+
+
+def price_items(items, now=None):
+    """Price cart or order items (anything with ``product`` and ``quantity``) in one pass"""
+    items = list(items)
+    quotes = price_products([item.product for item in items], now)
+    return PricedCart([PricedLine(item, item.product, item.quantity, quotes[item.product.pk]) for item in items])
+
+
+def cart_items(cart):
+    """A cart's items with their products in a single query"""
+    return cart.items.select_related('product')
+
+
+def cart_lines(cart):
+    """Effectively priced coupon lines for a cart"""
+    return price_items(cart_items(cart)).cart_lines()
+
+
+def claim_flash_sale_lines(priced, user, inventory):
+    """Take flash sale stock for every line priced by a flash sale
+
+    Units the user already reserved through the claim endpoint are used
+    first. Lines whose stock cannot be claimed fall back to their regular
+    price. Returns the claims made as (sale id, quantity, reserved units
+    used) so they can be released if the order is abandoned.
+    """
+    claims = []
+    for line in priced.lines:
+        if line.quote.flash_sale_id is None:
+            continue
+        try:
+            claim = inventory.claim(line.quote.flash_sale_id, user.pk, line.quantity, mode=CHECKOUT)
+        except FlashSaleError:
+            line.quote = line.quote.without_flash_sale()
+            continue
+        except Exception:
+            logger.warning('Flash sale inventory unavailable, charging the regular price', exc_info=True)
+            line.quote = line.quote.without_flash_sale()
+            continue
+        claims.append((line.quote.flash_sale_id, line.quantity, claim.reserved))
+    return claims
+
+
+def release_flash_sale_claims(claims, user, inventory):
+    """Give back units claimed for an order that was not placed
+
+    Failures are logged rather than raised, so they never hide the error
+    that abandoned the order; reconciliation corrects the counter.
+    """
+    for sale_id, quantity, reserved in claims:
+        try:
+            inventory.release(sale_id, user.pk, quantity, reserved=reserved)
+        except Exception:
+            logger.warning('Could not release flash sale %s units', sale_id, exc_info=True)
@@ -0,0 +1,197 @@
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Banner, Coupon, FlashSale
+
+
+logger = logging.getLogger(__name__)
+
+# label -> (model, start field, end field); a null end never expires
+LIVE_SPECS = {
+    'coupon': (Coupon, 'valid_from', 'valid_until'),
+    'flash_sale': (FlashSale, 'start_time', 'end_time'),
+    'banner': (Banner, 'start_date', 'end_date'),
+}
+
+WINDOW_FIELDS = {model: (start, end) for model, start, end in LIVE_SPECS.values()}
+
+# End times are inclusive, so a promotion stops being live just after its end
+END_GRACE = timedelta(milliseconds=1)
+
+MAX_CLOCK_SKEW_MS = 2000
+
+# Sent after is_live flags flip: sender is the model, went_live/ended are lists of pks
+promotion_live_changed = Signal()
+
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if #due > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+end
+return due
+"""
+
+
+def get_scheduler_settings():
+    config = {
+        'HEAP_KEY': 'promotions:boundaries',
+        'TIMER_KEY_PREFIX': 'promotions:boundary-timer',
+        'HORIZON': 3600,  # seconds of upcoming boundaries loaded into the heap per planning run
+        'BEAT_INTERVAL': 60,  # seconds between planning runs; timers are armed for the next interval
+    }
+    config.update(getattr(settings, 'PROMOTION_SCHEDULER', {}))
+    return config
+
+
+def epoch_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def live_q(start, end, now):
+    return Q(is_active=True, **{f'{start}__lte': now}) & (
+        Q(**{f'{end}__isnull': True}) | Q(**{f'{end}__gte': now})
+    )
+
+
+def should_be_live(instance, now=None):
+    start, end = WINDOW_FIELDS[type(instance)]
+    now = now or timezone.now()
+    start_value, end_value = getattr(instance, start), getattr(instance, end)
+    return bool(
+        instance.is_active and start_value is not None and start_value <= now
+        and (end_value is None or now <= end_value)
+    )
+
+
+def sync_live_flags(now=None):
+    """Flip is_live on every promotion whose window opened or closed, then announce it"""
+    now = now or timezone.now()
+    changed = {}
+    for label, (model, start, end) in LIVE_SPECS.items():
+        should = live_q(start, end, now)
+        went_live = list(model.objects.filter(is_live=False).filter(should).values_list('pk', flat=True))
+        ended = list(model.objects.filter(is_live=True).exclude(should).values_list('pk', flat=True))
+        if went_live:
+            model.objects.filter(pk__in=went_live).update(is_live=True)
+        if ended:
+            model.objects.filter(pk__in=ended).update(is_live=False)
+        if went_live or ended:
+            changed[label] = {'went_live': went_live, 'ended': ended}
+            promotion_live_changed.send(sender=model, went_live=went_live, ended=ended)
+    return changed
+
+
+def model_boundaries(label, queryset, since, until):
+    """Start and end boundaries in (since, until] as (epoch ms, member) pairs"""
+    _, start, end = LIVE_SPECS[label]
+    entries = []
+    for pk, value in queryset.filter(**{f'{start}__gt': since, f'{start}__lte': until}).values_list('pk', start):
+        entries.append((epoch_ms(value), f'{label}:{pk}:start'))
+    end_since, end_until = since - END_GRACE, until - END_GRACE
+    for pk, value in queryset.filter(**{f'{end}__gt': end_since, f'{end}__lte': end_until}).values_list('pk', end):
+        entries.append((epoch_ms(value + END_GRACE), f'{label}:{pk}:end'))
+    return entries
+
+
+def boundaries_between(since, until):
+    entries = []
+    for label, (model, _, _) in LIVE_SPECS.items():
+        entries.extend(model_boundaries(label, model.objects.filter(is_active=True), since, until))
+    return entries
+
+
+class BoundaryHeap:
+    """Min-heap of upcoming promotion boundaries, kept in a Redis sorted set"""
+
+    def __init__(self, client, config=None):
+        self.client = client
+        self.config = config or get_scheduler_settings()
+        self.key = self.config['HEAP_KEY']
+        self.pop_due_script = client.register_script(POP_DUE_SCRIPT)
+
+    def push(self, entries):
+        if entries:
+            self.client.zadd(self.key, {member: score for score, member in entries})
+
+    def pop_due(self, now):
+        return [member.decode() for member in self.pop_due_script(keys=[self.key], args=[epoch_ms(now)])]
+
+    def upcoming(self, until):
+        """Distinct boundary times (epoch ms) up to ``until``, earliest first"""
+        scores = self.client.zrangebyscore(self.key, '-inf', epoch_ms(until), withscores=True)
+        return sorted({int(score) for _, score in scores})
+
+    def __len__(self):
+        return self.client.zcard(self.key)
+
+
+def get_heap():
+    from django_redis import get_redis_connection
+    return BoundaryHeap(get_redis_connection('default'))
+
+
+def arm_timers(heap, now, config):
+    """Queue one eta task per distinct boundary before the next planning run"""
+    from .tasks import fire_promotion_boundaries
+
+    if fire_promotion_boundaries.app.conf.task_always_eager:
+        # An eager "timer" would run immediately; plan_boundaries runs often enough on its own
+        return 0
+    armed = 0
+    until = now + timedelta(seconds=config['BEAT_INTERVAL'] * 2)
+    for score in heap.upcoming(until):
+        key = f"{config['TIMER_KEY_PREFIX']}:{score}"
+        if cache.add(key, 1, config['BEAT_INTERVAL'] * 4):
+            eta = datetime.fromtimestamp(score / 1000, tz=dt_timezone.utc)
+            fire_promotion_boundaries.apply_async(args=[score], eta=eta)
+            armed += 1
+    return armed
+
+
+def plan_boundaries(now=None):
+    """Refill the boundary heap from the database, fire anything due and arm timers"""
+    config = get_scheduler_settings()
+    now = now or timezone.now()
+    changed = sync_live_flags(now)
+    try:
+        heap = get_heap()
+        heap.pop_due(now)
+        heap.push(boundaries_between(now, now + timedelta(seconds=config['HORIZON'])))
+        armed = arm_timers(heap, now, config)
+    except Exception:
+        # Without Redis, flags still flip on every planning run, just less precisely
+        logger.warning('Promotion boundary heap unavailable', exc_info=True)
+        armed = 0
+    return {'changed': changed, 'armed': armed}
+
+
+def fire_boundaries(at=None):
+    """Flip flags for a boundary; ``at`` (epoch ms) covers a worker clock slightly behind the timer's"""
+    now = timezone.now()
+    if at is not None and 0 < at - epoch_ms(now) <= MAX_CLOCK_SKEW_MS:
+        now = datetime.fromtimestamp(at / 1000, tz=dt_timezone.utc)
+    try:
+        get_heap().pop_due(now)
+    except Exception:
+        logger.warning('Promotion boundary heap unavailable', exc_info=True)
+    return sync_live_flags(now)
+
+
+def note_boundaries(instance):
+    """Add a saved promotion's future start and end to the heap, arming a timer if it is close"""
+    config = get_scheduler_settings()
+    now = timezone.now()
+    label = next(label for label, (model, _, _) in LIVE_SPECS.items() if model is type(instance))
+    queryset = type(instance).objects.filter(pk=instance.pk, is_active=True)
+    entries = model_boundaries(label, queryset, now, now + timedelta(seconds=config['HORIZON']))
+    if not entries:
+        return
+    heap = get_heap()
+    heap.push(entries)
+    arm_timers(heap, now, config)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Coupon, FlashSale, Banner
+from products.models import Category, Product
 from products.serializers import ProductSerializer, CategorySerializer
 
 class CouponSerializer(serializers.ModelSerializer):
@@ -8,9 +9,9 @@ class CouponSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'code', 'name', 'description', 'discount_type', 'discount_value',
             'usage_limit', 'usage_limit_per_user', 'used_count', 'valid_from',
-            'valid_until', 'is_active', 'minimum_order_amount', 'created_at', 'updated_at'
+            'valid_until', 'is_active', 'is_live', 'minimum_order_amount', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'used_count', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'used_count', 'is_live', 'created_at', 'updated_at']
 
     def validate(self, data):
         # Ensure valid_from is before valid_until
@@ -27,15 +28,16 @@ class CouponSerializer(serializers.ModelSerializer):
 class FlashSaleSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
+    items_remaining = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = FlashSale
         fields = [
             'id', 'product', 'product_id', 'name', 'original_price', 'sale_price',
-            'discount_percentage', 'start_time', 'end_time', 'is_active',
-            'max_quantity', 'quantity_sold', 'created_at', 'updated_at'
+            'discount_percentage', 'start_time', 'end_time', 'is_active', 'is_live',
+            'max_quantity', 'quantity_sold', 'items_remaining', 'max_per_user', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'discount_percentage', 'quantity_sold', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'discount_percentage', 'quantity_sold', 'is_live', 'created_at', 'updated_at']
 
     def validate(self, data):
         # Validate that sale price is less than original price
@@ -63,25 +65,61 @@ class BannerSerializer(serializers.ModelSerializer):
         model = Banner
         fields = [
             'id', 'title', 'subtitle', 'description', 'image', 'mobile_image',
-            'background_color', 'link_url', 'position', 'order', 'is_active',
+            'background_color', 'link_url', 'position', 'order', 'is_active', 'is_live',
             'start_date', 'end_date', 'products', 'categories', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'is_live', 'created_at', 'updated_at']
 
 
 class ApplyCouponSerializer(serializers.Serializer):
     coupon_code = serializers.CharField(max_length=50)
-    order_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    # Only used when the cart is empty; restricted coupons need cart items to apply
+    order_total = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
     def validate_coupon_code(self, value):
-        try:
-            from .models import Coupon
-            coupon = Coupon.objects.get(code=value, is_active=True)
-            if not coupon.is_valid:
-                raise serializers.ValidationError("Coupon is not valid")
-            return coupon
-        except Coupon.DoesNotExist:
+        from .coupons import coupon_engine
+        value = value.strip()
+        if coupon_engine.index().get(value) is None:
             raise serializers.ValidationError("Invalid coupon code")
+        return value
+
+
+class PromotionProductSerializer(serializers.ModelSerializer):
+    """Compact product card embedded in the promotions snapshot"""
+    primary_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'slug', 'price', 'discount_price', 'final_price', 'rating', 'primary_image']
+
+    def get_primary_image(self, obj):
+        # Filled by the snapshot's Prefetch(to_attr='primary_images')
+        images = getattr(obj, 'primary_images', None)
+        return images[0].image.url if images and images[0].image else None
+
+
+class PromotionCategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug']
+
+
+class FlashSaleSnapshotSerializer(FlashSaleSerializer):
+    product = PromotionProductSerializer(read_only=True)
+    # The snapshot is shared for minutes; live stock comes from the stock endpoint
+    items_remaining = None
+
+    class Meta(FlashSaleSerializer.Meta):
+        fields = [field for field in FlashSaleSerializer.Meta.fields if field != 'items_remaining']
+
+
+class BannerSnapshotSerializer(BannerSerializer):
+    products = PromotionProductSerializer(many=True, read_only=True)
+    categories = PromotionCategorySerializer(many=True, read_only=True)
+
+
+class FlashSaleClaimSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, max_value=100, default=1)
 
 
 class ActivePromotionsSerializer(serializers.Serializer):
@@ -0,0 +1,97 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .coupons import bump_coupon_version
+from .inventory import get_inventory
+from .pricing import bump_pricing_version
+from .scheduler import note_boundaries, promotion_live_changed, should_be_live
+from .snapshot import get_snapshot_settings
+from .models import Banner, Coupon, FlashSale
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+@receiver(m2m_changed, sender=Coupon.products.through)
+@receiver(m2m_changed, sender=Coupon.categories.through)
+def invalidate_coupon_index(sender, **kwargs):
+    """Rebuild coupon indexes once the change is committed"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_coupon_version)
+
+
+@receiver(post_save, sender=FlashSale)
+@receiver(post_delete, sender=FlashSale)
+def invalidate_price_index(sender, **kwargs):
+    """Reprice products once a flash sale change is committed"""
+    transaction.on_commit(bump_pricing_version)
+
+
+@receiver(post_save, sender=FlashSale)
+def sync_flash_sale_inventory(sender, instance, **kwargs):
+    """Push edited quantities, caps and times to the live counter"""
+    def sync():
+        try:
+            get_inventory().sync(instance)
+        except Exception:
+            # reconcile_flash_sales loads it later
+            logger.warning('Could not sync flash sale %s to Redis', instance.pk, exc_info=True)
+    transaction.on_commit(sync)
+
+
+def queue_snapshot_rebuild():
+    from .tasks import rebuild_promotions_snapshot
+    try:
+        rebuild_promotions_snapshot.delay()
+    except Exception:
+        # Without a worker, drop the snapshot so the next request rebuilds it
+        logger.warning('Could not queue a promotions snapshot rebuild', exc_info=True)
+        cache.delete(get_snapshot_settings()['CACHE_KEY'])
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+@receiver(post_save, sender=FlashSale)
+@receiver(post_delete, sender=FlashSale)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(m2m_changed, sender=Banner.products.through)
+@receiver(m2m_changed, sender=Banner.categories.through)
+def invalidate_promotions_snapshot(sender, **kwargs):
+    """Re-render the active promotions snapshot after any promotion change"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(queue_snapshot_rebuild)
+
+
+@receiver(promotion_live_changed)
+def rebuild_snapshot_on_boundary(sender, **kwargs):
+    """A promotion started or ended, so the active snapshot is out of date"""
+    queue_snapshot_rebuild()
+
+
+@receiver(pre_save, sender=Coupon)
+@receiver(pre_save, sender=FlashSale)
+@receiver(pre_save, sender=Banner)
+def set_live_flag(sender, instance, **kwargs):
+    """Saves take effect immediately; the scheduler handles later boundaries"""
+    instance.is_live = should_be_live(instance)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_save, sender=FlashSale)
+@receiver(post_save, sender=Banner)
+def schedule_promotion_boundaries(sender, instance, **kwargs):
+    """Arm timers for a saved promotion's upcoming start and end"""
+    def schedule():
+        try:
+            note_boundaries(instance)
+        except Exception:
+            # plan_promotion_boundaries picks it up on its next run
+            logger.warning('Could not schedule boundaries for %s %s', sender.__name__, instance.pk, exc_info=True)
+    transaction.on_commit(schedule)
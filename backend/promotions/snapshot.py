@@ -0,0 +1,91 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from products.models import Product, ProductImage
+from .models import Banner, Coupon, FlashSale
+from .serializers import BannerSnapshotSerializer, CouponSerializer, FlashSaleSnapshotSerializer
+
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('coupons', 'flash_sales', 'banners')
+
+
+def get_snapshot_settings():
+    config = {
+        'CACHE_KEY': 'promotions:snapshot',
+    }
+    config.update(getattr(settings, 'PROMOTION_SNAPSHOT', {}))
+    return config
+
+
+def product_prefetch(prefix=''):
+    return Prefetch(
+        f'{prefix}images',
+        queryset=ProductImage.objects.filter(is_primary=True).only('id', 'product_id', 'image'),
+        to_attr='primary_images',
+    )
+
+
+def active_coupons():
+    # is_live is flipped by promotions.scheduler at each start/end boundary
+    return Coupon.objects.filter(is_live=True)
+
+
+def active_flash_sales():
+    return FlashSale.objects.filter(
+        is_live=True,
+        quantity_sold__lt=F('max_quantity')
+    ).select_related('product').prefetch_related(product_prefetch('product__'))
+
+
+def active_banners():
+    return Banner.objects.filter(is_live=True).prefetch_related(
+        Prefetch('products', queryset=Product.objects.prefetch_related(product_prefetch())),
+        'categories',
+    )
+
+
+def render(data):
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def build_snapshot():
+    """Serialize every live promotion into pre-rendered JSON per section"""
+    data = {
+        'coupons': CouponSerializer(active_coupons(), many=True).data,
+        'flash_sales': FlashSaleSnapshotSerializer(active_flash_sales(), many=True).data,
+        'banners': BannerSnapshotSerializer(active_banners(), many=True).data,
+    }
+    sections = {name: render(data[name]) for name in SECTIONS}
+    sections['all'] = b'{' + b', '.join(
+        json.dumps(name).encode() + b': ' + sections[name] for name in SECTIONS
+    ) + b'}'
+    return {'built_at': timezone.now(), 'sections': sections}
+
+
+def rebuild_snapshot():
+    """Rebuild and store the snapshot until the next promotion change or boundary event"""
+    snapshot = build_snapshot()
+    try:
+        cache.set(get_snapshot_settings()['CACHE_KEY'], snapshot, None)
+    except Exception:
+        logger.warning('Could not store the promotions snapshot', exc_info=True)
+    return snapshot
+
+
+def get_snapshot():
+    try:
+        snapshot = cache.get(get_snapshot_settings()['CACHE_KEY'])
+    except Exception:
+        logger.warning('Promotions snapshot unavailable, building it in-request', exc_info=True)
+        return build_snapshot()
+    if snapshot is None:
+        snapshot = rebuild_snapshot()
+    return snapshot
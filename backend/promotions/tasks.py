@@ -0,0 +1,63 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+from .inventory import get_inventory, schedule_write_back, write_back_key
+from .pricing import bump_pricing_version
+from .scheduler import fire_boundaries, plan_boundaries
+from .snapshot import rebuild_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def write_back_flash_sales():
+    """Persist flash sale sold counts claimed since the last write-back"""
+    # Clear the debounce marker first so claims arriving from now on schedule another run
+    cache.delete(write_back_key())
+    written = get_inventory().write_back()
+    if written:
+        # Sold-out sales drop out of the snapshot and the price index, the rest show fresh counts
+        bump_pricing_version()
+        rebuild_snapshot()
+    return written
+
+
+@shared_task
+def reconcile_flash_sales():
+    """Repair drift between the Redis flash sale counters and FlashSale rows"""
+    report = get_inventory().reconcile()
+    if report['rows_fixed'] or report['counters_fixed']:
+        logger.warning('Flash sale reconciliation corrected drift: %s', report)
+    if report['rows_fixed']:
+        bump_pricing_version()
+    return report
+
+
+@shared_task
+def expire_flash_sale_reservations():
+    """Beat task: return reserved flash sale units whose hold time has passed"""
+    released = get_inventory().expire_reservations()
+    if released:
+        schedule_write_back()
+    return released
+
+
+@shared_task
+def rebuild_promotions_snapshot():
+    """Re-render the active promotions snapshot after a promotion change or boundary event"""
+    rebuild_snapshot()
+
+
+@shared_task
+def plan_promotion_boundaries():
+    """Beat task: sync is_live flags, refill the boundary heap and arm timers for the next interval"""
+    return plan_boundaries()
+
+
+@shared_task
+def fire_promotion_boundaries(at=None):
+    """Timer task queued for one boundary by plan_promotion_boundaries"""
+    return fire_boundaries(at)
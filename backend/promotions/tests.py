@@ -0,0 +1,168 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.testing import redis_or_skip
+from .coupons import CartLine, CouponRejected, coupon_engine, redeem_coupon
+from .inventory import CHECKOUT, RESERVE, FlashSaleError, FlashSaleInventory, get_flash_sale_settings
+from .models import Coupon, FlashSale
+
+
+class FlashSaleInventoryTests(SimpleTestCase):
+    def setUp(self):
+        client = redis_or_skip()
+        config = get_flash_sale_settings()
+        config['KEY_PREFIX'] = f'tests:{uuid.uuid4().hex}'
+        self.config = config
+        self.inventory = FlashSaleInventory(client, config)
+        self.addCleanup(self.delete_keys, client, config['KEY_PREFIX'])
+
+    def delete_keys(self, client, prefix):
+        keys = client.keys(f'{prefix}:*')
+        if keys:
+            client.delete(*keys)
+
+    def load(self, max_quantity=5, max_per_user=None, start=-1, end=1):
+        now = timezone.now()
+        sale = FlashSale(
+            pk=1, max_quantity=max_quantity, quantity_sold=0, max_per_user=max_per_user, is_active=True,
+            start_time=now + timedelta(hours=start), end_time=now + timedelta(hours=end),
+        )
+        self.inventory.sync(sale)
+        return sale
+
+    def assertRejected(self, code, *args, **kwargs):
+        with self.assertRaises(FlashSaleError) as raised:
+            self.inventory.claim(*args, **kwargs)
+        self.assertEqual(raised.exception.code, code)
+        return raised.exception
+
+    def test_never_oversells(self):
+        self.load(max_quantity=3)
+        self.assertEqual(self.inventory.claim(1, 'a', 2).remaining, 1)
+        error = self.assertRejected('insufficient', 1, 'b', 2)
+        self.assertEqual(error.remaining, 1)
+        self.inventory.claim(1, 'b', 1)
+        self.assertRejected('sold_out', 1, 'c', 1)
+        self.assertEqual(self.inventory.sold_counts([1]), {1: (3, 3, 0, 0)})
+
+    def test_per_user_cap(self):
+        self.load(max_per_user=2)
+        self.inventory.claim(1, 'a', 1)
+        error = self.assertRejected('user_limit', 1, 'a', 2)
+        self.assertEqual(error.remaining, 1)
+        self.inventory.claim(1, 'a', 1)
+        self.assertEqual(self.inventory.held_by(1, 'a'), 2)
+
+    def test_sale_outside_its_window_is_not_claimable(self):
+        self.load(start=1, end=2)
+        self.assertRejected('not_live', 1, 'a', 1)
+
+    def test_release_returns_units(self):
+        self.load(max_quantity=3)
+        self.inventory.claim(1, 'a', 2)
+        self.assertEqual(self.inventory.release(1, 'a', 5), 2)
+        self.assertEqual(self.inventory.remaining(1), 3)
+        self.assertEqual(self.inventory.held_by(1, 'a'), 0)
+
+    def test_checkout_uses_reserved_units_first(self):
+        self.load(max_quantity=5, max_per_user=3)
+        self.inventory.claim(1, 'a', 2, mode=RESERVE)
+        claim = self.inventory.claim(1, 'a', 3, mode=CHECKOUT)
+        self.assertEqual(claim.reserved, 2)
+        self.assertEqual(self.inventory.held_by(1, 'a'), 3)
+        self.assertEqual(self.inventory.reserved_by(1, 'a'), 0)
+        self.assertEqual(self.inventory.remaining(1), 2)
+
+        self.inventory.release(1, 'a', 3, reserved=claim.reserved)
+        self.assertEqual(self.inventory.held_by(1, 'a'), 2)
+        self.assertEqual(self.inventory.reserved_by(1, 'a'), 2)
+        self.assertEqual(self.inventory.remaining(1), 3)
+
+    def test_reservations_are_capped_when_the_sale_has_no_cap(self):
+        self.config['RESERVATION_LIMIT'] = 3
+        self.load(max_quantity=500)
+        self.inventory.claim(1, 'a', 2, mode=RESERVE)
+        self.assertRejected('user_limit', 1, 'a', 2, mode=RESERVE)
+        self.assertEqual(self.inventory.claim(1, 'a', 10, mode=CHECKOUT).reserved, 2)
+
+    def test_reserved_units_are_not_written_back_as_sold(self):
+        self.load(max_quantity=5)
+        self.inventory.claim(1, 'a', 2, mode=RESERVE)
+        self.inventory.claim(1, 'b', 1)
+        self.assertEqual(self.inventory.sold_counts([1]), {1: (1, 5, 2, 2)})
+
+    def test_cancelled_reservation_returns_to_the_sale(self):
+        self.load(max_quantity=5)
+        self.inventory.claim(1, 'a', 3, mode=RESERVE)
+        self.assertEqual(self.inventory.cancel_reservation(1, 'a'), 3)
+        self.assertEqual(self.inventory.remaining(1), 5)
+        self.assertEqual(self.inventory.held_by(1, 'a'), 0)
+        self.assertEqual(self.inventory.reserved_by(1, 'a'), 0)
+
+    def test_expired_reservation_is_dropped_at_the_next_claim(self):
+        self.config['RESERVATION_TTL'] = 0
+        self.load(max_quantity=3, max_per_user=3)
+        self.inventory.claim(1, 'a', 3, mode=RESERVE)
+        claim = self.inventory.claim(1, 'a', 3, mode=CHECKOUT)
+        self.assertEqual(claim.reserved, 0)
+        self.assertEqual(self.inventory.held_by(1, 'a'), 3)
+        self.assertEqual(self.inventory.sold_counts([1]), {1: (3, 3, 0, 0)})
+
+    def test_sweeper_returns_expired_reservations(self):
+        self.config['RESERVATION_TTL'] = 0
+        self.load(max_quantity=5)
+        self.inventory.claim(1, 'a', 2, mode=RESERVE)
+        self.inventory.claim(1, 'b', 1)
+        sales = mock.Mock(**{'filter.return_value.values_list.return_value': [1]})
+        with mock.patch('promotions.inventory.FlashSale.objects', sales):
+            self.assertEqual(self.inventory.expire_reservations(), 2)
+        self.assertEqual(self.inventory.remaining(1), 4)
+        self.assertEqual(self.inventory.held_by(1, 'b'), 1)
+
+
+class CouponLimitTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user('alice@example.com', 'password', username='alice')
+        self.bob = User.objects.create_user('bob@example.com', 'password', username='bob')
+        self.lines = [CartLine(uuid.uuid4(), None, 1, Decimal('50.00'))]
+
+    def coupon(self, **limits):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='SAVE10', name='Save 10', discount_type='fixed', discount_value=Decimal('10.00'),
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1), **limits
+        )
+        # The version bump waits for a commit that never comes inside a test case
+        coupon_engine.invalidate()
+        return coupon
+
+    def assertRejected(self, code, user):
+        with self.assertRaises(CouponRejected) as raised:
+            redeem_coupon('SAVE10', user, self.lines)
+        self.assertEqual(raised.exception.code, code)
+
+    def test_total_usage_limit(self):
+        coupon = self.coupon(usage_limit=1)
+        self.assertEqual(redeem_coupon('SAVE10', self.alice, self.lines).discount, Decimal('10.00'))
+        self.assertRejected('exhausted', self.bob)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 1)
+
+    def test_per_user_limit(self):
+        coupon = self.coupon(usage_limit_per_user=1)
+        redeem_coupon('SAVE10', self.alice, self.lines)
+        self.assertRejected('user_limit', self.alice)
+        redeem_coupon('SAVE10', self.bob, self.lines)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 2)
+
+    def test_minimum_order_amount(self):
+        self.coupon(minimum_order_amount=Decimal('100.00'))
+        self.assertRejected('minimum', self.alice)
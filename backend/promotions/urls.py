@@ -4,9 +4,13 @@ from . import views
 urlpatterns = [
     path('coupons/', views.list_active_coupons, name='list-active-coupons'),
     path('flash-sales/', views.list_active_flash_sales, name='list-active-flash-sales'),
+    path('flash-sales/<int:sale_id>/claim/', views.claim_flash_sale, name='claim-flash-sale'),
+    path('flash-sales/<int:sale_id>/claim/cancel/', views.cancel_flash_sale_claim, name='cancel-flash-sale-claim'),
+    path('flash-sales/<int:sale_id>/stock/', views.flash_sale_stock, name='flash-sale-stock'),
     path('banners/', views.list_active_banners, name='list-active-banners'),
     path('all/', views.get_active_promotions, name='get-active-promotions'),
     path('apply-coupon/', views.apply_coupon, name='apply-coupon'),
+    path('coupons/eligible/', views.eligible_coupons, name='eligible-coupons'),
     path('product/<int:product_id>/flash-sales/', views.get_product_flash_sales, name='get-product-flash-sales'),
     
     # Admin endpoints
@@ -1,152 +1,180 @@
+import logging
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 from django.db.models import F
 from .models import Coupon, FlashSale, Banner
 from .serializers import (
     CouponSerializer, FlashSaleSerializer, BannerSerializer, 
-    ApplyCouponSerializer, ActivePromotionsSerializer
+    ApplyCouponSerializer, FlashSaleClaimSerializer
 )
+from .snapshot import get_snapshot
+from .inventory import RESERVE, FlashSaleError, get_inventory, load_remaining, schedule_write_back
+from .coupons import CartLine, CouponRejected, coupon_engine, evaluate_coupon, get_coupon_settings
+from .pricing import cart_lines
 from products.models import Product
+from carts.models import Cart
+
+
+logger = logging.getLogger(__name__)
+
+FLASH_SALE_ERROR_STATUS = {
+    'not_found': status.HTTP_404_NOT_FOUND,
+    'not_live': status.HTTP_400_BAD_REQUEST,
+    'user_limit': status.HTTP_409_CONFLICT,
+    'sold_out': status.HTTP_409_CONFLICT,
+    'insufficient': status.HTTP_409_CONFLICT,
+}
+
+
+def snapshot_response(section):
+    return HttpResponse(get_snapshot()['sections'][section], content_type='application/json')
 
 
 @api_view(['GET'])
 def list_active_coupons(request):
     """Get all active coupons"""
-    now = timezone.now()
-    coupons = Coupon.objects.filter(
-        is_active=True,
-        valid_from__lte=now,
-        valid_until__gte=now
-    )
-    serializer = CouponSerializer(coupons, many=True)
-    return Response(serializer.data)
+    return snapshot_response('coupons')
 
 
 @api_view(['GET'])
 def list_active_flash_sales(request):
     """Get all active flash sales"""
-    now = timezone.now()
-    flash_sales = FlashSale.objects.filter(
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now,
-        quantity_sold__lt=models.F('max_quantity')  # Not sold out
-    ).select_related('product')
-    serializer = FlashSaleSerializer(flash_sales, many=True)
-    return Response(serializer.data)
+    return snapshot_response('flash_sales')
 
 
 @api_view(['GET'])
 def list_active_banners(request):
     """Get all active banners"""
-    now = timezone.now()
-    banners = Banner.objects.filter(
-        is_active=True,
-        start_date__lte=now,
-        end_date__gte=now
-    ).prefetch_related('products', 'categories')
-    serializer = BannerSerializer(banners, many=True)
-    return Response(serializer.data)
+    return snapshot_response('banners')
 
 
 @api_view(['GET'])
 def get_active_promotions(request):
-    """Get all active promotions (coupons, flash sales, banners)"""
-    now = timezone.now()
-    
-    # Get active coupons
-    coupons = Coupon.objects.filter(
-        is_active=True,
-        valid_from__lte=now,
-        valid_until__gte=now
-    )
-    
-    # Get active flash sales
-    flash_sales = FlashSale.objects.filter(
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now,
-        quantity_sold__lt=models.F('max_quantity')
-    ).select_related('product')
-    
-    # Get active banners
-    banners = Banner.objects.filter(
-        is_active=True,
-        start_date__lte=now,
-        end_date__gte=now
-    ).prefetch_related('products', 'categories')
-    
-    # Serialize all data
-    coupon_serializer = CouponSerializer(coupons, many=True)
-    flash_sale_serializer = FlashSaleSerializer(flash_sales, many=True)
-    banner_serializer = BannerSerializer(banners, many=True)
-    
-    data = {
-        'coupons': coupon_serializer.data,
-        'flash_sales': flash_sale_serializer.data,
-        'banners': banner_serializer.data
-    }
-    
-    serializer = ActivePromotionsSerializer(data)
-    return Response(data)
+    """Get all active promotions (coupons, flash sales, banners) from the precomputed snapshot"""
+    return snapshot_response('all')
 
 
 @api_view(['POST'])
 def apply_coupon(request):
-    """Apply a coupon to an order total"""
+    """Validate a coupon against the user's cart and preview the discount"""
     serializer = ApplyCouponSerializer(data=request.data)
     if serializer.is_valid():
-        coupon = serializer.validated_data['coupon']
-        order_total = serializer.validated_data['order_total']
-        
-        # Check if coupon is valid for this user and order
-        if not coupon.is_valid_for_user(request.user):
-            return Response({
-                'valid': False,
-                'error': 'Coupon is not valid for you'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        if order_total < coupon.minimum_order_amount:
+        code = serializer.validated_data['coupon_code']
+        lines = request_cart_lines(request)
+        if not lines and 'order_total' in serializer.validated_data:
+            lines = [CartLine(None, None, 1, serializer.validated_data['order_total'])]
+
+        try:
+            evaluation = evaluate_coupon(code, lines, request.user)
+        except CouponRejected as e:
             return Response({
                 'valid': False,
-                'error': f'Minimum order amount of {coupon.minimum_order_amount} not met'
+                'error': e.message,
+                'code': e.code
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check if coupon applies to specific products/categories
-        if coupon.products.exists() or coupon.categories.exists():
-            # In a real app, we'd validate against cart items
-            pass  # Simplified for now
-        
-        # Calculate discount
-        discount_amount = coupon.calculate_discount(order_total)
-        
+
         return Response({
             'valid': True,
-            'coupon': CouponSerializer(coupon).data,
-            'discount_amount': float(discount_amount),
-            'new_total': float(order_total - discount_amount)
+            'coupon': evaluation.as_dict(),
+            'discount_amount': float(evaluation.discount),
+            'new_total': float(evaluation.new_total)
         })
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['GET'])
+def eligible_coupons(request):
+    """Coupons the user's cart currently qualifies for, best discount first"""
+    lines = request_cart_lines(request)
+    evaluations = coupon_engine.index().eligible(lines)[:get_coupon_settings()['MAX_ELIGIBLE']]
+    return Response([evaluation.as_dict() for evaluation in evaluations])
+
+
+def request_cart_lines(request):
+    cart = Cart.objects.filter(user=request.user).first() if request.user.is_authenticated else None
+    return cart_lines(cart) if cart is not None else []
+
+
+@api_view(['POST'])
+def claim_flash_sale(request, sale_id):
+    """Reserve flash sale units for the authenticated user"""
+    serializer = FlashSaleClaimSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        claim = get_inventory().claim(sale_id, request.user.pk, serializer.validated_data['quantity'], mode=RESERVE)
+    except FlashSaleError as e:
+        return Response({
+            'error': e.message,
+            'code': e.code,
+            'remaining': e.remaining
+        }, status=FLASH_SALE_ERROR_STATUS[e.code])
+    except Exception:
+        logger.exception('Flash sale inventory unavailable')
+        return Response(
+            {'error': 'Flash sale inventory is temporarily unavailable'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    schedule_write_back()
+    return Response({'claimed': claim.quantity, 'remaining': claim.remaining})
+
+
+@api_view(['DELETE'])
+def cancel_flash_sale_claim(request, sale_id):
+    """Give the authenticated user's reserved flash sale units back to the sale"""
+    try:
+        released = get_inventory().cancel_reservation(sale_id, request.user.pk)
+    except Exception:
+        logger.exception('Flash sale inventory unavailable')
+        return Response(
+            {'error': 'Flash sale inventory is temporarily unavailable'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    if released:
+        schedule_write_back()
+    return Response({'released': released})
+
+
+@api_view(['GET'])
+def flash_sale_stock(request, sale_id):
+    """Live remaining quantity of a flash sale and how many the user holds"""
+    try:
+        inventory = get_inventory()
+        remaining = inventory.remaining(sale_id)
+        if remaining is None:
+            _, remaining = inventory.sync(get_object_or_404(FlashSale, pk=sale_id))
+        held = inventory.held_by(sale_id, request.user.pk)
+        reserved = inventory.reserved_by(sale_id, request.user.pk)
+    except Http404:
+        raise
+    except Exception:
+        logger.exception('Flash sale inventory unavailable')
+        return Response(
+            {'error': 'Flash sale inventory is temporarily unavailable'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return Response({'remaining': remaining, 'held': held, 'reserved': reserved})
+
+
 @api_view(['GET'])
 def get_product_flash_sales(request, product_id):
     """Get flash sales for a specific product"""
     product = get_object_or_404(Product, id=product_id)
-    now = timezone.now()
     flash_sales = FlashSale.objects.filter(
         product=product,
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now,
-        quantity_sold__lt=models.F('max_quantity')
+        is_live=True,
+        quantity_sold__lt=F('max_quantity')
     )
-    serializer = FlashSaleSerializer(flash_sales, many=True)
+    serializer = FlashSaleSerializer(load_remaining(flash_sales), many=True)
     return Response(serializer.data)
 
 
@@ -175,7 +203,7 @@ def admin_create_coupon(request):
 def admin_list_flash_sales(request):
     """Admin: List all flash sales"""
     flash_sales = FlashSale.objects.all().select_related('product')
-    serializer = FlashSaleSerializer(flash_sales, many=True)
+    serializer = FlashSaleSerializer(load_remaining(flash_sales), many=True)
     return Response(serializer.data)
 
 